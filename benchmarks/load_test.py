@@ -0,0 +1,213 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Offline load test:
+# Runs N local miner processes, each serving the real miner from neurons/miner.py behind a mock axon,
+# and drives them from the real validator main loop from neurons/validator.py, run in-process against a
+# mock subtensor and dendrite with a synthetic metagraph. No chain, wallets or network access are needed.
+#
+# Example usage:
+#   python benchmarks/load_test.py --uids 64 256 1024 4096 --miners 4 --rounds 10
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import importlib.util
+import multiprocessing
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..' ) )
+from template.mock import MockAxon, MockDendrite, MockMetagraph, MockSubtensor, MockWallet
+
+MINER_PATH = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'neurons', 'miner.py' )
+VALIDATOR_PATH = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'neurons', 'validator.py' )
+
+
+def get_args():
+    parser = argparse.ArgumentParser( description = 'Offline load test for the miner and validator hot paths.' )
+    parser.add_argument( '--uids', type = int, nargs = '+', default = [ 64, 256, 1024, 4096 ], help = "Metagraph sizes to benchmark." )
+    parser.add_argument( '--miners', type = int, default = 4, help = "Number of local miner processes. Uids are spread over them." )
+    parser.add_argument( '--rounds', type = int, default = 10, help = "Validator rounds per metagraph size." )
+    parser.add_argument( '--sample_size', type = int, default = 0, help = "Uids queried per round, every uid if 0." )
+    parser.add_argument( '--timeout', type = float, default = 5.0, help = "Per-miner query timeout." )
+    parser.add_argument( '--max_in_flight', type = int, default = 256, help = "Maximum concurrent requests from the validator." )
+    parser.add_argument( '--base_port', type = int, default = 9100, help = "Port of the first miner process." )
+    parser.add_argument( '--miner_args', type = str, default = '', help = "Extra arguments passed to every miner, e.g. '--executor.workers 8'." )
+    parser.add_argument( '--validator_args', type = str, default = '', help = "Extra arguments passed to the validator, e.g. '--history.latency_weight 0.2'." )
+    return parser.parse_args()
+
+
+def _load_miner():
+    # Registered as an importable module so worker processes in --executor.mode process can unpickle its forwards.
+    sys.path.insert( 0, os.path.dirname( MINER_PATH ) )
+    spec = importlib.util.spec_from_file_location( 'miner', MINER_PATH )
+    miner = importlib.util.module_from_spec( spec )
+    sys.modules[ 'miner' ] = miner
+    spec.loader.exec_module( miner )
+    return miner
+
+
+def _load_validator():
+    spec = importlib.util.spec_from_file_location( 'validator', VALIDATOR_PATH )
+    validator = importlib.util.module_from_spec( spec )
+    sys.modules[ 'validator' ] = validator
+    spec.loader.exec_module( validator )
+    return validator
+
+
+def run_miner( index: int, n: int, ports: list, miner_args: str, logging_dir: str ):
+    """ Runs the real miner main loop behind a mock axon. Executed in a child process. """
+    miner = _load_miner()
+    sys.argv = [ 'miner',
+        '--logging.logging_dir', logging_dir,
+        '--wallet.name', 'load_test',
+        '--wallet.hotkey', f'miner{index}',
+        '--axon.port', str( ports[ index ] ),
+        # Each --uids size must sync its own metagraph instead of starting from the previous size's cache.
+        '--metagraph.no_cache',
+    ] + miner_args.split()
+    config = miner.get_config()
+    metagraph = MockMetagraph( n, ports = ports )
+    # Uid 0 is the validator, miner processes take the following uids.
+    wallet = MockWallet( metagraph.hotkeys[ 1 + index ] )
+    miner.main( config, wallet = wallet, subtensor = MockSubtensor( metagraph ), axon = MockAxon( wallet, port = ports[ index ] ) )
+
+
+def _wait_for_port( port: int, timeout: float = 60.0 ):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection( ( '127.0.0.1', port ), timeout = 1 ).close()
+            return
+        except OSError:
+            time.sleep( 0.1 )
+    raise TimeoutError( f'Miner on port {port} did not start within {timeout}s.' )
+
+
+def _process_usage( pid: int ) -> dict:
+    """ Cpu seconds and resident memory of a process, read from /proc. """
+    with open( f'/proc/{pid}/stat' ) as f:
+        fields = f.read().rsplit( ')', 1 )[1].split()
+    cpu = ( int( fields[11] ) + int( fields[12] ) ) / os.sysconf( 'SC_CLK_TCK' )
+    rss = 0
+    with open( f'/proc/{pid}/status' ) as f:
+        for line in f:
+            if line.startswith( 'VmRSS:' ):
+                rss = int( line.split()[1] ) * 1024
+    return { 'cpu': cpu, 'rss': rss }
+
+
+def _percentile( values: list, q: float ) -> float:
+    if not values:
+        return float( 'nan' )
+    values = sorted( values )
+    return values[ min( len( values ) - 1, int( q * len( values ) ) ) ]
+
+
+def benchmark( n: int, args: argparse.Namespace, logging_dir: str ) -> dict:
+    ports = [ args.base_port + i for i in range( args.miners ) ]
+    context = multiprocessing.get_context( 'spawn' )
+    miners = [
+        context.Process( target = run_miner, args = ( i, n, ports, args.miner_args, logging_dir ), daemon = True )
+        for i in range( args.miners )
+    ]
+    for process in miners:
+        process.start()
+    try:
+        for port in ports:
+            _wait_for_port( port )
+
+        # The validator side is the real main loop from neurons/validator.py, driven for --rounds steps
+        # against the mock subtensor and dendrite. Every response is logged as an event and read back below.
+        validator = _load_validator()
+        sys.argv = [ 'validator',
+            '--logging.logging_dir', logging_dir,
+            '--wallet.name', 'load_test',
+            '--wallet.hotkey', f'validator{n}',
+            '--step_interval', '0',
+            '--state.reset',
+            '--metagraph.no_cache',
+            '--events.sample_rate', '1',
+            '--sampling.sample_size', str( args.sample_size ),
+            '--query.timeout', str( args.timeout ),
+            '--query.max_in_flight', str( args.max_in_flight ),
+        ] + args.validator_args.split()
+        config = validator.get_config()
+        metagraph = MockMetagraph( n, ports = ports )
+        wallet = MockWallet( metagraph.hotkeys[0] )
+
+        miner_usage = [ _process_usage( process.pid ) for process in miners ]
+        validator_usage = _process_usage( os.getpid() )
+        validator.main( config, wallet = wallet, subtensor = MockSubtensor( metagraph ), dendrite = MockDendrite( wallet ), max_steps = args.rounds )
+        validator_end = _process_usage( os.getpid() )
+        miner_end = [ _process_usage( process.pid ) for process in miners ]
+    finally:
+        for process in miners:
+            process.terminate()
+            process.join()
+
+    responses, rounds = [], []
+    with open( os.path.join( config.full_path, 'events.jsonl' ) ) as f:
+        for line in f:
+            event = json.loads( line )
+            if event['event'] == 'response': responses.append( event )
+            elif event['event'] == 'round': rounds.append( event )
+    latencies = [ event['latency'] for event in responses ]
+    successes = sum( event['success'] for event in responses )
+    timeouts = sum( event['timed_out'] and not event['success'] for event in responses )
+    failures = len( responses ) - successes - timeouts
+    times = [ event['time'] for event in rounds ]
+    cycle_times = [ b - a for a, b in zip( times, times[1:] ) ] or [ event['round_time'] + event['score_time'] for event in rounds ]
+
+    return {
+        'uids': n,
+        'requests': successes + timeouts + failures,
+        'success': successes,
+        'timeouts': timeouts,
+        'failures': failures,
+        'rps': successes / sum( event['round_time'] for event in rounds ),
+        'p50': _percentile( latencies, 0.50 ),
+        'p99': _percentile( latencies, 0.99 ),
+        'cycle': statistics.mean( cycle_times ),
+        'score': statistics.mean( event['score_time'] for event in rounds ),
+        'validator_cpu': validator_end['cpu'] - validator_usage['cpu'],
+        'validator_rss': validator_end['rss'],
+        'miner_cpu': sum( end['cpu'] - start['cpu'] for start, end in zip( miner_usage, miner_end ) ) / len( miners ),
+        'miner_rss': max( end['rss'] for end in miner_end ),
+    }
+
+
+def main( args: argparse.Namespace ):
+    logging_dir = tempfile.mkdtemp( prefix = 'load_test_' )
+    header = f"{'uids':>6} {'requests':>9} {'ok':>7} {'timeout':>7} {'failed':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} " \
+             f"{'cycle s':>8} {'score ms':>9} {'val cpu s':>9} {'val MB':>7} {'miner cpu s':>11} {'miner MB':>8}"
+    print( header )
+    for n in args.uids:
+        r = benchmark( n, args, logging_dir )
+        print( f"{r['uids']:>6} {r['requests']:>9} {r['success']:>7} {r['timeouts']:>7} {r['failures']:>7} {r['rps']:>9.1f} "
+               f"{r['p50'] * 1e3:>8.2f} {r['p99'] * 1e3:>8.2f} {r['cycle']:>8.3f} {r['score'] * 1e3:>9.3f} "
+               f"{r['validator_cpu']:>9.2f} {r['validator_rss'] / 2**20:>7.1f} {r['miner_cpu']:>11.2f} {r['miner_rss'] / 2**20:>8.1f}", flush = True )
+
+
+if __name__ == "__main__":
+    main( get_args() )
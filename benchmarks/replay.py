@@ -0,0 +1,101 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Round replay:
+# Re-runs the scoring and normalization of validator rounds recorded with --recorder.enabled, offline and
+# without a chain. Checks that the replayed scores and weights match the recorded ones, reports the time
+# spent per round, and optionally profiles the replay with cProfile or tracemalloc. Run it before and after
+# a change to template/scoring.py to benchmark the change against real traffic.
+#
+# Example usage:
+#   python benchmarks/replay.py ~/.bittensor/miners/<wallet>/<hotkey>/netuid1/validator/rounds.log --profile cprofile
+
+import os
+import sys
+import time
+import pstats
+import argparse
+import cProfile
+import statistics
+import tracemalloc
+
+import torch
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..' ) )
+from template.recorder import read_rounds, replay_round
+
+
+def get_args():
+    parser = argparse.ArgumentParser( description = 'Replays recorded validator rounds through scoring and normalization.' )
+    parser.add_argument( 'path', type = str, help = "Round log written by the validator with --recorder.enabled." )
+    parser.add_argument( '--steps', type = int, nargs = 2, default = None, metavar = ( 'FIRST', 'LAST' ), help = "Only replay the rounds of steps FIRST to LAST inclusive." )
+    parser.add_argument( '--repeats', type = int, default = 1, help = "Times every round is replayed, for more stable timings." )
+    parser.add_argument( '--profile', choices = [ 'none', 'cprofile', 'tracemalloc' ], default = 'none', help = "Profiler to run the replay under." )
+    parser.add_argument( '--top', type = int, default = 20, help = "Number of profile entries printed." )
+    parser.add_argument( '--tolerance', type = float, default = 1e-6, help = "Largest difference from the recorded scores and weights counted as a match." )
+    return parser.parse_args()
+
+
+def main( args: argparse.Namespace ):
+    records = [ r for r in read_rounds( args.path ) if args.steps is None or args.steps[0] <= r.step <= args.steps[1] ]
+    if not records:
+        print( f'No rounds to replay in {args.path}.' )
+        return
+    print( f'Replaying {len( records )} rounds, steps {records[0].step} to {records[-1].step}, ' \
+           f'{len( { r.metagraph_hash for r in records } )} metagraph states, {os.path.getsize( args.path ) / len( records ) / 1024:.1f}KiB per round.' )
+
+    profiler = cProfile.Profile() if args.profile == 'cprofile' else None
+    if args.profile == 'tracemalloc':
+        tracemalloc.start()
+    times, mismatched = [], []
+    for record in records:
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        for _ in range( args.repeats ):
+            scores, weights = replay_round( record )
+        if profiler is not None:
+            profiler.disable()
+        times.append( ( time.perf_counter() - start ) / args.repeats )
+        # Rounds whose scoring code has changed since recording will differ, which is the point when benchmarking a change.
+        if not torch.allclose( scores, torch.from_numpy( record.scores ), rtol = 0, atol = args.tolerance ) or \
+           not torch.allclose( weights, torch.from_numpy( record.weights ), rtol = 0, atol = args.tolerance ):
+            mismatched.append( record.step )
+
+    print( f"{'rounds':>8} {'uids/round':>11} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}" )
+    ordered = sorted( times )
+    print( f"{len( records ):>8} {statistics.mean( len( r.uids ) for r in records ):>11.0f} {statistics.mean( times ) * 1e3:>8.3f} " \
+           f"{ordered[ len( ordered ) // 2 ] * 1e3:>8.3f} {ordered[ min( len( ordered ) - 1, int( len( ordered ) * 0.99 ) ) ] * 1e3:>8.3f} {ordered[-1] * 1e3:>8.3f}" )
+    if mismatched:
+        print( f'{len( mismatched )} rounds differ from the recording, first at steps {mismatched[ :10 ]}.' )
+    else:
+        print( 'All replayed scores and weights match the recording.' )
+
+    if profiler is not None:
+        pstats.Stats( profiler ).sort_stats( 'cumulative' ).print_stats( args.top )
+    if args.profile == 'tracemalloc':
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        print( f'Allocated {current / 1024:.1f}KiB, peak {peak / 1024:.1f}KiB.' )
+        for stat in snapshot.statistics( 'lineno' )[ :args.top ]:
+            print( stat )
+
+
+if __name__ == "__main__":
+    main( get_args() )
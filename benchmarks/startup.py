@@ -0,0 +1,107 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Startup benchmark:
+# Measures how long a fresh interpreter takes to import the template package and to parse each neuron's
+# config, which loads bittensor, torch and nearly every template submodule. Also measures how long a miner
+# takes from process start until its axon accepts connections, both on a cold start which waits for the
+# first metagraph sync and on a restart from the metagraph cached on disk.
+# The chain is a mock subtensor whose metagraph sync takes --sync_latency seconds.
+#
+# Example usage:
+#   python benchmarks/startup.py --uids 4096 --sync_latency 5 --repeats 3
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import multiprocessing
+
+from load_test import _load_miner, _wait_for_port, MINER_PATH, VALIDATOR_PATH
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..' )
+
+
+def get_args():
+    parser = argparse.ArgumentParser( description = 'Startup time benchmark for the neuron entry points.' )
+    parser.add_argument( '--uids', type = int, default = 4096, help = "Size of the mock metagraph." )
+    parser.add_argument( '--sync_latency', type = float, default = 5.0, help = "Seconds the mock subtensor takes to return the metagraph." )
+    parser.add_argument( '--repeats', type = int, default = 3, help = "Runs per measurement, the median is reported." )
+    parser.add_argument( '--port', type = int, default = 9300, help = "Port the miner serves on." )
+    return parser.parse_args()
+
+
+def run_miner( n: int, port: int, sync_latency: float, logging_dir: str, miner_args: list ):
+    """ Runs the real miner main loop behind a mock axon. Executed in a child process. """
+    miner = _load_miner()
+    sys.argv = [ 'miner',
+        '--logging.logging_dir', logging_dir,
+        '--wallet.name', 'startup',
+        '--wallet.hotkey', 'miner',
+        '--axon.port', str( port ),
+    ] + miner_args
+    config = miner.get_config()
+    from template.mock import MockAxon, MockMetagraph, MockSubtensor, MockWallet
+    metagraph = MockMetagraph( n, ports = [ port ] )
+    wallet = MockWallet( metagraph.hotkeys[1] )
+    miner.main( config, wallet = wallet, subtensor = MockSubtensor( metagraph, sync_latency = sync_latency ), axon = MockAxon( wallet, port = port ) )
+
+
+def time_command( command: list ) -> float:
+    start = time.perf_counter()
+    subprocess.run( command, cwd = ROOT, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True )
+    return time.perf_counter() - start
+
+
+def time_to_serve( args: argparse.Namespace, logging_dir: str, miner_args: list ) -> float:
+    context = multiprocessing.get_context( 'spawn' )
+    start = time.perf_counter()
+    process = context.Process( target = run_miner, args = ( args.uids, args.port, args.sync_latency, logging_dir, miner_args ), daemon = True )
+    process.start()
+    try:
+        _wait_for_port( args.port )
+        return time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main( args: argparse.Namespace ):
+    logging_dir = tempfile.mkdtemp( prefix = 'startup_' )
+    measurements = {
+        'import template': lambda: time_command( [ sys.executable, '-c', 'import template' ] ),
+        'import template.metrics': lambda: time_command( [ sys.executable, '-c', 'import template.metrics' ] ),
+        'miner --help': lambda: time_command( [ sys.executable, MINER_PATH, '--help' ] ),
+        'validator --help': lambda: time_command( [ sys.executable, VALIDATOR_PATH, '--help' ] ),
+        'miner serving (cold)': lambda: time_to_serve( args, logging_dir, [ '--metagraph.no_cache' ] ),
+        'miner serving (cached)': lambda: time_to_serve( args, logging_dir, [] ),
+    }
+    # Cold runs don't read the cache, sync once to write it for the cached runs.
+    time_to_serve( args, logging_dir, [] )
+    print( f"{'measurement':<24} {'median s':>9} {'min s':>7} {'max s':>7}" )
+    for name, measure in measurements.items():
+        times = [ measure() for _ in range( args.repeats ) ]
+        print( f"{name:<24} {statistics.median( times ):>9.3f} {min( times ):>7.3f} {max( times ):>7.3f}", flush = True )
+
+
+if __name__ == "__main__":
+    main( get_args() )
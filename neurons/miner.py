@@ -23,13 +23,23 @@
 # Step 1: Import necessary libraries and modules
 import os
 import time
+import typing
 import argparse
 import traceback
+import concurrent.futures
 import bittensor as bt
 
 # import this repo
 import template
 
+# Hot path metrics, served on --metrics.port.
+BLACKLIST_SECONDS = template.metrics.histogram( 'miner_blacklist_seconds', 'Time spent in the blacklist function.' )
+PRIORITY_SECONDS = template.metrics.histogram( 'miner_priority_seconds', 'Time spent in the priority function.' )
+FORWARD_SECONDS = template.metrics.histogram( 'miner_forward_seconds', 'Time spent in the forward function, including queueing.' )
+BLACKLISTED = template.metrics.counter( 'miner_blacklisted', 'Requests rejected by the blacklist function.' )
+TIMED_OUT = template.metrics.counter( 'miner_timed_out', 'Requests which missed their caller\'s deadline.' )
+FAILED = template.metrics.counter( 'miner_failed', 'Requests whose forward raised.' )
+
 def get_config():
     # Step 2: Set up the configuration parser
     # This function initializes the necessary command-line arguments.
@@ -39,6 +49,8 @@ def get_config():
     parser.add_argument('--custom', default='my_custom_value', help='Adds a custom value to the parser.')
     # Adds override arguments for network and netuid.
     parser.add_argument( '--netuid', type = int, default = 1, help = "The chain subnet uid." )
+    # Adds streaming arguments.
+    parser.add_argument( '--streaming.max_buffered', type = int, default = 8, help = "Maximum chunks a streaming forward may produce ahead of the caller." )
     # Adds subtensor specific arguments i.e. --subtensor.chain_endpoint ... --subtensor.network ...
     bt.subtensor.add_args(parser)
     # Adds logging specific arguments i.e. --logging.debug ..., --logging.trace .. or --logging.logging_dir ...
@@ -47,6 +59,25 @@ def get_config():
     bt.wallet.add_args(parser)
     # Adds axon specific arguments i.e. --axon.port ...
     bt.axon.add_args(parser)
+    parser.add_argument( '--axon.keepalive_timeout', type = int, default = 75, help = "Seconds the axon keeps idle validator connections open for reuse. Keep it above the validators' --pool.keepalive_timeout." )
+    # Adds metagraph sync arguments i.e. --metagraph.sync_interval ...
+    template.metagraph.MetagraphSyncer.add_args(parser)
+    # Adds executor arguments i.e. --executor.workers ..., --executor.max_queue ... or --executor.mode ...
+    template.executor.PriorityExecutor.add_args(parser)
+    # Adds worker process arguments used with --executor.mode process i.e. --workers.buffer_size ...
+    template.workers.WorkerPool.add_args(parser)
+    # Adds micro-batching arguments i.e. --batching.max_batch_size ... or --batching.max_wait ...
+    template.batching.MicroBatcher.add_args(parser)
+    # Adds response cache arguments i.e. --cache.max_entries ..., --cache.max_bytes ... or --cache.ttl ...
+    template.cache.ResponseCache.add_args(parser)
+    # Adds metrics arguments i.e. --metrics.port ...
+    template.metrics.MetricsServer.add_args(parser)
+    # Adds rate limiting arguments i.e. --ratelimit.base_rate ..., --ratelimit.adaptive ...
+    template.ratelimit.RateLimiter.add_args(parser)
+    # Adds structured event log arguments i.e. --events.max_bytes ..., --events.sample_rate ...
+    template.events.EventLog.add_args(parser)
+    # Adds shutdown arguments i.e. --lifecycle.drain_timeout ...
+    template.lifecycle.Lifecycle.add_args(parser)
     # Activating the parser to read any command-line inputs.
     # To print help message, run python3 template/miner.py --help
     config = bt.config(parser)
@@ -67,8 +98,43 @@ def get_config():
     return config
 
 
+# This is the core miner function, which decides the miner's response to a valid, high-priority request.
+# It is defined at module level so the executor can also run it in worker processes. There, the metagraph's
+# hotkey index shared by the supervisor is available through template.workers.snapshot().
+def dummy( synapse: template.protocol.Dummy ) -> template.protocol.Dummy:
+    # TODO(developer): Define how miners should process requests.
+    # This function runs after the synapse has been deserialized (i.e. after synapse.data is available).
+    # This function runs after the blacklist and priority functions have been called.
+    # Below: simple template logic: return the input value multiplied by 2.
+    # If you change this, your miner will lose emission in the network incentive landscape.
+    synapse.dummy_output = synapse.dummy_input * 2
+    return synapse
+
+
+# This is the vectorized version of the core miner function, used when micro-batching is enabled.
+# It receives a batch of concurrent requests and must return them in the same order.
+def dummy_batch( synapses: typing.List[template.protocol.Dummy] ) -> typing.List[template.protocol.Dummy]:
+    # TODO(developer): Define how miners should process a batch of requests, e.g. a single model call.
+    # Below: simple template logic: return each input value multiplied by 2.
+    for synapse in synapses:
+        synapse.dummy_output = synapse.dummy_input * 2
+    return synapses
+
+
+# This is the streaming version of the core miner function. It is an async generator, and every chunk
+# it yields is sent to the validator as soon as it is produced.
+async def dummy_stream( synapse: template.protocol.StreamingDummy ) -> typing.AsyncIterator[int]:
+    # TODO(developer): Define how miners should stream responses, e.g. tokens as a model generates them.
+    # Below: simple template logic: count up from the input value multiplied by 2.
+    for i in range( synapse.stream_length ):
+        yield synapse.dummy_input * 2 + i
+
+
 # Main takes the config and starts the miner.
-def main( config ):
+# The wallet, subtensor and axon are built from the config unless passed in, e.g. the mocks in
+# template.mock used by the offline benchmarks. A passed subtensor is shared with background
+# workers, so it must be thread-safe.
+def main( config, wallet = None, subtensor = None, axon = None ):
 
     # Activating Bittensor's logging with the set configurations.
     bt.logging(config=config, logging_dir=config.full_path)
@@ -82,15 +148,28 @@ def main( config ):
     bt.logging.info("Setting up bittensor objects.")
 
     # Wallet holds cryptographic information, ensuring secure transactions and communication.
-    wallet = bt.wallet( config = config )
+    wallet = wallet or bt.wallet( config = config )
     bt.logging.info(f"Wallet: {wallet}")
 
     # subtensor manages the blockchain connection, facilitating interaction with the Bittensor blockchain.
-    subtensor = bt.subtensor( config = config )
+    shared_subtensor = subtensor
+    subtensor = subtensor or bt.subtensor( config = config )
     bt.logging.info(f"Subtensor: {subtensor}")
 
     # metagraph provides the network's current state, holding state about other participants in a subnet.
-    metagraph = subtensor.metagraph(config.netuid)
+    # It is kept fresh by a background syncer which owns a separate subtensor connection, and published
+    # as an immutable snapshot together with a hotkey index that maps hotkeys to uids, stake and permits.
+    # Functions below read metagraph_syncer.snapshot which is swapped in one assignment on every sync,
+    # so requests being handled concurrently never see a half-updated graph. On restarts the miner starts
+    # from the metagraph cached on disk, and the first live sync catches up in the background.
+    metagraph_syncer = template.metagraph.MetagraphSyncer(
+        shared_subtensor or bt.subtensor( config = config ),
+        netuid = config.netuid,
+        interval = config.metagraph.sync_interval,
+        cache_path = None if config.metagraph.no_cache else os.path.join( config.full_path, 'metagraph.pkl' ),
+        compact = config.metagraph.compact,
+    ).start()
+    metagraph = metagraph_syncer.snapshot.metagraph
     bt.logging.info(f"Metagraph: {metagraph}")
 
     if wallet.hotkey.ss58_address not in metagraph.hotkeys:
@@ -100,30 +179,127 @@ def main( config ):
         # Each miner gets a unique identity (UID) in the network for differentiation.
         my_subnet_uid = metagraph.hotkeys.index(wallet.hotkey.ss58_address)
         bt.logging.info(f"Running miner on uid: {my_subnet_uid}")
+    # A metagraph cached on disk may be stale, so the registration is checked again after the first live sync.
+    registration_verified = metagraph_syncer.sync_count > 0
+
+    # In process mode this process is a supervisor: it keeps the one axon, registration and metagraph,
+    # and CPU-bound forward calls run on a pool of worker processes, one per executor worker, so they
+    # are not limited to a single core. Requests and responses move through shared memory buffers,
+    # crashed or hung workers are restarted, and the hotkey index is shared read-only with all of them.
+    worker_pool = None
+    if config.executor.mode == 'process':
+        worker_pool = template.workers.WorkerPool(
+            workers = config.executor.workers,
+            buffer_size = config.workers.buffer_size,
+            snapshot_size = config.workers.snapshot_size,
+            health_interval = config.workers.health_interval,
+        )
+
+    # The executor runs forward calls on a bounded pool of workers, highest priority first.
+    # When its queue is full low priority requests are shed, and requests whose caller
+    # has already timed out are dropped before any compute is spent on them.
+    executor = template.executor.PriorityExecutor(
+        workers = config.executor.workers,
+        max_queue = config.executor.max_queue,
+        mode = config.executor.mode,
+        deadline_margin = config.executor.deadline_margin,
+        pool = worker_pool,
+    ).start()
+    published_version = None
+    if worker_pool is not None:
+        worker_pool.publish( metagraph_syncer.snapshot.index )
+        published_version = metagraph_syncer.snapshot.version
+
+    # Structured events are written to a rotating JSON lines file by a background thread, so logging
+    # from the request path never waits on formatting or disk. Per-request events are sampled.
+    events = template.events.EventLog(
+        os.path.join( config.full_path, 'events.jsonl' ),
+        max_bytes = config.events.max_bytes,
+        rotate_interval = config.events.rotate_interval,
+        backups = config.events.backups,
+        sample_rate = config.events.sample_rate,
+    ).start()
+
+    # Serve the hot path metrics for scraping if a port is configured.
+    metrics_server = None
+    if config.metrics.port is not None:
+        metrics_server = template.metrics.MetricsServer( config.metrics.port, host = config.metrics.host ).start()
+
+    # The rate limiter keeps a token bucket per caller hotkey, with budgets scaled by stake and validator permit,
+    # so a single registered hotkey can't flood the miner. In adaptive mode the budgets shrink while the
+    # forward latency or executor queue depth are above their thresholds.
+    rate_limiter = None
+    if config.ratelimit.base_rate > 0:
+        rate_limiter = template.ratelimit.RateLimiter(
+            base_rate = config.ratelimit.base_rate,
+            permit_multiplier = config.ratelimit.permit_multiplier,
+            burst = config.ratelimit.burst,
+            adaptive = config.ratelimit.adaptive,
+            max_latency = config.ratelimit.max_latency,
+            max_queue_depth = config.ratelimit.max_queue_depth,
+        )
+
+    # The lifecycle counts the requests in flight and turns SIGTERM into a graceful stop and SIGHUP into a
+    # reload, see the main loop below. On stop new requests are turned away and the ones in flight are
+    # given up to --lifecycle.drain_timeout seconds to finish. A request counts from the moment the blacklist
+    # admits it until its forward returns, the hooks find it by the caller's signed nonce and uuid.
+    lifecycle = template.lifecycle.Lifecycle( drain_timeout = config.lifecycle.drain_timeout ).install()
+
+    def request_key( synapse: bt.Synapse ) -> typing.Tuple:
+        return ( synapse.dendrite.hotkey, synapse.dendrite.nonce, synapse.dendrite.uuid )
 
     # Step 4: Set up miner functionalities
     # The following functions control the miner's response to incoming requests.
     # The blacklist function decides if a request should be ignored.
+    @BLACKLIST_SECONDS.timed
     def blacklist_fn( synapse: template.protocol.Dummy ) -> bool:
         # TODO(developer): Define how miners should blacklist requests. This Function 
         # Runs before the synapse data has been deserialized (i.e. before synapse.data is available).
         # The synapse is instead contructed via the headers of the request. It is important to blacklist
         # requests before they are deserialized to avoid wasting resources on requests that will be ignored.
+        # Below: Turn away new requests while shutting down, so the ones in flight can finish.
+        if lifecycle.draining:
+            events.emit_sampled( 'blacklist', hotkey = synapse.dendrite.hotkey, reason = 'draining' )
+            BLACKLISTED.inc()
+            return True
         # Below: Check that the hotkey is a registered entity in the metagraph.
-        if synapse.dendrite.hotkey not in metagraph.hotkeys:
+        index = metagraph_syncer.snapshot.index
+        caller_uid = index.uid( synapse.dendrite.hotkey )
+        if caller_uid is None:
             # Ignore requests from unrecognized entities.
-            bt.logging.trace(f'Blacklisting unrecognized hotkey {synapse.dendrite.hotkey}')
+            events.emit_sampled( 'blacklist', hotkey = synapse.dendrite.hotkey, reason = 'unregistered' )
+            BLACKLISTED.inc()
             return True
         # TODO(developer): In practice it would be wise to blacklist requests from entities that 
-        # are not validators, or do not have enough stake. This can be checked via metagraph.S
-        # and metagraph.validator_permit. You can always attain the uid of the sender via a
-        # metagraph.hotkeys.index( synapse.dendrite.hotkey ) call.
-        # Otherwise, allow the request to be processed further.
-        bt.logging.trace(f'Not Blacklisting recognized hotkey {synapse.dendrite.hotkey}')
+        # are not validators, or do not have enough stake. This can be checked in constant time via
+        # index.stake[ caller_uid ] and index.validator_permit[ caller_uid ].
+        stake = index.stake[ caller_uid ]
+        # Below: Drop callers which exceeded their rate limit, scaled by their stake and validator permit.
+        if rate_limiter is not None and not rate_limiter.allow( synapse.dendrite.hotkey, stake, index.validator_permit[ caller_uid ] ):
+            events.emit_sampled( 'blacklist', hotkey = synapse.dendrite.hotkey, reason = 'rate_limited' )
+            BLACKLISTED.inc()
+            return True
+        # Below: When the executor or batcher is saturated, reject requests which would be shed anyway before deserializing them.
+        if not executor.admits( stake ) or ( batcher is not None and not batcher.admits( stake ) ):
+            events.emit_sampled( 'blacklist', hotkey = synapse.dendrite.hotkey, reason = 'queue_full' )
+            BLACKLISTED.inc()
+            return True
+        # Otherwise, allow the request to be processed further, unless draining started in the meantime.
+        if not lifecycle.admit( request_key( synapse ), timeout = synapse.timeout ):
+            events.emit_sampled( 'blacklist', hotkey = synapse.dendrite.hotkey, reason = 'draining' )
+            BLACKLISTED.inc()
+            return True
+        events.emit_sampled( 'admit', hotkey = synapse.dendrite.hotkey, uid = caller_uid )
         return False
 
+    # The priority of a request, without the metrics and events of the axon's priority hook, so the forward
+    # can order the request on the executor by the same value.
+    def priority_of( synapse: template.protocol.Dummy ) -> float:
+        return metagraph_syncer.snapshot.index.stake_of( synapse.dendrite.hotkey )
+
     # The priority function determines the order in which requests are handled.
     # More valuable or higher-priority requests are processed before others.
+    @PRIORITY_SECONDS.timed
     def priority_fn( synapse: template.protocol.Dummy ) -> float:
         # TODO(developer): Define how miners should prioritize requests.
         # Miners may recieve messages from multiple entities at once. This function
@@ -131,53 +307,188 @@ def main( config ):
         # that the request should be processed first. Lower values indicate that the
         # request should be processed later.
         # Below: simple logic, prioritize requests from entities with more stake.
-        caller_uid = metagraph.hotkeys.index( synapse.dendrite.hotkey ) # Get the caller index.
-        prirority = float( metagraph.S[ caller_uid ] ) # Return the stake as the priority.
-        bt.logging.trace(f'Prioritizing {synapse.dendrite.hotkey} with value: ', prirority)
+        prirority = priority_of( synapse ) # Return the stake as the priority.
+        events.emit_sampled( 'priority', hotkey = synapse.dendrite.hotkey, priority = prirority )
         return prirority
 
-    # This is the core miner function, which decides the miner's response to a valid, high-priority request.
-    def dummy( synapse: template.protocol.Dummy ) -> template.protocol.Dummy:
-        # TODO(developer): Define how miners should process requests.
-        # This function runs after the synapse has been deserialized (i.e. after synapse.data is available).
-        # This function runs after the blacklist and priority functions have been called.
-        # Below: simple template logic: return the input value multiplied by 2.
-        # If you change this, your miner will lose emission in the network incentive landscape.
-        synapse.dummy_output = synapse.dummy_input * 2
-        return synapse
+    # When micro-batching is enabled concurrent requests are gathered into batches, and each batch is queued
+    # on the executor as one request with the priority of its most valuable caller and the deadline of its
+    # most impatient one. Requests which timed out while waiting for a batch are dropped from it.
+    # Up to --executor.workers batches run at once, and up to --executor.max_queue requests wait for a batch,
+    # the lowest priority ones are shed beyond that.
+    batcher = None
+    if config.batching.max_batch_size > 1:
+        def forward_batch( synapses: typing.List[template.protocol.Dummy], priority: float, timeout: typing.Optional[float] ) -> typing.List[template.protocol.Dummy]:
+            return executor.run( dummy_batch, synapses, priority = priority, timeout = timeout )
+        batcher = template.batching.MicroBatcher(
+            forward_batch,
+            max_batch_size = config.batching.max_batch_size,
+            max_wait = config.batching.max_wait,
+            max_in_flight = config.executor.workers,
+            max_queue = config.executor.max_queue,
+        ).start()
+
+    # Queues the request on the executor, ordered by priority, and waits for the core miner
+    # function to complete it within the caller's timeout.
+    def compute( synapse: template.protocol.Dummy ) -> template.protocol.Dummy:
+        priority = priority_of( synapse )
+        if batcher is not None:
+            return batcher( synapse, priority = priority, timeout = synapse.timeout )
+        return executor.run( dummy, synapse, priority = priority, timeout = synapse.timeout )
+
+    # Validators often send identical requests. Since the dummy forward is deterministic its outputs can
+    # be cached by request fields, and concurrent identical requests are computed only once.
+    # TODO(developer): Only enable the cache if your forward function is deterministic.
+    cache = None
+    if config.cache.max_entries > 0:
+        cache = template.cache.ResponseCache(
+            max_entries = config.cache.max_entries,
+            max_bytes = config.cache.max_bytes,
+            ttl = config.cache.ttl,
+            # A shed or timed out request says nothing about the waiting ones, which retry instead of failing with it.
+            transient = ( TimeoutError, template.executor.RequestShed ),
+        )
+    cache_key = template.cache.field_key( 'dummy_input' )
+
+    # The forward function attached to the axon answers from the cache when it can, and computes otherwise.
+    @FORWARD_SECONDS.timed
+    def forward_fn( synapse: template.protocol.Dummy ) -> template.protocol.Dummy:
+        start = time.perf_counter()
+        try:
+            with lifecycle.track( request_key( synapse ) ):
+                if cache is None:
+                    return compute( synapse )
+                synapse.dummy_output = cache.get_or_compute(
+                    cache_key( synapse ),
+                    lambda: compute( synapse ).dummy_output,
+                    timeout = synapse.timeout,
+                )
+                return synapse
+        except ( TimeoutError, concurrent.futures.TimeoutError ):
+            TIMED_OUT.inc()
+            raise
+        except template.executor.RequestShed:
+            raise
+        except Exception:
+            FAILED.inc()
+            raise
+        finally:
+            if rate_limiter is not None: rate_limiter.observe_latency( time.perf_counter() - start )
+
+    # The streaming forward function runs the streaming core miner function on the axon's event loop,
+    # sending chunks to the caller as they are produced. If the caller reads slowly the generator is
+    # paused once --streaming.max_buffered chunks are waiting, so memory stays bounded.
+    def stream_forward_fn( synapse: template.protocol.StreamingDummy ) -> template.protocol.StreamingDummy.BTStreamingResponse:
+        return template.protocol.create_chunked_response( synapse, lifecycle.track_stream( dummy_stream( synapse ), request_key( synapse ) ), max_buffered = config.streaming.max_buffered )
+
+    # Streaming requests are blacklisted and prioritized by the same rules as regular ones.
+    def stream_blacklist_fn( synapse: template.protocol.StreamingDummy ) -> bool:
+        return blacklist_fn( synapse )
+
+    def stream_priority_fn( synapse: template.protocol.StreamingDummy ) -> float:
+        return priority_fn( synapse )
 
     # Step 5: Build and link miner functions to the axon.
     # The axon handles request processing, allowing validators to send this process requests.
-    axon = bt.axon( wallet = wallet )
+    axon = axon or bt.axon( wallet = wallet )
     bt.logging.info(f"Axon {axon}")
+    # Keep idle validator connections open across rounds, uvicorn closes them after 5 seconds by default.
+    if hasattr( axon, 'fast_config' ): axon.fast_config.timeout_keep_alive = config.axon.keepalive_timeout
 
     # Attach determiners which functions are called when servicing a request.
     bt.logging.info(f"Attaching forward function to axon.")
     axon.attach(
-        forward_fn = dummy,
+        forward_fn = forward_fn,
         blacklist_fn = blacklist_fn,
         priority_fn = priority_fn,
+    ).attach(
+        forward_fn = stream_forward_fn,
+        blacklist_fn = stream_blacklist_fn,
+        priority_fn = stream_priority_fn,
     )
 
+    # Start  starts the miner's axon, making it active on the network.
+    # It is started before serving, so requests are answered while the chain call below is in flight.
+    bt.logging.info(f"Starting axon server on port: {config.axon.port}")
+    axon.start()
+
     # Serve passes the axon information to the network + netuid we are hosting on.
     # This will auto-update if the axon port of external ip have changed.
     bt.logging.info(f"Serving axon {dummy} on network: {config.subtensor.chain_endpoint} with netuid: {config.netuid}")
     axon.serve( netuid = config.netuid, subtensor = subtensor )
 
-    # Start  starts the miner's axon, making it active on the network.
-    bt.logging.info(f"Starting axon server on port: {config.axon.port}")
-    axon.start()
+    # On SIGHUP the miner reloads without ever closing its axon. Runtime settings are parsed again from the
+    # command line and --config file and applied in place. In process mode a fresh set of worker processes is
+    # started, which imports the forward code from disk again, and once it is ready requests are cut over to
+    # it in one assignment. The previous workers finish the requests they hold and are then stopped, requests
+    # which still reached them after the cutover are handed on to the new workers.
+    # TODO(developer): Apply any additional settings your miner can change at runtime.
+    def reload() -> typing.Optional[template.workers.WorkerPool]:
+        new_config = get_config()
+        executor.max_queue = new_config.executor.max_queue
+        if batcher is not None: batcher.max_queue = new_config.executor.max_queue
+        executor.deadline_margin = new_config.executor.deadline_margin
+        if rate_limiter is not None:
+            rate_limiter.base_rate = new_config.ratelimit.base_rate
+            rate_limiter.permit_multiplier = new_config.ratelimit.permit_multiplier
+            rate_limiter.burst = new_config.ratelimit.burst
+            rate_limiter.adaptive = new_config.ratelimit.adaptive
+            rate_limiter.max_latency = new_config.ratelimit.max_latency
+            rate_limiter.max_queue_depth = new_config.ratelimit.max_queue_depth
+        if cache is not None: cache.ttl = new_config.cache.ttl
+        events.sample_rate = new_config.events.sample_rate
+        lifecycle.drain_timeout = new_config.lifecycle.drain_timeout
+        if worker_pool is None:
+            bt.logging.success('Reloaded config. Forward code is only reloaded with --executor.mode process.')
+            return None
+        new_pool = template.workers.WorkerPool(
+            workers = config.executor.workers,
+            buffer_size = new_config.workers.buffer_size,
+            snapshot_size = new_config.workers.snapshot_size,
+            health_interval = new_config.workers.health_interval,
+        ).start()
+        new_pool.publish( metagraph_syncer.snapshot.index )
+        previous = executor.replace_pool( new_pool )
+        if not previous.drain( lifecycle.drain_timeout ):
+            bt.logging.warning( f'Previous workers still busy after {lifecycle.drain_timeout:.1f}s, stopping them anyway.' )
+        previous.stop()
+        bt.logging.success('Reloaded config and worker processes.')
+        return new_pool
 
     # Step 6: Keep the miner alive
-    # This loop maintains the miner's operations until intentionally stopped.
+    # This loop maintains the miner's operations until intentionally stopped, by SIGTERM or a keyboard interrupt.
     bt.logging.info(f"Starting main loop")
     step = 0
-    while True:
+    while not lifecycle.stop_requested:
         try:
+            if lifecycle.reload_requested:
+                lifecycle.reload_requested = False
+                worker_pool = reload()
+                published_version = metagraph_syncer.snapshot.version
+            # Below: Check the registration again once the first live sync replaced the cached metagraph.
+            if not registration_verified and metagraph_syncer.sync_count > 0:
+                registration_verified = True
+                uid = metagraph_syncer.snapshot.index.uid( wallet.hotkey.ss58_address )
+                if uid is None:
+                    bt.logging.error(f"Your miner: {wallet} is no longer registered, stopping. Run btcli register and try again.")
+                    break
+                if uid != my_subnet_uid:
+                    bt.logging.warning(f"Registration moved from uid {my_subnet_uid} to uid {uid}.")
+                    my_subnet_uid = uid
             # TODO(developer): Define any additional operations to be performed by the miner.
-            # Below: Periodically update our knowledge of the network graph.
+            # Below: Adapt the rate limits to the current load.
+            if rate_limiter is not None: rate_limiter.adapt( queue_depth = executor.depth + ( batcher.depth if batcher is not None else 0 ) )
+            # Below: Share the latest metagraph with the worker processes.
+            if worker_pool is not None and metagraph_syncer.snapshot.version != published_version:
+                snapshot = metagraph_syncer.snapshot
+                worker_pool.publish( snapshot.index )
+                published_version = snapshot.version
+            # Below: Periodically log our standing in the network graph, which is synced in the background.
             if step % 5 == 0:
-                metagraph = subtensor.metagraph(config.netuid)
+                snapshot = metagraph_syncer.snapshot
+                metagraph = snapshot.metagraph
+                # Forget the rate limit buckets of callers that deregistered.
+                if rate_limiter is not None: rate_limiter.prune( snapshot.index )
                 log =  (f'Step:{step} | '\
                         f'Block:{metagraph.block.item()} | '\
                         f'Stake:{metagraph.S[my_subnet_uid]} | '\
@@ -185,21 +496,37 @@ def main( config ):
                         f'Trust:{metagraph.T[my_subnet_uid]} | '\
                         f'Consensus:{metagraph.C[my_subnet_uid] } | '\
                         f'Incentive:{metagraph.I[my_subnet_uid]} | '\
-                        f'Emission:{metagraph.E[my_subnet_uid]}')
+                        f'Emission:{metagraph.E[my_subnet_uid]} | '\
+                        f'Metagraph sync:{snapshot.sync_duration:.2f}s | '\
+                        f'Metagraph staleness:{snapshot.staleness:.1f}s')
+                if worker_pool is not None:
+                    log += f' | Workers ready:{worker_pool.ready}/{worker_pool.workers} ({worker_pool.restart_count} restarts)'
+                if cache is not None:
+                    log += f' | Cache hit rate:{cache.hit_rate:.2%} ({cache.hits} hits, {cache.coalesced} coalesced, {cache.misses} misses, {len( cache )} entries)'
                 bt.logging.info(log)
             step += 1
             time.sleep(1)
 
         # If someone intentionally stops the miner, it'll safely terminate operations.
         except KeyboardInterrupt:
-            axon.stop()
-            bt.logging.success('Miner killed by keyboard interrupt.')
+            bt.logging.info('Keyboard interrupt detected.')
             break
         # In case of unforeseen errors, the miner will log the error and continue operations.
         except Exception as e:
             bt.logging.error(traceback.format_exc())
             continue
 
+    # Turn away new requests and wait for the ones in flight to finish before closing the axon.
+    bt.logging.info(f"Stopping miner, draining {lifecycle.in_flight} requests in flight.")
+    lifecycle.drain()
+    axon.stop()
+    if batcher is not None: batcher.stop()
+    executor.stop()
+    metagraph_syncer.stop()
+    if metrics_server is not None: metrics_server.stop()
+    events.stop()
+    bt.logging.success('Miner stopped.')
+
 
 # This is the main function, which runs the miner.
 if __name__ == "__main__":
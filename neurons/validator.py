@@ -24,6 +24,7 @@
 import os
 import time
 import torch
+import typing
 import argparse
 import traceback
 import bittensor as bt
@@ -31,6 +32,13 @@ import bittensor as bt
 # import this repo
 import template
 
+# Hot path metrics, served on --metrics.port.
+ROUND_SECONDS = template.metrics.histogram( 'validator_round_seconds', 'Time spent querying the sampled miners in a round.' )
+QUERY_SECONDS = template.metrics.histogram( 'validator_query_seconds', 'Latency of each miner query.' )
+SCORE_SECONDS = template.metrics.histogram( 'validator_score_seconds', 'Time spent scoring a round and updating scores.' )
+TIMED_OUT = template.metrics.counter( 'validator_timed_out', 'Miner queries which timed out.' )
+FAILED = template.metrics.counter( 'validator_failed', 'Miner queries which failed without timing out.' )
+
 
 # Step 2: Set up the configuration parser
 # This function is responsible for setting up and parsing command-line arguments.
@@ -41,12 +49,36 @@ def get_config():
     parser.add_argument('--custom', default='my_custom_value', help='Adds a custom value to the parser.')
     # Adds override arguments for network and netuid.
     parser.add_argument( '--netuid', type = int, default = 1, help = "The chain subnet uid." )
+    parser.add_argument( '--step_interval', type = float, default = bt.__blocktime__, help = "Seconds to wait between validator steps." )
+    # Adds streaming arguments.
+    parser.add_argument( '--streaming.enabled', action = 'store_true', default = False, help = "If set, queries miners with the streaming protocol." )
+    parser.add_argument( '--streaming.length', type = int, default = 4, help = "Number of chunks requested from each miner when streaming." )
     # Adds subtensor specific arguments i.e. --subtensor.chain_endpoint ... --subtensor.network ...
     bt.subtensor.add_args(parser)
     # Adds logging specific arguments i.e. --logging.debug ..., --logging.trace .. or --logging.logging_dir ...
     bt.logging.add_args(parser)
     # Adds wallet specific arguments i.e. --wallet.name ..., --wallet.hotkey ./. or --wallet.path ...
     bt.wallet.add_args(parser)
+    # Adds metagraph sync arguments i.e. --metagraph.sync_interval ...
+    template.metagraph.MetagraphSyncer.add_args(parser)
+    # Adds query engine arguments i.e. --query.max_in_flight ..., --query.timeout ... or --query.hedge_delay ...
+    template.query.QueryEngine.add_args(parser)
+    # Adds connection pool arguments i.e. --pool.keepalive_timeout ...
+    template.pool.ConnectionPool.add_args(parser)
+    # Adds sampling arguments i.e. --sampling.sample_size ... or --sampling.coverage_steps ...
+    template.sampling.UidSampler.add_args(parser)
+    # Adds performance history and latency scoring arguments i.e. --history.window ..., --history.latency_weight ...
+    template.history.PerformanceHistory.add_args(parser)
+    # Adds weight setting arguments i.e. --weights.rate_limit ... or --weights.max_backoff ...
+    template.weights.WeightSetter.add_args(parser)
+    # Adds state checkpoint arguments i.e. --state.save_interval ... or --state.reset ...
+    template.state.StateStore.add_args(parser)
+    # Adds metrics arguments i.e. --metrics.port ...
+    template.metrics.MetricsServer.add_args(parser)
+    # Adds structured event log arguments i.e. --events.max_bytes ..., --events.sample_rate ...
+    template.events.EventLog.add_args(parser)
+    # Adds round recorder arguments i.e. --recorder.enabled ..., --recorder.path ...
+    template.recorder.RoundRecorder.add_args(parser)
     # Parse the config (will take command-line arguments if provided)
     # To print help message, run python3 template/miner.py --help
     config =  bt.config(parser)
@@ -68,7 +100,7 @@ def get_config():
     # Return the parsed config.
     return config
 
-def main( config ):
+def main( config, wallet = None, subtensor = None, dendrite = None, max_steps = None ):
     # Set up logging with the provided configuration and directory.
     bt.logging(config=config, logging_dir=config.full_path)
     bt.logging.info(f"Running validator for subnet: {config.netuid} on network: {config.subtensor.chain_endpoint} with config:")
@@ -80,21 +112,55 @@ def main( config ):
     bt.logging.info("Setting up bittensor objects.")
 
     # The wallet holds the cryptographic key pairs for the validator.
-    wallet = bt.wallet( config = config )
+    wallet = wallet or bt.wallet( config = config )
     bt.logging.info(f"Wallet: {wallet}")
 
     # The subtensor is our connection to the Bittensor blockchain.
-    subtensor = bt.subtensor( config = config )
+    shared_subtensor = subtensor
+    subtensor = subtensor or bt.subtensor( config = config )
     bt.logging.info(f"Subtensor: {subtensor}")
 
+    # The connection pool keeps the dendrite's connections to miners alive from one round to the next, so
+    # rounds are not spent on connection setup. Connections to miners whose axon changed are closed on sync.
+    connection_pool = template.pool.ConnectionPool(
+        keepalive_timeout = config.pool.keepalive_timeout,
+        max_connections = config.query.max_in_flight,
+    )
+
     # Dendrite is the RPC client; it lets us send messages to other nodes (axons) in the network.
-    dendrite = bt.dendrite( wallet = wallet )
+    # Its requests go through the connection pool.
+    dendrite = dendrite or template.pool.PooledDendrite( connection_pool, wallet = wallet )
     bt.logging.info(f"Dendrite: {dendrite}")
 
+    # The query engine fans requests out over the dendrite concurrently, with a bounded number in flight,
+    # per-miner timeouts and optional hedged retries. Responses are streamed back as they arrive.
+    query_engine = template.query.QueryEngine(
+        dendrite,
+        max_in_flight = config.query.max_in_flight,
+        timeout = config.query.timeout,
+        hedge_delay = config.query.hedge_delay,
+        max_attempts = config.query.max_attempts,
+    )
+
     # The metagraph holds the state of the network, letting us know about other miners.
-    metagraph = subtensor.metagraph( config.netuid )
+    # It is refreshed on a background thread with its own subtensor connection so the chain call
+    # never stalls the query and scoring cycle. Each step reads the latest immutable snapshot.
+    # On restarts the validator starts from the metagraph cached on disk while the first live sync catches up.
+    metagraph_syncer = template.metagraph.MetagraphSyncer(
+        shared_subtensor or bt.subtensor( config = config ),
+        netuid = config.netuid,
+        interval = config.metagraph.sync_interval,
+        cache_path = None if config.metagraph.no_cache else os.path.join( config.full_path, 'metagraph.pkl' ),
+        compact = config.metagraph.compact,
+    ).start()
+    metagraph = metagraph_syncer.snapshot.metagraph
     bt.logging.info(f"Metagraph: {metagraph}")
 
+    # Keeping a connection to every axon can take more file descriptors than the default soft limit allows.
+    if config.pool.raise_nofile:
+        previous_limit, limit = template.pool.raise_open_file_limit( len( metagraph.axons ), config.query.max_in_flight )
+        bt.logging.info( f'Open file limit: {limit} (was {previous_limit}).' )
+
     # Step 5: Connect the validator to the network
     if wallet.hotkey.ss58_address not in metagraph.hotkeys:
         bt.logging.error(f"\nYour validator: {wallet} if not registered to chain connection: {subtensor} \nRun btcli register and try again.")
@@ -103,81 +169,246 @@ def main( config ):
         # Each miner gets a unique identity (UID) in the network for differentiation.
         my_subnet_uid = metagraph.hotkeys.index(wallet.hotkey.ss58_address)
         bt.logging.info(f"Running validator on uid: {my_subnet_uid}")
+    # A metagraph cached on disk may be stale, so the registration is checked again after the first live sync.
+    registration_verified = metagraph_syncer.sync_count > 0
+
+    # The weight setter submits weights to the chain from its own thread and subtensor connection.
+    # It only sends the newest weights handed to it, respecting the chain's weights rate limit.
+    weight_setter = template.weights.WeightSetter(
+        shared_subtensor or bt.subtensor( config = config ),
+        wallet,
+        netuid = config.netuid,
+        uid = my_subnet_uid,
+        metagraph_syncer = metagraph_syncer,
+        rate_limit = config.weights.rate_limit,
+        max_backoff = config.weights.max_backoff,
+    ).start()
 
     # Step 6: Set up initial scoring weights for validation
     bt.logging.info("Building validation weights.")
     alpha = 0.9
     scores = torch.ones_like(metagraph.S, dtype=torch.float32)
+    step = 0
+
+    # The state store checkpoints scores, step and per-hotkey sampler statistics to disk in the background.
+    # Resume from the last checkpoint so a restart does not fall back to uniform weights. The checkpoint is
+    # keyed by hotkey, so hotkeys which registered while we were down start from a score of 0, like on sync.
+    state_store = template.state.StateStore( os.path.join( config.full_path, 'state.pt' ) ).start()
+    state = None if config.state.reset else state_store.load( metagraph.hotkeys )
+    if state is not None:
+        step = state.step
+        scores = state.scores
+        bt.logging.info(f"Resumed validator state at step {step} for {int( state.found.sum() )}/{len( metagraph.hotkeys )} hotkeys.")
+
+    # The sampler picks the subset of miners queried each step, favouring stale, noisy or changed miners
+    # while guaranteeing every miner is queried at least once every --sampling.coverage_steps steps.
+    # It is reconciled at the resumed step, so the staggered coverage deadlines start from there.
+    sampler = template.sampling.UidSampler(
+        sample_size = config.sampling.sample_size,
+        coverage_steps = config.sampling.coverage_steps,
+        alpha = alpha,
+    )
+    sampler.reconcile( template.metagraph.diff( None, metagraph ), len( metagraph.hotkeys ), step = step )
+    # Restore the reward statistics once the sampler is sized to the metagraph.
+    if state is not None:
+        sampler.reward_mean = state.columns.get( 'reward_mean', sampler.reward_mean )
+        sampler.reward_var = state.columns.get( 'reward_var', sampler.reward_var )
+
+    # The history keeps each miner's last --history.window response latencies, timeouts and correctness in
+    # fixed size ring buffers. It feeds the latency part of the reward and shows which miners drag rounds out.
+    history = template.history.PerformanceHistory( window = config.history.window )
+    history.reconcile( template.metagraph.diff( None, metagraph ), len( metagraph.hotkeys ) )
     bt.logging.info(f"Weights: {scores}")
 
+    # Structured events are written to a rotating JSON lines file by a background thread, so logging
+    # never adds latency to the loop. Per-miner response events are sampled.
+    events = template.events.EventLog(
+        os.path.join( config.full_path, 'events.jsonl' ),
+        max_bytes = config.events.max_bytes,
+        rotate_interval = config.events.rotate_interval,
+        backups = config.events.backups,
+        sample_rate = config.events.sample_rate,
+    ).start()
+
+    # If enabled, every round is appended to a log which benchmarks/replay.py re-scores offline, to reproduce
+    # odd weights and profile scoring changes against real traffic. Writing happens in the background.
+    recorder = None
+    if config.recorder.enabled:
+        recorder = template.recorder.RoundRecorder(
+            config.recorder.path or os.path.join( config.full_path, 'rounds.log' ),
+            max_bytes = config.recorder.max_bytes,
+        ).start()
+
+    # Serve the hot path metrics for scraping if a port is configured.
+    if config.metrics.port is not None:
+        template.metrics.MetricsServer( config.metrics.port, host = config.metrics.host ).start()
+
     # Step 7: The Main Validation Loop
     bt.logging.info("Starting validator loop.")
-    step = 0
-    while True:
+    # Runs until interrupted, or for max_steps steps when driven by the load test.
+    last_step = None if max_steps is None else step + max_steps
+    while last_step is None or step < last_step:
         try:
+            # Check the registration again once the first live sync replaced the cached metagraph.
+            if not registration_verified and metagraph_syncer.sync_count > 0:
+                registration_verified = True
+                uid = metagraph_syncer.snapshot.index.uid( wallet.hotkey.ss58_address )
+                if uid is None:
+                    bt.logging.error(f"Your validator: {wallet} is no longer registered, stopping. Run btcli register and try again.")
+                    break
+                if uid != my_subnet_uid:
+                    bt.logging.warning(f"Registration moved from uid {my_subnet_uid} to uid {uid}.")
+                    my_subnet_uid = weight_setter.uid = uid
+
+            # Collect the responses from miners as each one arrives. Scoring happens in one shot after the round.
+            uids, responses, latencies, timeouts = [], [], [], []
+            def collect_response( result: template.query.QueryResult ):
+                uids.append( result.uid )
+                responses.append( result.response )
+                latencies.append( result.latency )
+                timeouts.append( result.timed_out )
+                QUERY_SECONDS.observe( result.latency )
+                if result.timed_out: TIMED_OUT.inc()
+                elif not result.is_success: FAILED.inc()
+                events.emit_sampled( 'response', step = step, uid = result.uid, latency = result.latency, success = result.is_success, timed_out = result.timed_out )
+
             # TODO(developer): Define how the validator selects a miner to query, how often, etc.
-            # Broadcast a query to all miners on the network.
-            responses = dendrite.query(
-                # Send the query to all axons in the network.
-                metagraph.axons,
+            # Select this step's sample of miners.
+            sampled_uids = sampler.sample( step ).tolist()
+
+            if not config.streaming.enabled:
                 # Construct a dummy query.
-                template.protocol.Dummy( dummy_input = step ), # Construct a dummy query.
-                # All responses have the deserialize function called on them before returning.
-                deserialize = True, 
-            )
-
-            # Log the results for monitoring purposes.
-            bt.logging.info(f"Received dummy responses: {responses}")
-
-            # TODO(developer): Define how the validator scores responses.
-            # Adjust the scores based on responses from miners.
-            for i, resp_i in enumerate(responses):
-                # Initialize the score for the current miner's response.
-                score = 0
-
-                # Check if the miner has provided the correct response by doubling the dummy input.
-                # If correct, set their score for this round to 1.
-                if resp_i == step * 2:
-                    score = 1
-
-                # Update the global score of the miner.
-                # This score contributes to the miner's weight in the network.
-                # A higher weight means that the miner has been consistently responding correctly.
-                scores[i] = alpha * scores[i] + (1 - alpha) * score
-
-            # Periodically update the weights on the Bittensor blockchain.
-            if (step + 1) % 2 == 0:
-                # TODO(developer): Define how the validator normalizes scores before setting weights.
-                weights = torch.nn.functional.normalize(scores, p=1.0, dim=0)
-                bt.logging.info(f"Setting weights: {weights}")
-                # This is a crucial step that updates the incentive mechanism on the Bittensor blockchain.
-                # Miners with higher scores (or weights) receive a larger share of TAO rewards on this subnet.
-                result = subtensor.set_weights(
-                    netuid = config.netuid, # Subnet to set weights on.
-                    wallet = wallet, # Wallet to sign set weights using hotkey.
-                    uids = metagraph.uids, # Uids of the miners to set weights for.
-                    weights = weights, # Weights to set for the miners.
-                    wait_for_inclusion = True
+                query = template.protocol.Dummy( dummy_input = step )
+                expected = step * 2
+                # Query the sampled miners concurrently, collecting each response as it is received.
+                round_time = query_engine.run(
+                    # Send the query to the sampled axons, keyed by uid.
+                    { uid: metagraph.axons[ uid ] for uid in sampled_uids },
+                    query,
+                    # Each response is deserialized and handed to the collector as it arrives.
+                    on_result = collect_response,
+                )
+
+                # TODO(developer): Define how the validator scores responses.
+                # Check which miners have provided the correct response by doubling the dummy input.
+                # Correct responses are rewarded 1, incorrect, missing and timed out responses 0.
+                score_start = time.perf_counter()
+                rewards, mask = template.scoring.exact_match_rewards( responses, expected = expected )
+            else:
+                # The streamed chunks should count up from the dummy input doubled.
+                expected = [ step * 2 + i for i in range( config.streaming.length ) ]
+
+                # Check every chunk as it arrives and cancel a miner's stream as soon as it goes wrong,
+                # including on the first chunk which is not a number at all.
+                def check_chunk( uid: int, chunk: typing.Any ) -> bool:
+                    return template.scoring.is_number( chunk ) and chunk in expected
+
+                # Query the sampled miners concurrently with the streaming protocol.
+                query = template.protocol.StreamingDummy( dummy_input = step, stream_length = config.streaming.length )
+                round_time = query_engine.run(
+                    { uid: metagraph.axons[ uid ] for uid in sampled_uids },
+                    query,
+                    on_result = collect_response,
+                    on_chunk = check_chunk,
                 )
-                if result: bt.logging.success('Successfully set weights.')
-                else: bt.logging.error('Failed to set weights.') 
+
+                # TODO(developer): Define how the validator scores streamed responses.
+                # Miners are rewarded for the fraction of the stream they produced correctly, so partial
+                # output cut off by the timeout still earns a partial reward.
+                score_start = time.perf_counter()
+                rewards, mask = template.scoring.prefix_rewards( responses, expected )
+
+            # Update the global scores of all queried miners in a single tensor operation.
+            # This score contributes to the miner's weight in the network.
+            # A higher weight means that the miner has been consistently responding correctly.
+            uids = torch.tensor( uids, dtype = torch.long )
+            # Record the round in the per-miner history. With --history.latency_weight set, each miner's correctness
+            # is then blended with its recent latency percentile, so that fast and correct miners outscore slow ones.
+            history.record( uids, torch.tensor( latencies ), torch.tensor( timeouts ), rewards.masked_fill( ~mask, 0 ) )
+            judged_latencies = torch.empty( 0 )
+            if config.history.latency_weight > 0:
+                judged_latencies = history.latency_quantile( config.history.latency_quantile, uids )
+                rewards = template.scoring.latency_rewards(
+                    rewards,
+                    judged_latencies,
+                    timeout = config.query.timeout,
+                    weight = config.history.latency_weight,
+                )
+            previous_scores = scores[ uids ] if recorder is not None else None
+            scores = template.scoring.update_scores( scores, uids, rewards, mask, alpha )
+            # Track how noisy each miner's rewards are, noisy miners are sampled more often.
+            sampler.observe( uids, rewards.masked_fill( ~mask, 0 ) )
+            score_time = time.perf_counter() - score_start
+            SCORE_SECONDS.observe( score_time )
+            ROUND_SECONDS.observe( round_time )
+
+            # Log a summary of the round for monitoring purposes, per-miner details are in the metrics and events.
+            responded = int( mask.sum() )
+            bt.logging.info(f"Queried {len( sampled_uids )}/{len( metagraph.axons )} miners in {round_time:.2f}s, {responded} responded")
+            events.emit( 'round', step = step, queried = len( sampled_uids ), responded = responded, round_time = round_time, score_time = score_time, mean_reward = float( rewards.mean() ) if len( rewards ) else 0.0 )
+
+            # Hand the latest weights to the weight setter, which updates them on the Bittensor blockchain
+            # in the background as often as the chain allows. Only the newest weights are ever sent.
+            # TODO(developer): Define how the validator normalizes scores before setting weights.
+            weights = torch.nn.functional.normalize(scores, p=1.0, dim=0)
+            bt.logging.debug(f"Submitting weights for {len( weights )} uids")
+            # This is a crucial step that updates the incentive mechanism on the Bittensor blockchain.
+            # Miners with higher scores (or weights) receive a larger share of TAO rewards on this subnet.
+            weight_setter.submit( metagraph.uids, weights )
+            if recorder is not None:
+                recorder.record(
+                    step, metagraph, query, expected, config.streaming.enabled,
+                    uids, responses, latencies, timeouts, judged_latencies, previous_scores, scores, weights,
+                    alpha = alpha, timeout = config.query.timeout, latency_weight = config.history.latency_weight,
+                )
+            if weight_setter.last_success is not None:
+                bt.logging.info(f"Last weight submission {'succeeded' if weight_setter.last_success else 'failed'} in {weight_setter.last_latency:.2f}s " \
+                                f"({weight_setter.success_count} succeeded, {weight_setter.failure_count} failed)")
 
             # End the current step and prepare for the next iteration.
             step += 1
-            # Resync our local state with the latest state from the blockchain.
-            metagraph = subtensor.metagraph(config.netuid)
+            # Periodically checkpoint the validator state, the write happens in the background.
+            if step % config.state.save_interval == 0:
+                state_store.save( step, metagraph.hotkeys, scores, columns = { 'reward_mean': sampler.reward_mean, 'reward_var': sampler.reward_var } )
+                # Record the miners with the slowest recent responses, for debugging long rounds.
+                slowest = history.slowest( 5, q = config.history.latency_quantile )
+                events.emit( 'slowest', step = step, miners = [ stats._asdict() for stats in slowest ] )
+                bt.logging.debug( 'Slowest miners: ' + ', '.join( f'uid {s.uid} p50 {s.p50:.2f}s p90 {s.p90:.2f}s timeouts {s.timeout_rate:.0%}' for s in slowest ) )
+            # Pick up the latest state of the blockchain, synced in the background.
+            snapshot = metagraph_syncer.snapshot
+            if snapshot.metagraph is not metagraph:
+                metagraph_diff = template.metagraph.diff( metagraph, snapshot.metagraph )
+                # Close pooled connections to miners which restarted or moved, before they fail a query.
+                connection_pool.evict_changed( metagraph, snapshot.metagraph, metagraph_diff, query_engine.loop )
+                metagraph = snapshot.metagraph
+                # Grow the scores to newly registered uids and reset those whose hotkey was replaced, to 0.
+                scores = template.scoring.reconcile_scores( scores, metagraph_diff, size = len( metagraph.hotkeys ) )
+                # Prioritize sampling new uids and uids whose axon changed.
+                sampler.reconcile( metagraph_diff, len( metagraph.hotkeys ), step )
+                history.reconcile( metagraph_diff, len( metagraph.hotkeys ) )
+            bt.logging.debug(f"Metagraph sync: {snapshot.sync_duration:.2f}s | staleness: {snapshot.staleness:.1f}s")
             # Sleep for a duration equivalent to the block time (i.e., time between successive blocks).
-            time.sleep(bt.__blocktime__)
+            time.sleep(config.step_interval)
 
-        # If we encounter an unexpected error, log it for debugging.
-        except RuntimeError as e:
+        # If we encounter an unexpected error, log it for debugging. One bad round must not stop the validator.
+        except Exception as e:
             bt.logging.error(e)
             traceback.print_exc()
 
         # If the user interrupts the program, gracefully exit.
         except KeyboardInterrupt:
             bt.logging.success("Keyboard interrupt detected. Exiting validator.")
-            exit()
+            break
+
+    metagraph_syncer.stop()
+    weight_setter.stop()
+    # Write a final checkpoint and wait for it to hit the disk.
+    state_store.save( step, metagraph.hotkeys, scores, columns = { 'reward_mean': sampler.reward_mean, 'reward_var': sampler.reward_var } )
+    state_store.stop()
+    events.stop()
+    if recorder is not None:
+        recorder.stop()
+    connection_pool.close( query_engine.loop )
 
 # The main function parses the configuration and runs the validator.
 if __name__ == "__main__":
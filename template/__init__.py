@@ -25,3 +25,21 @@ __spec_version__ = (1000 * int(version_split[0])) + (10 * int(version_split[1]))
 
 # Import all submodules.
 from . import protocol
+from . import metagraph
+from . import query
+from . import scoring
+from . import history
+from . import sampling
+from . import weights
+from . import state
+from . import executor
+from . import batching
+from . import cache
+from . import mock
+from . import metrics
+from . import ratelimit
+from . import events
+from . import workers
+from . import lifecycle
+from . import pool
+from . import recorder
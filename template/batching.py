@@ -0,0 +1,253 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import typing
+import argparse
+import threading
+import concurrent.futures
+
+from . import metrics
+from .executor import RequestShed
+
+SHED = metrics.counter( 'batching_shed', 'Requests rejected or evicted because the batcher queue was full.' )
+
+class _Pending( typing.NamedTuple ):
+    """ A request waiting for a batch. """
+    item: typing.Any
+    future: concurrent.futures.Future
+    priority: float
+    deadline: typing.Optional[float]
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent requests into batches so a vectorized forward runs once per batch instead of once per request.
+
+    Callers block in __call__ while a collector thread waits for up to max_batch_size requests, or max_wait
+    seconds after the first request of the batch arrived, whichever comes first. The batch is then passed
+    to batch_fn, which must return one result per request in the same order, and each result is handed
+    back to its caller. Up to max_in_flight batches run at once; while all are busy, arriving requests
+    keep accumulating so batches grow with load, and tail latency stays bounded by max_wait plus one batch.
+
+    Each request carries the priority and timeout it was submitted with. Requests whose caller gave up or
+    whose timeout passed while they waited are dropped before the batch is built, so an overloaded miner
+    does not spend batch slots on answers nobody will read. batch_fn is also passed the highest priority
+    in the batch and the seconds left until its earliest deadline, None if no request has a timeout.
+
+    At most max_queue requests wait for a batch. When the queue is full a new request evicts the lowest
+    priority one if it has a higher priority, and is rejected with RequestShed otherwise, like on the
+    executor. When more requests wait than fit one batch, the highest priority ones are batched first.
+
+    Example usage:
+        batcher = MicroBatcher( lambda xs, priority, timeout: [ x * 2 for x in xs ], max_batch_size = 32, max_wait = 0.005, max_queue = 256 ).start()
+        batcher( 21, priority = 1.0, timeout = 12 ) # 42
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--batching.max_batch_size', type = int, default = 1, help = "Maximum number of requests per forward batch. Batching is disabled if 1." )
+        parser.add_argument( '--batching.max_wait', type = float, default = 0.005, help = "Maximum seconds the first request of a batch waits for others to join it." )
+
+    def __init__(
+        self,
+        batch_fn: typing.Callable[[typing.List[typing.Any], float, typing.Optional[float]], typing.List[typing.Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        max_in_flight: int = 1,
+        max_queue: int = 256,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.batch_count = 0
+        self.item_count = 0
+        self.expired_count = 0
+        self.shed_count = 0
+        self._items: typing.List[_Pending] = []
+        self._first_arrival = 0.0
+        self._condition = threading.Condition()
+        self._slots = threading.Semaphore( max_in_flight )
+        self._stopped = False
+        self._thread: typing.Optional[threading.Thread] = None
+        self._pool: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    @property
+    def mean_batch_size( self ) -> float:
+        return self.item_count / self.batch_count if self.batch_count else 0.0
+
+    @property
+    def depth( self ) -> int:
+        """ The number of requests waiting for a batch. """
+        return len( self._items )
+
+    def admits( self, priority: float ) -> bool:
+        """
+        Returns True if a request with the passed priority would currently be admitted.
+        """
+        items = self._items
+        return len( items ) < self.max_queue or priority > min( ( pending.priority for pending in items ), default = float( '-inf' ) )
+
+    def submit( self, item: typing.Any, priority: float = 0.0, timeout: typing.Optional[float] = None ) -> concurrent.futures.Future:
+        """
+        Adds the item to the next batch and returns a future for its result. If the item is still waiting
+        for a batch after timeout seconds it is dropped and the future fails with a TimeoutError. Raises
+        RequestShed if the queue is full of requests with at least the same priority.
+        """
+        future = concurrent.futures.Future()
+        deadline = None if timeout is None else time.time() + timeout
+        shed: typing.Optional[_Pending] = None
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError( 'MicroBatcher is stopped.' )
+            if len( self._items ) >= self.max_queue:
+                self._prune()
+            if len( self._items ) >= self.max_queue:
+                lowest = min( range( len( self._items ) ), key = lambda i: self._items[i].priority )
+                if priority <= self._items[ lowest ].priority:
+                    self.shed_count += 1
+                    SHED.inc()
+                    raise RequestShed( f'Batch queue is full ({len( self._items )} waiting), rejected priority {priority}.' )
+                shed = self._items.pop( lowest )
+            if not self._items:
+                self._first_arrival = time.time()
+            self._items.append( _Pending( item, future, priority, deadline ) )
+            if len( self._items ) == 1 or len( self._items ) >= self.max_batch_size:
+                self._condition.notify()
+        if shed is not None:
+            self.shed_count += 1
+            SHED.inc()
+            if shed.future.set_running_or_notify_cancel():
+                shed.future.set_exception( RequestShed( 'Shed for a higher priority request.' ) )
+        return future
+
+    def __call__( self, item: typing.Any, priority: float = 0.0, timeout: typing.Optional[float] = None ) -> typing.Any:
+        """
+        Submits the item and blocks until its batch completes, for at most timeout seconds.
+        """
+        future = self.submit( item, priority = priority, timeout = timeout )
+        try:
+            return future.result( timeout = timeout )
+        except concurrent.futures.TimeoutError:
+            # Withdraws the item if it has not been batched yet.
+            future.cancel()
+            raise
+
+    def start( self ) -> "MicroBatcher":
+        self._stopped = False
+        self._pool = concurrent.futures.ThreadPoolExecutor( max_workers = self.max_in_flight, thread_name_prefix = 'MicroBatcher' )
+        self._thread = threading.Thread( target = self._run, name = 'MicroBatcher', daemon = True )
+        self._thread.start()
+        return self
+
+    def stop( self ):
+        """
+        Stops accepting items, runs the items already gathered and waits for in flight batches.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown( wait = True )
+            self._pool = None
+
+    def _run( self ):
+        while True:
+            # Wait for a free slot first, so requests keep accumulating while every batch slot is busy.
+            self._slots.acquire()
+            with self._condition:
+                while not self._items and not self._stopped:
+                    self._condition.wait()
+                while len( self._items ) < self.max_batch_size and not self._stopped:
+                    remaining = self._first_arrival + self.max_wait - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait( remaining )
+                if not self._items:
+                    self._slots.release()
+                    return
+                batch, self._items = self._take( self._items )
+                if self._items:
+                    self._first_arrival = time.time()
+            batch = self._live( batch )
+            if not batch:
+                self._slots.release()
+                continue
+            self.batch_count += 1
+            self.item_count += len( batch )
+            self._pool.submit( self._execute, batch )
+
+    def _take( self, items: typing.List["_Pending"] ) -> typing.Tuple[typing.List["_Pending"], typing.List["_Pending"]]:
+        # Splits the next batch off the waiting items, the highest priorities first and otherwise in arrival order.
+        if len( items ) <= self.max_batch_size:
+            return items, []
+        chosen = set( sorted( range( len( items ) ), key = lambda i: -items[i].priority )[ :self.max_batch_size ] )
+        return [ items[i] for i in sorted( chosen ) ], [ pending for i, pending in enumerate( items ) if i not in chosen ]
+
+    def _prune( self ):
+        # Called with _condition held. Frees the queue of items whose caller cancelled or whose deadline passed.
+        now, waiting = time.time(), []
+        for pending in self._items:
+            if pending.future.cancelled():
+                self.expired_count += 1
+            elif pending.deadline is not None and pending.deadline <= now:
+                self.expired_count += 1
+                if pending.future.set_running_or_notify_cancel():
+                    pending.future.set_exception( concurrent.futures.TimeoutError( 'Timed out waiting for a batch.' ) )
+            else:
+                waiting.append( pending )
+        self._items = waiting
+
+    def _live( self, batch: typing.List["_Pending"] ) -> typing.List["_Pending"]:
+        # Drops the items whose caller cancelled or whose deadline passed while they waited.
+        now, live = time.time(), []
+        for pending in batch:
+            if not pending.future.set_running_or_notify_cancel():
+                self.expired_count += 1
+            elif pending.deadline is not None and pending.deadline <= now:
+                self.expired_count += 1
+                pending.future.set_exception( concurrent.futures.TimeoutError( 'Timed out waiting for a batch.' ) )
+            else:
+                live.append( pending )
+        return live
+
+    def _execute( self, batch: typing.List["_Pending"] ):
+        try:
+            deadlines = [ pending.deadline for pending in batch if pending.deadline is not None ]
+            results = self.batch_fn(
+                [ pending.item for pending in batch ],
+                max( pending.priority for pending in batch ),
+                max( 0.0, min( deadlines ) - time.time() ) if deadlines else None,
+            )
+            if len( results ) != len( batch ):
+                raise ValueError( f'batch_fn returned {len( results )} results for a batch of {len( batch )}.' )
+            for pending, result in zip( batch, results ):
+                pending.future.set_result( result )
+        except Exception as e:
+            for pending in batch:
+                future = pending.future
+                if not future.done():
+                    future.set_exception( e )
+        finally:
+            self._slots.release()
@@ -0,0 +1,172 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import sys
+import time
+import typing
+import argparse
+import threading
+import collections
+import concurrent.futures
+
+from . import metrics
+
+HITS = metrics.counter( 'cache_hits', 'Requests answered from the response cache.' )
+MISSES = metrics.counter( 'cache_misses', 'Requests which computed their response because it was not cached.' )
+COALESCED = metrics.counter( 'cache_coalesced', 'Requests which waited for a concurrent computation of the same response.' )
+EVICTIONS = metrics.counter( 'cache_evictions', 'Cached responses evicted to stay within the entry or memory cap.' )
+
+def field_key( *fields: str ) -> typing.Callable[[typing.Any], typing.Hashable]:
+    """
+    Returns a key function which identifies a synapse by its class and the values of the passed request fields.
+    The fields must hold hashable values.
+
+    Example usage:
+        key_fn = field_key( 'dummy_input' )
+        key_fn( Dummy( dummy_input = 1 ) ) # ( 'Dummy', 1 )
+    """
+    def _key( synapse: typing.Any ) -> typing.Hashable:
+        return ( type( synapse ).__name__, ) + tuple( getattr( synapse, field ) for field in fields )
+    return _key
+
+
+class ResponseCache:
+    """
+    A thread-safe cache of forward results for deterministic synapses, with LRU and TTL eviction and a memory cap.
+
+    Concurrent requests for the same key are deduplicated: the first caller computes the value while the
+    others wait for its result, so identical requests arriving together are computed only once. Failed
+    computations are not cached. Their error is raised to every waiting caller unless it is one of the
+    transient errors, e.g. the leader's request was shed or timed out, which says nothing about the other
+    callers' requests; those callers then retry, one of them computing the value itself.
+
+    Example usage:
+        cache = ResponseCache( max_entries = 4096, ttl = 60 )
+        synapse.dummy_output = cache.get_or_compute( key_fn( synapse ), lambda: forward( synapse ).dummy_output )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--cache.max_entries', type = int, default = 0, help = "Maximum number of cached responses. Caching is disabled if 0." )
+        parser.add_argument( '--cache.max_bytes', type = int, default = 64 * 1024 * 1024, help = "Approximate memory cap for cached responses." )
+        parser.add_argument( '--cache.ttl', type = float, default = 60.0, help = "Seconds a cached response stays valid." )
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 60.0,
+        size_fn: typing.Callable[[typing.Any], int] = sys.getsizeof,
+        transient: typing.Tuple[typing.Type[BaseException], ...] = ( TimeoutError, concurrent.futures.TimeoutError ),
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_fn = size_fn
+        self.transient = transient
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bytes = 0
+        # Maps keys to ( value, expires_at, size ), least recently used first.
+        self._entries: "collections.OrderedDict[typing.Hashable, tuple]" = collections.OrderedDict()
+        self._in_flight: typing.Dict[typing.Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate( self ) -> float:
+        """ The fraction of lookups answered without computing, including deduplicated ones. """
+        lookups = self.hits + self.coalesced + self.misses
+        return ( self.hits + self.coalesced ) / lookups if lookups else 0.0
+
+    def __len__( self ) -> int:
+        return len( self._entries )
+
+    def get_or_compute( self, key: typing.Hashable, compute: typing.Callable[[], typing.Any], timeout: typing.Optional[float] = None ) -> typing.Any:
+        """
+        Returns the cached value for key, computing it with compute() on a miss.
+
+        Args:
+        - key: The cache key of the request.
+        - compute: Computes the value on a miss.
+        - timeout: Maximum seconds to wait for a concurrent computation of the same key.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                entry = self._entries.get( key )
+                if entry is not None:
+                    if entry[1] > time.time():
+                        self._entries.move_to_end( key )
+                        self.hits += 1
+                        HITS.inc()
+                        return entry[0]
+                    self._remove( key )
+                future = self._in_flight.get( key )
+                if future is None:
+                    future = self._in_flight[ key ] = concurrent.futures.Future()
+                    self.misses += 1
+                    MISSES.inc()
+                    break
+                self.coalesced += 1
+                COALESCED.inc()
+            # Raises TimeoutError if the leader does not finish in time.
+            error = future.exception( timeout = None if deadline is None else max( 0.0, deadline - time.time() ) )
+            if error is None:
+                return future.result()
+            if not isinstance( error, self.transient ):
+                raise error
+            # The leader's request was shed or timed out, retry as a request of our own.
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[ key ]
+            future.set_exception( e )
+            raise
+        with self._lock:
+            del self._in_flight[ key ]
+            self._insert( key, value )
+        future.set_result( value )
+        return value
+
+    def clear( self ):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _insert( self, key: typing.Hashable, value: typing.Any ):
+        size = self.size_fn( value )
+        if key in self._entries:
+            self._remove( key )
+        if size > self.max_bytes:
+            return
+        self._entries[ key ] = ( value, time.time() + self.ttl, size )
+        self.bytes += size
+        while len( self._entries ) > self.max_entries or self.bytes > self.max_bytes:
+            _, ( _, _, evicted_size ) = self._entries.popitem( last = False )
+            self.bytes -= evicted_size
+            self.evictions += 1
+            EVICTIONS.inc()
+
+    def _remove( self, key: typing.Hashable ):
+        _, _, size = self._entries.pop( key )
+        self.bytes -= size
@@ -0,0 +1,151 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import time
+import random
+import typing
+import argparse
+import threading
+import collections
+import bittensor as bt
+
+from . import metrics
+
+EVENTS_DROPPED = metrics.counter( 'events_dropped', 'Structured log events dropped because the writer fell behind.' )
+
+
+class EventLog:
+    """
+    A structured JSON lines log written by a background thread, so logging from the request path only
+    costs appending a tuple to a deque. Formatting, writing and rotation all happen off the hot path.
+
+    The buffer holds at most max_buffered events; if the writer falls behind the oldest events are dropped
+    rather than blocking callers. High frequency events should be logged with emit_sampled, which keeps
+    only a fraction of them. The file is rotated when it grows past max_bytes or is older than
+    rotate_interval seconds, keeping the most recent backups as events.jsonl.1, events.jsonl.2, ...
+
+    Example usage:
+        events = EventLog( os.path.join( config.full_path, 'events.jsonl' ) ).start()
+        events.emit( 'round', step = 1, round_time = 0.5 )
+        events.emit_sampled( 'blacklist', hotkey = hotkey, reason = 'unregistered' )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--events.max_bytes', type = int, default = 64 * 1024 * 1024, help = "Size in bytes after which the event log is rotated." )
+        parser.add_argument( '--events.rotate_interval', type = float, default = 24 * 60 * 60, help = "Seconds after which the event log is rotated." )
+        parser.add_argument( '--events.backups', type = int, default = 5, help = "Number of rotated event logs to keep." )
+        parser.add_argument( '--events.sample_rate', type = float, default = 0.01, help = "Fraction of high frequency events, e.g. per request, which are logged." )
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        rotate_interval: float = 24 * 60 * 60,
+        backups: int = 5,
+        sample_rate: float = 0.01,
+        max_buffered: int = 100000,
+        flush_interval: float = 0.25,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.emitted = 0
+        self.written = 0
+        self._buffer: typing.Deque[tuple] = collections.deque( maxlen = max_buffered )
+        self._file: typing.Optional[typing.TextIO] = None
+        self._opened_at = 0.0
+        self._stop_event = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def emit( self, event: str, level: str = 'INFO', **fields ):
+        """ Queues a structured event. Field values must be JSON serializable or convertible with str(). """
+        self.emitted += 1
+        self._buffer.append( ( time.time(), level, event, fields ) )
+
+    def emit_sampled( self, event: str, level: str = 'TRACE', **fields ):
+        """ Queues the event with probability sample_rate, for events logged on every request. """
+        if random.random() < self.sample_rate:
+            fields['sample_rate'] = self.sample_rate
+            self.emit( event, level, **fields )
+
+    def start( self ) -> "EventLog":
+        os.makedirs( os.path.dirname( self.path ) or '.', exist_ok = True )
+        self._open()
+        self._stop_event.clear()
+        self._thread = threading.Thread( target = self._run, name = 'EventLog', daemon = True )
+        self._thread.start()
+        return self
+
+    def stop( self ):
+        """ Stops the writer thread after writing every buffered event. """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _open( self ):
+        self._file = open( self.path, 'a', encoding = 'utf-8' )
+        self._opened_at = time.time()
+
+    def _rotate( self ):
+        self._file.close()
+        for i in range( self.backups - 1, 0, -1 ):
+            if os.path.exists( f'{self.path}.{i}' ):
+                os.replace( f'{self.path}.{i}', f'{self.path}.{i + 1}' )
+        if self.backups > 0:
+            os.replace( self.path, f'{self.path}.1' )
+        else:
+            os.remove( self.path )
+        self._open()
+
+    def _flush( self ):
+        lines = []
+        buffer = self._buffer
+        while buffer:
+            created, level, event, fields = buffer.popleft()
+            record = { 'time': created, 'level': level, 'event': event }
+            record.update( fields )
+            lines.append( json.dumps( record, default = str ) )
+        if not lines:
+            return
+        self._file.write( '\n'.join( lines ) + '\n' )
+        self._file.flush()
+        self.written += len( lines )
+        # Events pushed out of the full buffer were never written.
+        dropped = self.emitted - self.written - len( buffer )
+        if dropped > 0:
+            EVENTS_DROPPED.inc( dropped )
+            self.written += dropped
+        if self._file.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_interval:
+            self._rotate()
+
+    def _run( self ):
+        while not self._stop_event.wait( self.flush_interval ):
+            try:
+                self._flush()
+            except Exception as e:
+                bt.logging.error( f'Could not write events to {self.path}: {e}' )
+        self._flush()
+        self._file.close()
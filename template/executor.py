@@ -0,0 +1,238 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import heapq
+import typing
+import argparse
+import itertools
+import threading
+import concurrent.futures
+import bittensor as bt
+
+from . import metrics
+from . import workers as worker_pool
+
+SHED = metrics.counter( 'executor_shed', 'Requests rejected or evicted because the executor queue was full.' )
+EXPIRED = metrics.counter( 'executor_expired', 'Requests dropped because their deadline passed before they completed.' )
+QUEUE_WAIT_SECONDS = metrics.histogram( 'executor_queue_wait_seconds', 'Time requests spent queued before a worker picked them up.' )
+
+
+class RequestShed( Exception ):
+    """ Raised when a request is rejected because the executor is saturated. """
+
+
+class DeadlineExceeded( TimeoutError ):
+    """ Raised when a request's deadline passes before it could be executed. """
+
+
+class _Request:
+    __slots__ = ( "priority", "deadline", "fn", "args", "future", "queued_at" )
+
+    def __init__( self, priority: float, deadline: float, fn: typing.Callable, args: tuple ):
+        self.queued_at = time.time()
+        self.priority = priority
+        self.deadline = deadline
+        self.fn = fn
+        self.args = args
+        self.future = concurrent.futures.Future()
+
+
+class PriorityExecutor:
+    """
+    Runs miner forward calls on a fixed pool of workers, highest priority first, with a bounded queue.
+
+    When the queue is full a new request is only admitted if it outranks the lowest priority request
+    waiting, which is then shed. Callers can check admits() before deserialization to reject low priority
+    requests early. Every request carries a deadline, derived from the caller's timeout, and requests
+    whose deadline passed while queued are dropped without running.
+
+    In thread mode the forward runs on the worker threads. In process mode each worker thread hands the
+    forward to a WorkerPool process, in which case the forward and its arguments must be picklable.
+    A pool can be passed in to configure it, otherwise one with a process per worker thread is started.
+
+    Example usage:
+        executor = PriorityExecutor( workers = 4, max_queue = 256 ).start()
+        synapse = executor.run( forward, synapse, priority = stake, timeout = synapse.timeout )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--executor.workers', type = int, default = 4, help = "Number of concurrent forward calls." )
+        parser.add_argument( '--executor.max_queue', type = int, default = 256, help = "Maximum number of requests waiting for a worker." )
+        parser.add_argument( '--executor.mode', type = str, default = 'thread', choices = [ 'thread', 'process' ], help = "Whether forward calls run in threads or processes." )
+        parser.add_argument( '--executor.deadline_margin', type = float, default = 0.5, help = "Seconds reserved from each caller's timeout for the response to travel back." )
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 256,
+        mode: str = 'thread',
+        deadline_margin: float = 0.5,
+        pool: typing.Optional[worker_pool.WorkerPool] = None,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.deadline_margin = deadline_margin
+        self.shed_count = 0
+        self.expired_count = 0
+        self._queue: typing.List[tuple] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads: typing.List[threading.Thread] = []
+        self.pool = pool
+
+    @property
+    def depth( self ) -> int:
+        """ The number of requests waiting for a worker. """
+        return len( self._queue )
+
+    def admits( self, priority: float ) -> bool:
+        """
+        Returns True if a request with the passed priority would currently be admitted.
+        """
+        return len( self._queue ) < self.max_queue or priority > self._lowest_priority()
+
+    def submit( self, fn: typing.Callable, *args, priority: float = 0.0, timeout: float = 12.0 ) -> concurrent.futures.Future:
+        """
+        Queues fn( *args ) and returns a future for its result. Raises RequestShed if the request is not admitted.
+        """
+        request = _Request( priority, time.time() + timeout - self.deadline_margin, fn, args )
+        shed: typing.Optional[_Request] = None
+        with self._condition:
+            if self._stopped:
+                raise RequestShed( 'Executor is stopped.' )
+            if len( self._queue ) >= self.max_queue:
+                if priority <= self._lowest_priority():
+                    self.shed_count += 1
+                    SHED.inc()
+                    raise RequestShed( f'Queue is full ({len( self._queue )} waiting), rejected priority {priority}.' )
+                shed = self._pop_lowest()
+            heapq.heappush( self._queue, ( -priority, next( self._counter ), request ) )
+            self._condition.notify()
+        if shed is not None:
+            self.shed_count += 1
+            SHED.inc()
+            shed.future.set_exception( RequestShed( 'Shed for a higher priority request.' ) )
+        return request.future
+
+    def run( self, fn: typing.Callable, *args, priority: float = 0.0, timeout: float = 12.0 ) -> typing.Any:
+        """
+        Submits fn( *args ) and blocks until it completes, raising DeadlineExceeded if the deadline passes first.
+        """
+        future = self.submit( fn, *args, priority = priority, timeout = timeout )
+        try:
+            return future.result( timeout = max( 0.0, timeout - self.deadline_margin ) )
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded( f'Request did not complete within {timeout}s.' )
+
+    def start( self ) -> "PriorityExecutor":
+        if self.mode == 'process':
+            self.pool = ( self.pool or worker_pool.WorkerPool( workers = self.workers ) ).start()
+        self._stopped = False
+        self._threads = [
+            threading.Thread( target = self._run, name = f'PriorityExecutor-{i}', daemon = True )
+            for i in range( self.workers )
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop( self, timeout: typing.Optional[float] = None ):
+        """
+        Stops accepting requests and waits for the workers to finish the requests already queued.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join( timeout )
+        self._threads = []
+        if self.mode == 'process':
+            self.pool.stop()
+
+    def replace_pool( self, pool: worker_pool.WorkerPool ) -> worker_pool.WorkerPool:
+        """
+        Routes every following request to the passed, started pool and returns the previous one, which keeps
+        running the requests it already took and is left for the caller to drain and stop.
+        """
+        previous, self.pool = self.pool, pool
+        return previous
+
+    def _run_on_pool( self, request: _Request ) -> typing.Any:
+        # A pool replaced while this thread was reading self.pool refuses the call once it drains, without
+        # running it, so the call is retried on the pool which replaced it.
+        while True:
+            pool = self.pool
+            try:
+                return pool.run( request.fn, *request.args, timeout = request.deadline - time.time() )
+            except worker_pool.PoolClosed:
+                if self.pool is pool:
+                    raise
+
+    def _lowest_priority( self ) -> float:
+        # The heap orders by descending priority, the lowest priority request is among the leaves.
+        queue = self._queue
+        return -max( queue[ len( queue ) // 2: ] )[0] if queue else float( '-inf' )
+
+    def _pop_lowest( self ) -> _Request:
+        queue = self._queue
+        position = max( range( len( queue ) // 2, len( queue ) ), key = lambda i: queue[i] )
+        entry = queue[ position ]
+        queue[ position ] = queue[-1]
+        queue.pop()
+        if position < len( queue ):
+            heapq.heapify( queue )
+        return entry[2]
+
+    def _run( self ):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                request = heapq.heappop( self._queue )[2]
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            now = time.time()
+            QUEUE_WAIT_SECONDS.observe( now - request.queued_at )
+            remaining = request.deadline - now
+            if remaining <= 0:
+                # The caller has already given up on this request, don't spend compute on it.
+                self.expired_count += 1
+                EXPIRED.inc()
+                request.future.set_exception( DeadlineExceeded( 'Request expired while queued.' ) )
+                continue
+            try:
+                if self.mode == 'process':
+                    result = self._run_on_pool( request )
+                else:
+                    result = request.fn( *request.args )
+                request.future.set_result( result )
+            except concurrent.futures.TimeoutError:
+                self.expired_count += 1
+                EXPIRED.inc()
+                request.future.set_exception( DeadlineExceeded( 'Request did not complete before its deadline.' ) )
+            except Exception as e:
+                bt.logging.trace( f'Forward raised: {e}' )
+                request.future.set_exception( e )
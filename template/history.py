@@ -0,0 +1,163 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import torch
+import typing
+import argparse
+
+from .metagraph import MetagraphDiff
+
+
+class MinerStats( typing.NamedTuple ):
+    """
+    A summary of a uid's recent queries.
+
+    - uid: The miner's uid.
+    - count: The number of queries in the history, at most the window size.
+    - p50: The median response latency in seconds.
+    - p90: The 90th percentile response latency in seconds.
+    - timeout_rate: The fraction of queries which timed out.
+    - accuracy: The mean correctness of the responses, counting missing responses as 0.
+    """
+    uid: int
+    count: int
+    p50: float
+    p90: float
+    timeout_rate: float
+    accuracy: float
+
+
+class PerformanceHistory:
+    """
+    Keeps the last window queries of every uid in fixed size ring buffers: response latency, whether the
+    query timed out and how correct the response was. Memory is window * 12 bytes per uid whatever the
+    validator's uptime, and a round is recorded for all queried uids with a handful of tensor operations.
+
+    Slots which were never written hold NaN, so statistics over a uid with a short history only
+    cover the queries actually made.
+
+    Example usage:
+        history = PerformanceHistory( window = 32 )
+        history.reconcile( template.metagraph.diff( None, metagraph ), len( metagraph.hotkeys ) )
+        history.record( uids, latencies, timed_out, rewards )
+        p90 = history.latency_quantile( 0.9, uids )
+        for stats in history.slowest( 5 ): ...
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--history.window', type = int, default = 32, help = "Number of recent queries remembered per uid." )
+        parser.add_argument( '--history.latency_weight', type = float, default = 0.0, help = "Share of the reward given for speed instead of correctness alone, e.g. 0.2. Latency is ignored if 0, the default." )
+        parser.add_argument( '--history.latency_quantile', type = float, default = 0.9, help = "Quantile of each miner's recent latencies its speed is judged by." )
+
+    def __init__( self, window: int = 32 ):
+        self.window = max( 1, window )
+        self.latency = torch.zeros( 0, self.window )
+        self.timed_out = torch.zeros( 0, self.window )
+        self.correct = torch.zeros( 0, self.window )
+        self.cursor = torch.zeros( 0, dtype = torch.long )
+        self.count = torch.zeros( 0, dtype = torch.long )
+
+    @property
+    def size( self ) -> int:
+        return self.cursor.shape[0]
+
+    def reconcile( self, diff: MetagraphDiff, size: int ):
+        """
+        Resizes the history to the metagraph size and clears the history of uids whose hotkey changed.
+        """
+        if size != self.size:
+            keep = min( size, self.size )
+            def resize( values: torch.Tensor, fill: float ) -> torch.Tensor:
+                resized = torch.full( ( size, ) + values.shape[1:], fill, dtype = values.dtype )
+                resized[ :keep ] = values[ :keep ]
+                return resized
+            self.latency = resize( self.latency, math.nan )
+            self.timed_out = resize( self.timed_out, math.nan )
+            self.correct = resize( self.correct, math.nan )
+            self.cursor = resize( self.cursor, 0 )
+            self.count = resize( self.count, 0 )
+        new_uids = [ uid for uid in diff.new_uids if uid < size ]
+        if new_uids:
+            self.latency[ new_uids ] = math.nan
+            self.timed_out[ new_uids ] = math.nan
+            self.correct[ new_uids ] = math.nan
+            self.cursor[ new_uids ] = 0
+            self.count[ new_uids ] = 0
+
+    def record( self, uids: torch.Tensor, latencies: torch.Tensor, timed_out: torch.Tensor, correct: torch.Tensor ):
+        """
+        Appends one query for every passed uid, overwriting each uid's oldest query once its buffer is full.
+
+        Args:
+        - uids: A long tensor of the queried uids, each at most once.
+        - latencies: The response latency of each uid in seconds.
+        - timed_out: True where the query timed out.
+        - correct: The correctness of each response in [0, 1], 0 where no response was received.
+        """
+        position = self.cursor[ uids ]
+        self.latency[ uids, position ] = latencies.to( self.latency.dtype )
+        self.timed_out[ uids, position ] = timed_out.to( self.timed_out.dtype )
+        self.correct[ uids, position ] = correct.to( self.correct.dtype )
+        self.cursor[ uids ] = ( position + 1 ) % self.window
+        self.count[ uids ] = torch.clamp( self.count[ uids ] + 1, max = self.window )
+
+    def latency_quantile( self, q: float, uids: typing.Optional[torch.Tensor] = None ) -> torch.Tensor:
+        """
+        Returns the q-th quantile of the recent latencies of the passed uids, or of every uid. NaN for uids without history.
+        """
+        return torch.nanquantile( self.latency if uids is None else self.latency[ uids ], q, dim = 1 )
+
+    def timeout_rate( self ) -> torch.Tensor:
+        """
+        Returns the fraction of every uid's recent queries which timed out, NaN for uids without history.
+        """
+        return torch.nanmean( self.timed_out, dim = 1 )
+
+    def accuracy( self ) -> torch.Tensor:
+        """
+        Returns the mean correctness of every uid's recent responses, NaN for uids without history.
+        """
+        return torch.nanmean( self.correct, dim = 1 )
+
+    def stats( self, uids: typing.Optional[typing.Sequence[int]] = None ) -> typing.List[MinerStats]:
+        """
+        Returns the summary of the passed uids, or of every uid with history.
+        """
+        if uids is None:
+            uids = torch.nonzero( self.count > 0 ).flatten().tolist()
+        quantiles = torch.nanquantile( self.latency[ uids ], torch.tensor( [ 0.5, 0.9 ] ), dim = 1 )
+        rows = zip(
+            uids,
+            self.count[ uids ].tolist(),
+            quantiles[0].tolist(),
+            quantiles[1].tolist(),
+            torch.nanmean( self.timed_out[ uids ], dim = 1 ).tolist(),
+            torch.nanmean( self.correct[ uids ], dim = 1 ).tolist(),
+        )
+        return [ MinerStats( *row ) for row in rows ]
+
+    def slowest( self, k: int = 10, q: float = 0.9 ) -> typing.List[MinerStats]:
+        """
+        Returns the summaries of the k uids with the highest q-th latency quantile, i.e. the ones dragging rounds out.
+        """
+        latency = self.latency_quantile( q ).nan_to_num( nan = -math.inf )
+        k = min( k, int( ( self.count > 0 ).sum() ) )
+        return self.stats( torch.topk( latency, k ).indices.tolist() ) if k > 0 else []
@@ -0,0 +1,168 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import signal
+import typing
+import argparse
+import threading
+import contextlib
+import bittensor as bt
+
+from . import metrics
+
+IN_FLIGHT = metrics.gauge( 'lifecycle_in_flight', 'Requests admitted by the blacklist or being handled by a forward function.' )
+DRAIN_SECONDS = metrics.histogram( 'lifecycle_drain_seconds', 'Time spent waiting for in-flight requests to finish on shutdown.' )
+
+
+class Lifecycle:
+    """
+    Tracks the requests a neuron is handling and turns process signals into flags for its main loop,
+    so it can stop or reload without dropping requests.
+
+    SIGTERM requests a graceful stop and SIGHUP a reload. The handlers only set the stop_requested and
+    reload_requested flags, which the main loop polls. On stop it calls drain(), which makes draining
+    True, so the blacklist can turn away new requests, and waits up to drain_timeout seconds for the
+    requests in flight to finish.
+
+    A request counts as in flight from the moment the blacklist admits it, so requests which are still
+    being deserialized or prioritized when draining starts are waited for as well. The forward picks the
+    admission up by the same key. Admitted requests which never reach a forward, because a later hook
+    failed, stop counting once their timeout passed.
+
+    Example usage:
+        lifecycle = Lifecycle( drain_timeout = 12 ).install()
+        if not lifecycle.admit( key, timeout = synapse.timeout ):
+            ... # Draining, turn the request away.
+        with lifecycle.track( key ):
+            ... # Handle the request.
+        ...
+        if lifecycle.stop_requested:
+            lifecycle.drain()
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--lifecycle.drain_timeout', type = float, default = 12.0, help = "Seconds to wait for in-flight requests to finish when stopping." )
+
+    def __init__( self, drain_timeout: float = 12.0 ):
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.stop_requested = False
+        self.reload_requested = False
+        self._in_flight = 0
+        # Keys of admitted requests which have not reached their forward yet, mapped to their expiry time.
+        self._admitted: typing.Dict[typing.Hashable, float] = {}
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight( self ) -> int:
+        """ The number of requests admitted or currently being handled. """
+        with self._condition:
+            self._expire()
+            return self._in_flight + len( self._admitted )
+
+    def install( self ) -> "Lifecycle":
+        """
+        Installs the SIGTERM and SIGHUP handlers. Signal handlers can only be installed from the main thread,
+        elsewhere this is a no-op and the flags must be set by the caller.
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal( signal.SIGTERM, self._on_stop )
+            signal.signal( signal.SIGHUP, self._on_reload )
+        return self
+
+    def _on_stop( self, signum: int, frame ):
+        # Handlers run on the main thread between bytecodes, so they must not take locks the main thread may hold.
+        self.stop_requested = True
+
+    def _on_reload( self, signum: int, frame ):
+        self.reload_requested = True
+
+    def admit( self, key: typing.Hashable, timeout: float ) -> bool:
+        """
+        Counts the request with key as in flight until track( key ) picks it up, or for timeout seconds at most.
+        Returns False without counting it once draining has started.
+        """
+        with self._condition:
+            if self.draining:
+                return False
+            self._admitted[ key ] = time.time() + timeout
+            self._publish()
+        return True
+
+    @contextlib.contextmanager
+    def track( self, key: typing.Optional[typing.Hashable] = None ) -> typing.Iterator[None]:
+        """ Counts the enclosed block as an in-flight request, taking over the admission of key if there is one. """
+        with self._condition:
+            self._admitted.pop( key, None )
+            self._in_flight += 1
+            self._publish()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._publish()
+
+    async def track_stream( self, chunks: typing.AsyncIterator[typing.Any], key: typing.Optional[typing.Hashable] = None ) -> typing.AsyncIterator[typing.Any]:
+        """ Counts a streaming response as in flight until its last chunk was produced. """
+        with self.track( key ):
+            async for chunk in chunks:
+                yield chunk
+
+    def _expire( self ):
+        # Called with _condition held.
+        now = time.time()
+        for key in [ key for key, expiry in self._admitted.items() if expiry <= now ]:
+            del self._admitted[ key ]
+
+    def _publish( self ):
+        # Called with _condition held.
+        self._expire()
+        IN_FLIGHT.set( self._in_flight + len( self._admitted ) )
+        if self._in_flight == 0 and not self._admitted:
+            self._condition.notify_all()
+
+    def drain( self, timeout: typing.Optional[float] = None ) -> bool:
+        """
+        Starts draining and waits for the in-flight requests to finish. Returns False if some were still
+        running when the timeout, drain_timeout by default, passed.
+        """
+        timeout = self.drain_timeout if timeout is None else timeout
+        start = time.time()
+        deadline = start + timeout
+        with self._condition:
+            self.draining = True
+            while True:
+                self._publish()
+                remaining = deadline - time.time()
+                drained = self._in_flight == 0 and not self._admitted
+                if drained or remaining <= 0:
+                    break
+                # Wake up when the next admission expires, nothing notifies when one does.
+                next_expiry = min( self._admitted.values(), default = deadline )
+                self._condition.wait( max( 0.0, min( remaining, next_expiry - time.time() ) ) )
+            in_flight = self._in_flight + len( self._admitted )
+        DRAIN_SECONDS.observe( time.time() - start )
+        if drained:
+            bt.logging.info( f'Drained in-flight requests in {time.time() - start:.2f}s.' )
+        else:
+            bt.logging.warning( f'{in_flight} requests still in flight after {timeout:.1f}s, stopping anyway.' )
+        return drained
@@ -0,0 +1,548 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import sys
+import mmap
+import json
+import time
+import pickle
+import struct
+import typing
+import functools
+import ipaddress
+import argparse
+import threading
+import traceback
+import numpy as np
+import bittensor as bt
+
+from . import metrics
+
+SYNC_SECONDS = metrics.histogram( 'metagraph_sync_seconds', 'Time spent fetching the metagraph from the chain.' )
+SYNC_FAILURES = metrics.counter( 'metagraph_sync_failures', 'Metagraph syncs which raised.' )
+STALENESS_SECONDS = metrics.gauge( 'metagraph_staleness_seconds', 'Seconds since the last successful metagraph sync.' )
+
+
+class HotkeyIndex:
+    """
+    A read-only lookup table built once from a metagraph sync. It maps each registered
+    hotkey to its UID and caches the per-UID stake and validator_permit values as plain
+    python lists, so the miner's blacklist and priority functions can answer in constant
+    time instead of scanning metagraph.hotkeys on every request.
+
+    The index is never mutated after construction. When the metagraph is refreshed a new
+    index is built and the reference is swapped, so readers always see a complete graph.
+
+    Attributes:
+    - block: The block at which the metagraph backing this index was synced.
+    - uids: A dict mapping hotkey ss58 addresses to their UID.
+    - stake: A list of the stake (metagraph.S) held by each UID.
+    - validator_permit: A list of booleans, True if the UID holds a validator permit.
+    """
+
+    __slots__ = ( "block", "uids", "stake", "validator_permit" )
+
+    def __init__( self, metagraph: typing.Union["bt.metagraph", "CompactMetagraph"] ):
+        self.uids = { hotkey: uid for uid, hotkey in enumerate( metagraph.hotkeys ) }
+        if isinstance( metagraph, CompactMetagraph ):
+            # Read straight from the columns, without building torch tensors.
+            self.block = metagraph.block_number
+            self.stake = metagraph.stake.tolist()
+            self.validator_permit = metagraph.permit.tolist()
+            return
+        self.block = int( metagraph.block )
+        self.stake = [ float( s ) for s in metagraph.S.tolist() ]
+        self.validator_permit = [ bool( p ) for p in metagraph.validator_permit.tolist() ]
+
+    def __contains__( self, hotkey: str ) -> bool:
+        return hotkey in self.uids
+
+    def __len__( self ) -> int:
+        return len( self.uids )
+
+    def uid( self, hotkey: str ) -> typing.Optional[int]:
+        """
+        Returns the UID registered to the passed hotkey or None if it is not registered.
+        """
+        return self.uids.get( hotkey )
+
+    def stake_of( self, hotkey: str ) -> float:
+        """
+        Returns the stake held by the passed hotkey, 0.0 if it is not registered.
+        """
+        uid = self.uids.get( hotkey )
+        return 0.0 if uid is None else self.stake[ uid ]
+
+    def has_permit( self, hotkey: str ) -> bool:
+        """
+        Returns True if the passed hotkey is registered and holds a validator permit.
+        """
+        uid = self.uids.get( hotkey )
+        return False if uid is None else self.validator_permit[ uid ]
+
+
+class MetagraphDiff( typing.NamedTuple ):
+    """
+    The difference between two consecutive metagraph syncs.
+
+    Attributes:
+    - new_uids: UIDs which were registered to a new hotkey, either appended or replacing a deregistered one.
+    - deregistered_uids: UIDs whose previous hotkey is no longer registered under them.
+    - changed_axon_uids: UIDs which kept their hotkey but changed their axon ip, port or protocol.
+    """
+    new_uids: typing.List[int]
+    deregistered_uids: typing.List[int]
+    changed_axon_uids: typing.List[int]
+
+    def __bool__( self ) -> bool:
+        return bool( self.new_uids or self.deregistered_uids or self.changed_axon_uids )
+
+
+def diff( previous: typing.Optional["bt.metagraph"], current: "bt.metagraph" ) -> MetagraphDiff:
+    """
+    Computes the new, deregistered and changed-axon UIDs between two metagraphs.
+    If there is no previous metagraph every UID in the current one is treated as new.
+    """
+    if previous is None:
+        return MetagraphDiff( list( range( len( current.hotkeys ) ) ), [], [] )
+    if isinstance( previous, CompactMetagraph ) and isinstance( current, CompactMetagraph ):
+        return _compact_diff( previous, current )
+    new_uids, deregistered_uids, changed_axon_uids = [], [], []
+    for uid in range( max( len( previous.hotkeys ), len( current.hotkeys ) ) ):
+        old_hotkey = previous.hotkeys[ uid ] if uid < len( previous.hotkeys ) else None
+        new_hotkey = current.hotkeys[ uid ] if uid < len( current.hotkeys ) else None
+        if old_hotkey != new_hotkey:
+            if old_hotkey is not None: deregistered_uids.append( uid )
+            if new_hotkey is not None: new_uids.append( uid )
+            continue
+        old_axon, new_axon = previous.axons[ uid ], current.axons[ uid ]
+        if ( old_axon.ip, old_axon.port, old_axon.protocol ) != ( new_axon.ip, new_axon.port, new_axon.protocol ):
+            changed_axon_uids.append( uid )
+    return MetagraphDiff( new_uids, deregistered_uids, changed_axon_uids )
+
+
+def _compact_diff( previous: "CompactMetagraph", current: "CompactMetagraph" ) -> MetagraphDiff:
+    # The same comparisons as diff(), on whole columns.
+    shared = min( len( previous ), len( current ) )
+    replaced = previous.hotkey_table[ :shared ] != current.hotkey_table[ :shared ]
+    old_axons, new_axons = previous.axon_table[ :shared ], current.axon_table[ :shared ]
+    moved = ( old_axons['ip'] != new_axons['ip'] ).any( axis = 1 ) | ( old_axons['port'] != new_axons['port'] ) | ( old_axons['protocol'] != new_axons['protocol'] )
+    replaced_uids = np.flatnonzero( replaced ).tolist()
+    return MetagraphDiff(
+        new_uids = replaced_uids + list( range( shared, len( current ) ) ),
+        deregistered_uids = replaced_uids + list( range( shared, len( previous ) ) ),
+        changed_axon_uids = np.flatnonzero( moved & ~replaced ).tolist(),
+    )
+
+
+# The axon of each uid packed into a fixed size record. The ip is stored in network byte order,
+# in the first 4 bytes for ipv4 and in all 16 for ipv6.
+AXON_DTYPE = np.dtype( [ ( 'ip', 'u1', ( 16, ) ), ( 'port', '<u2' ), ( 'ip_type', 'u1' ), ( 'protocol', 'u1' ), ( 'version', '<u4' ) ] )
+
+# The per-uid columns of a CompactMetagraph, with the bt.metagraph attribute each is read from and its dtype.
+_COLUMNS = {
+    'stake': ( 'S', '<f4' ),
+    'rank': ( 'R', '<f4' ),
+    'trust': ( 'T', '<f4' ),
+    'consensus': ( 'C', '<f4' ),
+    'incentive': ( 'I', '<f4' ),
+    'emission': ( 'E', '<f4' ),
+    'permit': ( 'validator_permit', '|b1' ),
+    'updated': ( 'last_update', '<i8' ),
+}
+_TENSORS = { attribute: name for name, ( attribute, _ ) in _COLUMNS.items() }
+
+_MAGIC = b'CMG1'
+_ALIGNMENT = 64
+
+
+def _aligned( offset: int ) -> int:
+    return -( -offset // _ALIGNMENT ) * _ALIGNMENT
+
+
+class CompactMetagraph:
+    """
+    A read-only metagraph in columnar form, holding only what the neurons read from a sync.
+
+    Per-uid values are numpy columns (stake, rank, trust, consensus, incentive, emission, permit and
+    updated), hotkeys and coldkeys are fixed width byte tables and axons are packed into an AXON_DTYPE
+    struct array. At 4096 uids this is about 600KiB, several times less than the python objects behind a
+    bt.metagraph, and two syncs are diffed with a few array comparisons instead of a loop over every uid.
+
+    save() writes the columns to one file which load() memory maps, so every local process reading it
+    shares a single copy in the page cache. save() replaces the file atomically, processes which mapped
+    the previous one keep reading it until they load again.
+
+    The attributes the neurons read from bt.metagraph are available under the same names: S, R, T, C, I,
+    E, validator_permit, last_update, n, block and uids as torch tensors, and hotkeys, coldkeys and axons
+    as lists. They are built on first access and are copies, so they can be modified.
+
+    Example usage:
+        compact = CompactMetagraph.from_metagraph( subtensor.metagraph( netuid ) )
+        compact.save( path )
+        shared = CompactMetagraph.load( path )
+        shared.stake[ uid ], shared.axons[ uid ]
+    """
+
+    def __init__( self, netuid: int, block: int, synced_at: float, columns: typing.Dict[str, np.ndarray] ):
+        self.netuid = netuid
+        self.block_number = block
+        self.synced_at = synced_at
+        self.hotkey_table: np.ndarray = columns['hotkeys']
+        self.coldkey_table: np.ndarray = columns['coldkeys']
+        self.axon_table: np.ndarray = columns['axons']
+        self.stake: np.ndarray = columns['stake']
+        self.rank: np.ndarray = columns['rank']
+        self.trust: np.ndarray = columns['trust']
+        self.consensus: np.ndarray = columns['consensus']
+        self.incentive: np.ndarray = columns['incentive']
+        self.emission: np.ndarray = columns['emission']
+        self.permit: np.ndarray = columns['permit']
+        self.updated: np.ndarray = columns['updated']
+
+    @classmethod
+    def from_metagraph( cls, metagraph: "bt.metagraph", synced_at: typing.Optional[float] = None ) -> "CompactMetagraph":
+        """
+        Copies the columns out of a bt.metagraph, which can be released afterwards.
+        """
+        columns = {
+            'hotkeys': np.array( metagraph.hotkeys, dtype = 'S' ),
+            'coldkeys': np.array( metagraph.coldkeys, dtype = 'S' ),
+            'axons': np.array( [ cls._pack_axon( axon ) for axon in metagraph.axons ], dtype = AXON_DTYPE ),
+        }
+        for name, ( attribute, dtype ) in _COLUMNS.items():
+            columns[ name ] = np.array( getattr( metagraph, attribute ).tolist(), dtype = dtype )
+        return cls( int( metagraph.netuid ), int( metagraph.block ), time.time() if synced_at is None else synced_at, columns )
+
+    @staticmethod
+    def _pack_axon( axon: "bt.AxonInfo" ) -> tuple:
+        try:
+            packed = ipaddress.ip_address( axon.ip ).packed
+        except ValueError:
+            packed = b''
+        return ( list( packed.ljust( 16, b'\0' ) ), axon.port, axon.ip_type, axon.protocol, axon.version )
+
+    def save( self, path: str ):
+        """
+        Writes the metagraph to path for load(). The file is written next to path and renamed over it.
+
+        Layout: the magic bytes, the length of a json header holding the netuid, block, sync time and
+        the dtype, length and offset of each column, the header, then the columns, each 64 byte aligned.
+        """
+        columns = self._columns()
+        header, offset = { 'netuid': self.netuid, 'block': self.block_number, 'synced_at': self.synced_at, 'columns': {} }, 0
+        for name, values in columns.items():
+            header['columns'][ name ] = [ 'axon' if name == 'axons' else values.dtype.str, len( values ), offset ]
+            offset = _aligned( offset + values.nbytes )
+        encoded = json.dumps( header ).encode()
+        start = _aligned( 8 + len( encoded ) )
+        with open( path + '.tmp', 'wb' ) as f:
+            f.write( struct.pack( '<4sI', _MAGIC, len( encoded ) ) + encoded )
+            for name, values in columns.items():
+                f.seek( start + header['columns'][ name ][2] )
+                f.write( np.ascontiguousarray( values ).tobytes() )
+            f.truncate( start + offset )
+        os.replace( path + '.tmp', path )
+
+    @classmethod
+    def load( cls, path: str ) -> "CompactMetagraph":
+        """
+        Memory maps a file written by save(). The columns are read-only views of the mapping,
+        which stays open for as long as any of them is referenced.
+        """
+        with open( path, 'rb' ) as f:
+            buffer = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+        magic, length = struct.unpack_from( '<4sI', buffer, 0 )
+        if magic != _MAGIC:
+            raise ValueError( f'{path} is not a compact metagraph.' )
+        header = json.loads( buffer[ 8: 8 + length ] )
+        start = _aligned( 8 + length )
+        columns = {
+            name: np.frombuffer( buffer, dtype = AXON_DTYPE if dtype == 'axon' else np.dtype( dtype ), count = count, offset = start + offset )
+            for name, ( dtype, count, offset ) in header['columns'].items()
+        }
+        return cls( header['netuid'], header['block'], header['synced_at'], columns )
+
+    @staticmethod
+    def is_compact( path: str ) -> bool:
+        """ Returns True if the file at path was written by save(). """
+        with open( path, 'rb' ) as f:
+            return f.read( len( _MAGIC ) ) == _MAGIC
+
+    def __reduce__( self ):
+        # Mapped columns can't be pickled, they are copied into memory instead.
+        return ( CompactMetagraph, ( self.netuid, self.block_number, self.synced_at, { name: np.array( values ) for name, values in self._columns().items() } ) )
+
+    def __len__( self ) -> int:
+        return len( self.hotkey_table )
+
+    def __str__( self ) -> str:
+        return f'CompactMetagraph(netuid:{self.netuid}, n:{len( self )}, block:{self.block_number}, {self.nbytes / 1024:.0f}KiB)'
+
+    @property
+    def nbytes( self ) -> int:
+        """ The memory taken by the columns. """
+        return sum( values.nbytes for values in self._columns().values() )
+
+    def _columns( self ) -> typing.Dict[str, np.ndarray]:
+        return { 'hotkeys': self.hotkey_table, 'coldkeys': self.coldkey_table, 'axons': self.axon_table, **{ name: getattr( self, name ) for name in _COLUMNS } }
+
+    def axon( self, uid: int ) -> "bt.AxonInfo":
+        """ Unpacks the axon of uid into the bt.AxonInfo passed to the dendrite. """
+        record = self.axon_table[ uid ]
+        # Unserved axons have ip_type 0 and ip 0.0.0.0, anything but ipv6 is decoded as ipv4.
+        ip = ipaddress.ip_address( bytes( record['ip'][ :16 if record['ip_type'] == 6 else 4 ] ) )
+        return bt.AxonInfo(
+            version = int( record['version'] ),
+            ip = str( ip ),
+            port = int( record['port'] ),
+            ip_type = int( record['ip_type'] ),
+            hotkey = self.hotkeys[ uid ],
+            coldkey = self.coldkeys[ uid ],
+            protocol = int( record['protocol'] ),
+        )
+
+    @functools.cached_property
+    def hotkeys( self ) -> typing.List[str]:
+        # Interned, so every lookup table keyed by hotkey shares these strings.
+        return [ sys.intern( hotkey.decode() ) for hotkey in self.hotkey_table.tolist() ]
+
+    @functools.cached_property
+    def coldkeys( self ) -> typing.List[str]:
+        return [ sys.intern( coldkey.decode() ) for coldkey in self.coldkey_table.tolist() ]
+
+    @functools.cached_property
+    def axons( self ) -> "_Axons":
+        return _Axons( self )
+
+    def __getattr__( self, name: str ):
+        # The torch tensors of bt.metagraph, built on first access. Torch is only imported by processes using them.
+        if name not in _TENSORS and name not in ( 'n', 'block', 'uids' ):
+            raise AttributeError( f"'CompactMetagraph' object has no attribute '{name}'" )
+        import torch
+        if name in _TENSORS:
+            value = torch.from_numpy( np.array( getattr( self, _TENSORS[ name ] ) ) )
+        elif name == 'uids':
+            value = torch.arange( len( self ) )
+        else:
+            value = torch.tensor( len( self ) if name == 'n' else self.block_number )
+        self.__dict__[ name ] = value
+        return value
+
+
+class _Axons( typing.Sequence ):
+    """ The axons of a CompactMetagraph as a sequence of bt.AxonInfo, each unpacked on first access. """
+
+    def __init__( self, metagraph: CompactMetagraph ):
+        self._metagraph = metagraph
+        self._cache: typing.Dict[int, "bt.AxonInfo"] = {}
+
+    def __len__( self ) -> int:
+        return len( self._metagraph )
+
+    def __getitem__( self, uid ):
+        if isinstance( uid, slice ):
+            return [ self[ i ] for i in range( *uid.indices( len( self ) ) ) ]
+        uid = int( uid )
+        if uid < 0:
+            uid += len( self )
+        if not 0 <= uid < len( self ):
+            raise IndexError( 'axon index out of range' )
+        axon = self._cache.get( uid )
+        if axon is None:
+            axon = self._cache[ uid ] = self._metagraph.axon( uid )
+        return axon
+
+
+class MetagraphSnapshot( typing.NamedTuple ):
+    """
+    An immutable view of one metagraph sync, published by the MetagraphSyncer.
+    Readers must treat the metagraph as read-only; it is shared by every thread holding the snapshot.
+
+    Attributes:
+    - version: Monotonic counter incremented on every successful sync.
+    - metagraph: The synced metagraph.
+    - index: The HotkeyIndex built from the metagraph.
+    - diff: The MetagraphDiff against the previously published snapshot.
+    - synced_at: Wall clock time at which the sync completed.
+    - sync_duration: Seconds spent fetching the metagraph from the chain.
+    """
+    version: int
+    metagraph: "bt.metagraph"
+    index: HotkeyIndex
+    diff: MetagraphDiff
+    synced_at: float
+    sync_duration: float
+
+    @property
+    def staleness( self ) -> float:
+        """ Seconds since this snapshot was synced. """
+        return time.time() - self.synced_at
+
+
+class MetagraphSyncer:
+    """
+    Keeps an up to date MetagraphSnapshot by refreshing the metagraph on a background thread.
+
+    Each refresh builds a brand new snapshot and publishes it with a single reference assignment,
+    so readers simply access syncer.snapshot without taking a lock and never block on the chain.
+    The syncer should be given its own subtensor connection since the websocket is not thread-safe.
+
+    If a cache_path is passed every synced metagraph is also written there, and on start the cached
+    metagraph is published straight away while the first live sync runs in the background. This lets
+    a restarted neuron serve within its import time instead of waiting for the chain.
+
+    If compact is True every synced metagraph is converted to a CompactMetagraph as soon as it is
+    fetched, so the bt.metagraph is released right away, and the cache is written in its memory mapped
+    format, which other local processes can load with CompactMetagraph.load( cache_path ).
+
+    Example usage:
+        syncer = MetagraphSyncer( subtensor, netuid = 1, interval = 12 ).start()
+        metagraph = syncer.snapshot.metagraph
+        ...
+        syncer.stop()
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--metagraph.sync_interval', type = float, default = bt.__blocktime__, help = "Seconds between background metagraph syncs." )
+        parser.add_argument( '--metagraph.no_cache', action = 'store_true', default = False, help = "If set, waits for a live metagraph sync on startup instead of starting from the one cached on disk, and does not write the cache." )
+        parser.add_argument( '--metagraph.compact', action = 'store_true', default = False, help = "If set, keeps each synced metagraph as a CompactMetagraph of numpy columns instead of a bt.metagraph, and caches it as a memory mapped file." )
+
+    def __init__( self, subtensor: "bt.subtensor", netuid: int, interval: float = bt.__blocktime__, cache_path: typing.Optional[str] = None, compact: bool = False ):
+        self.subtensor = subtensor
+        self.netuid = netuid
+        self.interval = interval
+        self.cache_path = cache_path
+        self.compact = compact
+        self.snapshot: typing.Optional[MetagraphSnapshot] = None
+        self.sync_count = 0
+        self.failure_count = 0
+        self._stop_event = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def staleness( self ) -> float:
+        """ Seconds since the last successful sync, infinite if none has completed. """
+        return float( 'inf' ) if self.snapshot is None else self.snapshot.staleness
+
+    def sync( self ) -> MetagraphSnapshot:
+        """
+        Fetches the metagraph, diffs it against the current snapshot and publishes the result.
+        """
+        start = time.time()
+        metagraph = self.subtensor.metagraph( self.netuid )
+        duration = time.time() - start
+        SYNC_SECONDS.observe( duration )
+        if self.compact:
+            metagraph = CompactMetagraph.from_metagraph( metagraph )
+        previous = self.snapshot
+        snapshot = MetagraphSnapshot(
+            version = 0 if previous is None else previous.version + 1,
+            metagraph = metagraph,
+            index = HotkeyIndex( metagraph ),
+            diff = diff( None if previous is None else previous.metagraph, metagraph ),
+            synced_at = metagraph.synced_at if self.compact else time.time(),
+            sync_duration = duration,
+        )
+        self.snapshot = snapshot
+        self.sync_count += 1
+        if self.cache_path is not None:
+            self._save_cache( snapshot )
+        bt.logging.debug( f'Synced metagraph at block {snapshot.index.block} in {duration:.3f}s, ' \
+                          f'new: {len( snapshot.diff.new_uids )}, deregistered: {len( snapshot.diff.deregistered_uids )}, ' \
+                          f'changed axons: {len( snapshot.diff.changed_axon_uids )}' )
+        return snapshot
+
+    def start( self ) -> "MetagraphSyncer":
+        """
+        Publishes the cached snapshot if there is one, and performs a first blocking sync otherwise, so a
+        snapshot is always available. Then starts the background thread.
+        """
+        cached = False
+        if self.snapshot is None and self.cache_path is not None:
+            self.snapshot = self._load_cache()
+            cached = self.snapshot is not None
+        if self.snapshot is None:
+            self.sync()
+        STALENESS_SECONDS.set_function( lambda: self.staleness )
+        self._stop_event.clear()
+        # Catch up with the chain right away when starting from the cache.
+        self._thread = threading.Thread( target = self._run, args = ( cached, ), name = 'MetagraphSyncer', daemon = True )
+        self._thread.start()
+        return self
+
+    def stop( self ):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join( timeout = self.interval )
+            self._thread = None
+
+    def _load_cache( self ) -> typing.Optional[MetagraphSnapshot]:
+        if not os.path.exists( self.cache_path ):
+            return None
+        try:
+            if CompactMetagraph.is_compact( self.cache_path ):
+                metagraph = CompactMetagraph.load( self.cache_path )
+                cached = { 'netuid': metagraph.netuid, 'synced_at': metagraph.synced_at, 'metagraph': metagraph }
+            else:
+                with open( self.cache_path, 'rb' ) as f:
+                    cached = pickle.load( f )
+                metagraph = cached['metagraph']
+                if self.compact:
+                    metagraph = CompactMetagraph.from_metagraph( metagraph, cached['synced_at'] )
+            if cached['netuid'] != self.netuid:
+                return None
+        except Exception:
+            bt.logging.warning( f'Could not load the cached metagraph from {self.cache_path}:\n{traceback.format_exc()}' )
+            return None
+        snapshot = MetagraphSnapshot(
+            version = 0,
+            metagraph = metagraph,
+            index = HotkeyIndex( metagraph ),
+            diff = diff( None, metagraph ),
+            synced_at = cached['synced_at'],
+            sync_duration = 0.0,
+        )
+        bt.logging.info( f'Loaded cached metagraph at block {snapshot.index.block}, {snapshot.staleness:.1f}s stale.' )
+        return snapshot
+
+    def _save_cache( self, snapshot: MetagraphSnapshot ):
+        # Written to a temporary file and renamed, so a crash never leaves a truncated cache behind.
+        try:
+            os.makedirs( os.path.dirname( self.cache_path ) or '.', exist_ok = True )
+            if isinstance( snapshot.metagraph, CompactMetagraph ):
+                snapshot.metagraph.save( self.cache_path )
+                return
+            with open( self.cache_path + '.tmp', 'wb' ) as f:
+                pickle.dump( { 'netuid': self.netuid, 'synced_at': snapshot.synced_at, 'metagraph': snapshot.metagraph }, f, protocol = pickle.HIGHEST_PROTOCOL )
+            os.replace( self.cache_path + '.tmp', self.cache_path )
+        except Exception:
+            bt.logging.warning( f'Could not cache the metagraph to {self.cache_path}:\n{traceback.format_exc()}' )
+
+    def _run( self, sync_now: bool = False ):
+        while sync_now or not self._stop_event.wait( self.interval ):
+            sync_now = False
+            try:
+                self.sync()
+            except Exception:
+                self.failure_count += 1
+                SYNC_FAILURES.inc()
+                bt.logging.error( f'Metagraph sync failed, snapshot is {self.staleness:.1f}s stale:\n{traceback.format_exc()}' )
@@ -0,0 +1,250 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import bisect
+import functools
+import typing
+import argparse
+import threading
+import http.server
+import bittensor as bt
+
+# A small in-process metrics library with a Prometheus text format scrape endpoint.
+# Recording is a lock, a bisect and two additions, cheap enough to stay enabled on every request.
+#
+# Example usage:
+#   FORWARD = template.metrics.histogram( 'miner_forward_seconds', 'Time spent in the forward function.' )
+#   with FORWARD.time():
+#       ...
+#   template.metrics.MetricsServer( port = 9101 ).start()
+
+# Latency buckets in seconds, from 10 microseconds to 60 seconds.
+DEFAULT_BUCKETS = ( 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0 )
+
+
+class Counter:
+    """ A monotonically increasing count. """
+
+    kind = 'counter'
+
+    def __init__( self, name: str, documentation: str ):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc( self, amount: float = 1 ):
+        with self._lock:
+            self.value += amount
+
+    def samples( self ) -> typing.Iterator[typing.Tuple[str, float]]:
+        yield f'{self.name}_total', self.value
+
+
+class Gauge:
+    """ A value which can go up and down, either set directly or read from a function at scrape time. """
+
+    kind = 'gauge'
+
+    def __init__( self, name: str, documentation: str ):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self._function: typing.Optional[typing.Callable[[], float]] = None
+
+    def set( self, value: float ):
+        self.value = value
+
+    def set_function( self, function: typing.Callable[[], float] ):
+        self._function = function
+
+    def samples( self ) -> typing.Iterator[typing.Tuple[str, float]]:
+        yield self.name, self._function() if self._function is not None else self.value
+
+
+class _Timer:
+    __slots__ = ( "histogram", "start" )
+
+    def __init__( self, histogram: "Histogram" ):
+        self.histogram = histogram
+
+    def __enter__( self ):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.histogram.observe( time.perf_counter() - self.start )
+        return False
+
+
+class Histogram:
+    """ Counts observations into cumulative buckets, along with their count and sum. """
+
+    kind = 'histogram'
+
+    def __init__( self, name: str, documentation: str, buckets: typing.Sequence[float] = DEFAULT_BUCKETS ):
+        self.name = name
+        self.documentation = documentation
+        self.bounds = sorted( buckets )
+        self.counts = [ 0 ] * ( len( self.bounds ) + 1 )
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe( self, value: float ):
+        index = bisect.bisect_left( self.bounds, value )
+        with self._lock:
+            self.counts[ index ] += 1
+            self.sum += value
+
+    def time( self ) -> _Timer:
+        """ Returns a context manager which observes the seconds spent in its block. """
+        return _Timer( self )
+
+    def timed( self, fn: typing.Callable ) -> typing.Callable:
+        """ Decorates fn to observe the seconds spent in every call. The signature of fn is preserved. """
+        @functools.wraps( fn )
+        def _timed( *args, **kwargs ):
+            start = time.perf_counter()
+            try:
+                return fn( *args, **kwargs )
+            finally:
+                self.observe( time.perf_counter() - start )
+        return _timed
+
+    @property
+    def count( self ) -> int:
+        return sum( self.counts )
+
+    def quantile( self, q: float ) -> float:
+        """ Estimates the q-quantile as the upper bound of the bucket it falls in. """
+        counts = list( self.counts )
+        target = q * sum( counts )
+        cumulative = 0
+        for bound, count in zip( self.bounds + [ float( 'inf' ) ], counts ):
+            cumulative += count
+            if cumulative >= target and cumulative > 0:
+                return bound
+        return float( 'nan' )
+
+    def samples( self ) -> typing.Iterator[typing.Tuple[str, float]]:
+        with self._lock:
+            counts, total = list( self.counts ), self.sum
+        cumulative = 0
+        for bound, count in zip( self.bounds, counts ):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}}', cumulative
+        cumulative += counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}}', cumulative
+        yield f'{self.name}_sum', total
+        yield f'{self.name}_count', cumulative
+
+
+Metric = typing.Union[Counter, Gauge, Histogram]
+
+
+class Registry:
+    """ Holds named metrics and renders them in the Prometheus text exposition format. """
+
+    def __init__( self ):
+        self._metrics: typing.Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create( self, cls: type, name: str, documentation: str, **kwargs ) -> Metric:
+        with self._lock:
+            metric = self._metrics.get( name )
+            if metric is None:
+                metric = self._metrics[ name ] = cls( name, documentation, **kwargs )
+            elif not isinstance( metric, cls ):
+                raise ValueError( f'Metric {name} is already registered as a {metric.kind}.' )
+            return metric
+
+    def render( self ) -> str:
+        lines = []
+        for metric in list( self._metrics.values() ):
+            lines.append( f'# HELP {metric.name} {metric.documentation}' )
+            lines.append( f'# TYPE {metric.name} {metric.kind}' )
+            for name, value in metric.samples():
+                lines.append( f'{name} {value}' )
+        return '\n'.join( lines ) + '\n'
+
+
+# The registry used by the module level helpers and served by default.
+REGISTRY = Registry()
+
+
+def counter( name: str, documentation: str, registry: Registry = REGISTRY ) -> Counter:
+    """ Returns the counter registered under name, creating it if needed. """
+    return registry.get_or_create( Counter, name, documentation )
+
+
+def gauge( name: str, documentation: str, registry: Registry = REGISTRY ) -> Gauge:
+    """ Returns the gauge registered under name, creating it if needed. """
+    return registry.get_or_create( Gauge, name, documentation )
+
+
+def histogram( name: str, documentation: str, buckets: typing.Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY ) -> Histogram:
+    """ Returns the histogram registered under name, creating it if needed. """
+    return registry.get_or_create( Histogram, name, documentation, buckets = buckets )
+
+
+class MetricsServer:
+    """
+    Serves a registry over HTTP on a background thread, for scraping by Prometheus or curl.
+    Binds to localhost by default so metrics are not exposed publicly.
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--metrics.port', type = int, default = None, help = "Port of the metrics scrape endpoint. Disabled if not set." )
+        parser.add_argument( '--metrics.host', type = str, default = '127.0.0.1', help = "Address the metrics scrape endpoint binds to." )
+
+    def __init__( self, port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY ):
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._server: typing.Optional[http.server.ThreadingHTTPServer] = None
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start( self ) -> "MetricsServer":
+        registry = self.registry
+
+        class _Handler( http.server.BaseHTTPRequestHandler ):
+            def do_GET( self ):
+                body = registry.render().encode( 'utf-8' )
+                self.send_response( 200 )
+                self.send_header( 'Content-Type', 'text/plain; version=0.0.4; charset=utf-8' )
+                self.send_header( 'Content-Length', str( len( body ) ) )
+                self.end_headers()
+                self.wfile.write( body )
+
+            def log_message( self, format, *args ):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer( ( self.host, self.port ), _Handler )
+        self._thread = threading.Thread( target = self._server.serve_forever, name = 'MetricsServer', daemon = True )
+        self._thread.start()
+        bt.logging.info( f'Serving metrics on http://{self.host}:{self.port}/metrics' )
+        return self
+
+    def stop( self ):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
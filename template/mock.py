@@ -0,0 +1,273 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import copy
+import json
+import time
+import torch
+import struct
+import typing
+import random
+import asyncio
+import threading
+import traceback
+import concurrent.futures
+import bittensor as bt
+
+# In-process stand-ins for the chain and network objects used by the neurons, so miners and validators
+# can be run and benchmarked on a single machine without a live chain or registered wallets.
+#
+# Example usage:
+#   metagraph = MockMetagraph( n = 256, ports = [ 9000, 9001 ] )
+#   subtensor = MockSubtensor( metagraph )
+#   dendrite = MockDendrite( MockWallet( metagraph.hotkeys[0] ) )
+
+
+class MockWallet:
+    """
+    A wallet holding only a hotkey address, enough to identify a neuron in a mock metagraph.
+    """
+
+    class _Keypair:
+        def __init__( self, ss58_address: str ):
+            self.ss58_address = ss58_address
+
+    def __init__( self, hotkey: str, name: str = 'mock' ):
+        self.name = name
+        self.hotkey = MockWallet._Keypair( hotkey )
+        self.coldkeypub = self.hotkey
+
+    def __str__( self ) -> str:
+        return f'MockWallet({self.name}, {self.hotkey.ss58_address})'
+
+
+class MockMetagraph:
+    """
+    A synthetic metagraph of n uids, exposing the attributes the neurons read from bt.metagraph.
+    Axons are spread round-robin over the passed local ports, so many uids can be served by a few miner processes.
+    """
+
+    def __init__( self, n: int, ports: typing.Sequence[int] = ( 8091, ), netuid: int = 1, block: int = 1000, seed: int = 0, validators: int = 1 ):
+        generator = torch.Generator().manual_seed( seed )
+        self.netuid = netuid
+        self.n = torch.tensor( n )
+        self.block = torch.tensor( block )
+        self.uids = torch.arange( n )
+        self.hotkeys = [ f'5Mock{seed:04d}Hotkey{uid:06d}' for uid in range( n ) ]
+        self.coldkeys = [ f'5Mock{seed:04d}Coldkey{uid:06d}' for uid in range( n ) ]
+        self.S = torch.rand( n, generator = generator ) * 1000
+        self.R = torch.rand( n, generator = generator )
+        self.T = torch.rand( n, generator = generator )
+        self.C = torch.rand( n, generator = generator )
+        self.I = torch.rand( n, generator = generator )
+        self.E = torch.rand( n, generator = generator )
+        self.validator_permit = torch.zeros( n, dtype = torch.bool )
+        self.validator_permit[ :validators ] = True
+        self.last_update = torch.zeros( n, dtype = torch.long )
+        self.axons = [
+            bt.AxonInfo(
+                version = 1,
+                ip = '127.0.0.1',
+                port = ports[ uid % len( ports ) ],
+                ip_type = 4,
+                hotkey = self.hotkeys[ uid ],
+                coldkey = self.coldkeys[ uid ],
+                protocol = 4,
+            )
+            for uid in range( n )
+        ]
+
+    def __str__( self ) -> str:
+        return f'MockMetagraph(netuid:{self.netuid}, n:{int( self.n )}, block:{int( self.block )})'
+
+
+class MockSubtensor:
+    """
+    A thread-safe chain stand-in serving a MockMetagraph, advancing one block per bt.__blocktime__ seconds
+    of wall clock time (scaled by time_scale) and recording weight submissions.
+    """
+
+    def __init__( self, metagraph: MockMetagraph, sync_latency: float = 0.0, set_weights_latency: float = 0.0, rate_limit: int = 0, time_scale: float = 1.0 ):
+        self._metagraph = metagraph
+        self.sync_latency = sync_latency
+        self.set_weights_latency = set_weights_latency
+        self.rate_limit = rate_limit
+        self.time_scale = time_scale
+        self.weights: typing.List[typing.Tuple[int, torch.Tensor, torch.Tensor]] = []
+        self._start_block = int( metagraph.block )
+        self._start_time = time.time()
+        self._lock = threading.Lock()
+
+    def __str__( self ) -> str:
+        return f'MockSubtensor({self._metagraph})'
+
+    def get_current_block( self ) -> int:
+        return self._start_block + int( ( time.time() - self._start_time ) * self.time_scale / bt.__blocktime__ )
+
+    def metagraph( self, netuid: int ) -> MockMetagraph:
+        time.sleep( self.sync_latency )
+        with self._lock:
+            # Every sync returns a new object, like the real subtensor, so published snapshots are never mutated.
+            metagraph = copy.copy( self._metagraph )
+            metagraph.block = torch.tensor( self.get_current_block() )
+            metagraph.last_update = self._metagraph.last_update.clone()
+            return metagraph
+
+    def weights_rate_limit( self, netuid: int ) -> int:
+        return self.rate_limit
+
+    def set_weights( self, netuid: int, wallet: MockWallet, uids: torch.Tensor, weights: torch.Tensor, wait_for_inclusion: bool = False, **kwargs ) -> bool:
+        time.sleep( self.set_weights_latency )
+        with self._lock:
+            self.weights.append( ( self.get_current_block(), uids, weights ) )
+            uid = self._metagraph.hotkeys.index( wallet.hotkey.ss58_address )
+            self._metagraph.last_update[ uid ] = self.get_current_block()
+        return True
+
+
+# Requests and responses travel between the mock dendrite and axon as length prefixed JSON frames.
+_FRAME = struct.Struct( '<I' )
+
+
+async def _read_frame( reader: asyncio.StreamReader ) -> dict:
+    length, = _FRAME.unpack( await reader.readexactly( _FRAME.size ) )
+    return json.loads( await reader.readexactly( length ) )
+
+
+def _write_frame( writer: asyncio.StreamWriter, message: dict ):
+    data = json.dumps( message ).encode( 'utf-8' )
+    writer.write( _FRAME.pack( len( data ) ) + data )
+
+
+class MockAxon:
+    """
+    A local TCP server standing in for bt.axon. Attached functions are run exactly as the axon would:
+    the blacklist function first, then the priority and forward functions, on a thread pool.
+    Streaming forwards are not supported.
+    """
+
+    def __init__( self, wallet: typing.Optional[MockWallet] = None, port: int = 8091, ip: str = '127.0.0.1', max_workers: int = 32 ):
+        self.wallet = wallet
+        self.ip = ip
+        self.port = port
+        self.max_workers = max_workers
+        self.request_count = 0
+        self.blacklisted_count = 0
+        self._routes: typing.Dict[str, typing.Tuple[type, typing.Callable, typing.Optional[typing.Callable], typing.Optional[typing.Callable]]] = {}
+        self._thread: typing.Optional[threading.Thread] = None
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._started = threading.Event()
+
+    def __str__( self ) -> str:
+        return f'MockAxon({self.ip}:{self.port})'
+
+    def attach( self, forward_fn: typing.Callable, blacklist_fn: typing.Optional[typing.Callable] = None, priority_fn: typing.Optional[typing.Callable] = None ) -> "MockAxon":
+        synapse_class = next( iter( forward_fn.__annotations__.values() ) )
+        if isinstance( synapse_class, type ) and not issubclass( synapse_class, bt.StreamingSynapse ):
+            self._routes[ synapse_class.__name__ ] = ( synapse_class, forward_fn, blacklist_fn, priority_fn )
+        return self
+
+    def serve( self, netuid: int, subtensor: MockSubtensor ) -> "MockAxon":
+        return self
+
+    def start( self ) -> "MockAxon":
+        self._thread = threading.Thread( target = self._run, name = 'MockAxon', daemon = True )
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop( self ) -> "MockAxon":
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe( self._loop.stop )
+        return self
+
+    def _run( self ):
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor( concurrent.futures.ThreadPoolExecutor( max_workers = self.max_workers ) )
+        self._server = self._loop.run_until_complete( asyncio.start_server( self._handle, self.ip, self.port ) )
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _handle( self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter ):
+        try:
+            while True:
+                request = await _read_frame( reader )
+                response = await self._loop.run_in_executor( None, self._process, request )
+                _write_frame( writer, response )
+                await writer.drain()
+        except ( asyncio.IncompleteReadError, ConnectionError ):
+            pass
+        finally:
+            writer.close()
+
+    def _process( self, request: dict ) -> dict:
+        self.request_count += 1
+        start = time.perf_counter()
+        synapse_class, forward_fn, blacklist_fn, priority_fn = self._routes[ request['name'] ]
+        synapse = synapse_class( **request['synapse'] )
+        synapse.dendrite.hotkey = request['hotkey']
+        synapse.timeout = request['timeout']
+        try:
+            if blacklist_fn is not None and blacklist_fn( synapse ):
+                self.blacklisted_count += 1
+                synapse.axon.status_code = 403
+            else:
+                if priority_fn is not None:
+                    priority_fn( synapse )
+                synapse = forward_fn( synapse )
+                synapse.axon.status_code = 200
+        except Exception:
+            bt.logging.trace( traceback.format_exc() )
+            synapse.axon.status_code = 500
+        synapse.axon.process_time = time.perf_counter() - start
+        return synapse.dict()
+
+
+class MockDendrite:
+    """
+    A client for MockAxon servers exposing the async call() used by the query engine.
+    Each call opens its own connection, like a dendrite without keep-alive.
+    """
+
+    def __init__( self, wallet: MockWallet ):
+        self.wallet = wallet
+
+    def __str__( self ) -> str:
+        return f'MockDendrite({self.wallet.hotkey.ss58_address})'
+
+    async def call( self, target_axon: "bt.AxonInfo", synapse: bt.Synapse, timeout: float = 12.0, deserialize: bool = True ) -> typing.Any:
+        start = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for( asyncio.open_connection( target_axon.ip, target_axon.port ), timeout )
+            _write_frame( writer, { 'name': type( synapse ).__name__, 'hotkey': self.wallet.hotkey.ss58_address, 'timeout': timeout, 'synapse': synapse.dict() } )
+            response = await asyncio.wait_for( _read_frame( reader ), timeout - ( time.perf_counter() - start ) )
+            synapse = type( synapse )( **response )
+            synapse.dendrite.status_code = synapse.axon.status_code
+        except asyncio.TimeoutError:
+            synapse.dendrite.status_code = 408
+        except Exception as e:
+            synapse.dendrite.status_code = 503
+            synapse.dendrite.status_message = str( e )
+        finally:
+            if writer is not None:
+                writer.close()
+        synapse.dendrite.process_time = time.perf_counter() - start
+        return synapse.deserialize() if deserialize else synapse
@@ -0,0 +1,200 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import typing
+import asyncio
+import aiohttp
+import argparse
+import resource
+import contextvars
+import bittensor as bt
+
+from . import metrics
+from .metagraph import MetagraphDiff
+
+OPENED = metrics.counter( 'pool_connections_opened', 'Connections opened to miners, i.e. requests which could not reuse a pooled connection.' )
+REUSED = metrics.counter( 'pool_connections_reused', 'Requests to miners sent over a pooled keep-alive connection.' )
+EVICTED = metrics.counter( 'pool_evicted', 'Pooled endpoints closed because the axon they lead to changed.' )
+
+Endpoint = typing.Tuple[str, int]
+
+
+class ConnectionPool:
+    """
+    Keeps the validator's connections to miner axons alive between rounds, so a round reuses the
+    connections of the previous one instead of opening one per miner.
+
+    Each axon endpoint, i.e. ip and port, gets its own client session, whose connector keeps idle
+    connections for keepalive_timeout seconds, longer than the gap between rounds. Endpoints whose axon
+    changed on a metagraph sync are closed, since the miner behind them restarted or moved and reusing
+    their connections would fail the next query. Requests reach the pool through PooledDendrite, and
+    connection reuse is counted with an aiohttp TraceConfig.
+
+    Sessions are per endpoint rather than sharing one connector, because aiohttp has no public way to
+    close the idle connections of a single host in a connector. A session and connector are a few kB and
+    their keep-alive cleanup timer only runs while they hold idle connections, so even thousands of axons
+    stay cheap. Axons serve plain HTTP, so the connectors don't need enable_cleanup_closed, which is for
+    TLS transports and would add a timer to each.
+
+    Miners close idle connections after their own keep-alive timeout, which for bt.axon is 5 seconds
+    unless raised, see --axon.keepalive_timeout in neurons/miner.py.
+
+    Example usage:
+        pool = ConnectionPool( keepalive_timeout = 60, max_connections = 256 )
+        dendrite = PooledDendrite( pool, wallet = wallet )
+        ...
+        pool.evict_changed( previous_metagraph, metagraph, template.metagraph.diff( previous_metagraph, metagraph ), query_engine.loop )
+        ...
+        pool.close( query_engine.loop )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--pool.keepalive_timeout', type = float, default = 60.0, help = "Seconds idle connections to miners are kept for reuse in the next round." )
+        parser.add_argument( '--pool.raise_nofile', action = 'store_true', default = False, help = "Raise the open file limit at startup to fit a keep-alive connection to every axon." )
+
+    def __init__( self, keepalive_timeout: float = 60.0, max_connections: int = 256 ):
+        self.keepalive_timeout = keepalive_timeout
+        self.max_connections = max_connections
+        self.sessions: typing.Dict[typing.Optional[Endpoint], aiohttp.ClientSession] = {}
+        self.opened_count = 0
+        self.reused_count = 0
+        self._trace = aiohttp.TraceConfig()
+        self._trace.on_connection_create_end.append( self._on_opened )
+        self._trace.on_connection_reuseconn.append( self._on_reused )
+
+    async def session( self, endpoint: typing.Optional[Endpoint] = None ) -> aiohttp.ClientSession:
+        """
+        Returns the session for endpoint, opening it on the running loop the first time it is used.
+        """
+        session = self.sessions.get( endpoint )
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector( limit = self.max_connections, keepalive_timeout = self.keepalive_timeout )
+            session = aiohttp.ClientSession( connector = connector, trace_configs = [ self._trace ] )
+            self.sessions[ endpoint ] = session
+        return session
+
+    def evict( self, axons: typing.Iterable["bt.AxonInfo"], loop: asyncio.AbstractEventLoop ):
+        """
+        Closes the sessions, and with them the idle connections, to the passed axons' endpoints.
+        """
+        sessions = [ self.sessions.pop( ( axon.ip, axon.port ), None ) for axon in axons ]
+        sessions = [ session for session in sessions if session is not None ]
+        if not sessions:
+            return
+        loop.run_until_complete( _close_all( sessions ) )
+        EVICTED.inc( len( sessions ) )
+
+    def evict_changed( self, previous: "bt.metagraph", current: "bt.metagraph", diff: MetagraphDiff, loop: asyncio.AbstractEventLoop ):
+        """
+        Closes the connections to every endpoint whose axon changed between two metagraph syncs, both
+        the endpoints the changed uids moved away from and the ones they moved to.
+        """
+        changed = diff.changed_axon_uids + diff.new_uids + diff.deregistered_uids
+        axons = [ previous.axons[ uid ] for uid in changed if uid < len( previous.axons ) ]
+        axons += [ current.axons[ uid ] for uid in changed if uid < len( current.axons ) ]
+        self.evict( axons, loop )
+
+    def close( self, loop: asyncio.AbstractEventLoop ):
+        sessions, self.sessions = list( self.sessions.values() ), {}
+        if sessions:
+            loop.run_until_complete( _close_all( sessions ) )
+
+    async def _on_opened( self, session: aiohttp.ClientSession, context, params ):
+        self.opened_count += 1
+        OPENED.inc()
+
+    async def _on_reused( self, session: aiohttp.ClientSession, context, params ):
+        self.reused_count += 1
+        REUSED.inc()
+
+
+class PooledDendrite( bt.dendrite ):
+    """
+    A dendrite which sends each request over the ConnectionPool session of the axon it targets.
+
+    bt.dendrite reads its HTTP session from its session property on every call, which this class
+    overrides. The endpoint of the call in progress is kept in a context variable, so concurrent calls
+    on the same loop each get their own endpoint's session.
+
+    Example usage:
+        dendrite = PooledDendrite( ConnectionPool(), wallet = wallet )
+        response = await dendrite.call( axon, synapse, timeout = 12 )
+    """
+
+    def __init__( self, pool: ConnectionPool, wallet: typing.Optional["bt.wallet"] = None ):
+        super().__init__( wallet = wallet )
+        self.pool = pool
+        self._endpoint: contextvars.ContextVar = contextvars.ContextVar( 'endpoint', default = None )
+
+    @property
+    async def session( self ) -> aiohttp.ClientSession:
+        return await self.pool.session( self._endpoint.get() )
+
+    async def call( self, target_axon: typing.Union["bt.AxonInfo", "bt.axon"], *args, **kwargs ) -> typing.Any:
+        token = self._endpoint.set( _endpoint( target_axon ) )
+        try:
+            return await super().call( target_axon, *args, **kwargs )
+        finally:
+            self._endpoint.reset( token )
+
+    async def call_stream( self, target_axon: typing.Union["bt.AxonInfo", "bt.axon"], *args, **kwargs ) -> typing.AsyncIterator[typing.Any]:
+        # The session is looked up when the request is sent, before the first chunk, so the endpoint only
+        # has to be set while the first chunk is awaited, which happens in the consumer's context.
+        stream = super().call_stream( target_axon, *args, **kwargs )
+        try:
+            token = self._endpoint.set( _endpoint( target_axon ) )
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self._endpoint.reset( token )
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # Closing this generator, e.g. when the consumer stops early, must close the response right away
+            # instead of when the inner generator is garbage collected.
+            await stream.aclose()
+
+
+async def _close_all( sessions: typing.List[aiohttp.ClientSession] ):
+    await asyncio.gather( *[ session.close() for session in sessions ] )
+
+
+def _endpoint( target_axon: typing.Union["bt.AxonInfo", "bt.axon"] ) -> Endpoint:
+    info = target_axon.info() if isinstance( target_axon, bt.axon ) else target_axon
+    return ( info.ip, info.port )
+
+
+def raise_open_file_limit( n: int, max_connections: int ) -> typing.Tuple[int, int]:
+    """
+    Raises the process' soft open file limit to fit a keep-alive connection to each of n axons, plus
+    max_connections in flight and headroom for everything else. Returns the previous and new soft limit.
+    """
+    needed = n + max_connections + 1024
+    soft, hard = resource.getrlimit( resource.RLIMIT_NOFILE )
+    if soft == resource.RLIM_INFINITY or soft >= needed:
+        return soft, soft
+    target = needed if hard == resource.RLIM_INFINITY else min( needed, hard )
+    resource.setrlimit( resource.RLIMIT_NOFILE, ( target, hard ) )
+    if target < needed:
+        bt.logging.warning( f'Open file limit {target} is below the {needed} needed to keep a connection to each of {n} axons.' )
+    return soft, target
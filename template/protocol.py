@@ -17,7 +17,15 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import zlib
+import json
+import math
+import base64
+import asyncio
+import struct
 import typing
+import warnings
+import numpy as np
 import bittensor as bt
 
 # TODO(developer): Rewrite with your protocol definition.
@@ -73,3 +81,257 @@ class Dummy( bt.Synapse ):
         5
         """
         return self.dummy_output
+
+
+# ---- streaming ----
+# A streaming variant of the dummy protocol. The miner's forward is an async generator whose chunks are
+# sent to the validator as soon as they are produced, and the validator processes them as they arrive.
+#
+# ---- miner ----
+# Example usage:
+#   async def dummy_stream( synapse: StreamingDummy ) -> typing.AsyncIterator[int]:
+#       for i in range( synapse.stream_length ):
+#           yield synapse.dummy_input * 2 + i
+#   def forward( synapse: StreamingDummy ) -> StreamingDummy.BTStreamingResponse:
+#       return create_chunked_response( synapse, dummy_stream( synapse ) )
+#
+# ---- validator ---
+# Example usage:
+#   async for chunk in dendrite.call_stream( axon, StreamingDummy( dummy_input = 1 ) ):
+#       ... # ints as they arrive, followed by the completed StreamingDummy.
+
+def create_chunked_response(
+    synapse: bt.StreamingSynapse,
+    chunks: typing.AsyncIterator[typing.Any],
+    max_buffered: int = 8,
+) -> bt.StreamingSynapse.BTStreamingResponse:
+    """
+    Streams the chunks of an async generator to the caller as newline delimited JSON.
+
+    The generator runs ahead of the socket by at most max_buffered chunks, so a slow consumer makes the
+    generator wait instead of growing the miner's memory. Streaming stops at the synapse's timeout,
+    and the generator is cancelled if the caller disconnects.
+
+    Args:
+    - synapse: The streaming synapse being answered.
+    - chunks: The async generator producing the response chunks.
+    - max_buffered: Maximum number of chunks produced but not yet sent.
+    """
+    async def _token_streamer( send: typing.Callable[[dict], typing.Awaitable[None]] ):
+        queue: asyncio.Queue = asyncio.Queue( maxsize = max_buffered )
+        done = object()
+
+        async def _produce():
+            try:
+                async for chunk in chunks:
+                    await queue.put( json.dumps( chunk ).encode( 'utf-8' ) + b'\n' )
+            except Exception as e:
+                bt.logging.error( f'Streaming forward raised: {e}' )
+            await queue.put( done )
+
+        async def _send_all():
+            while True:
+                body = await queue.get()
+                if body is done:
+                    return
+                await send( { "type": "http.response.body", "body": body, "more_body": True } )
+
+        producer = asyncio.ensure_future( _produce() )
+        try:
+            await asyncio.wait_for( _send_all(), timeout = synapse.timeout )
+        except asyncio.TimeoutError:
+            bt.logging.trace( f'Stream to {synapse.dendrite.hotkey} cut off at its {synapse.timeout}s timeout.' )
+        finally:
+            producer.cancel()
+        await send( { "type": "http.response.body", "body": b"", "more_body": False } )
+
+    return synapse.create_streaming_response( _token_streamer )
+
+
+class StreamingDummy( bt.StreamingSynapse ):
+    """
+    A streaming variant of the dummy protocol. The miner streams stream_length integers, starting at twice
+    the dummy_input and counting up, and the validator receives each one as soon as it is produced.
+
+    Attributes:
+    - dummy_input: An integer value representing the input request sent by the validator.
+    - stream_length: The number of chunks the validator expects.
+    - dummy_output: The chunks received so far, filled incrementally on the validator side.
+    """
+
+    # Required request input, filled by sending dendrite caller.
+    dummy_input: int
+
+    # Number of chunks requested, filled by sending dendrite caller.
+    stream_length: int = 4
+
+    # Response output, filled chunk by chunk as the stream is received.
+    dummy_output: typing.List[int] = []
+
+    async def process_streaming_response( self, response: "aiohttp.ClientResponse" ) -> typing.AsyncIterator[int]:
+        """
+        Parses newline delimited chunks from the response body as they arrive, appending each one to
+        dummy_output and yielding it. A consumer which stops iterating cancels the rest of the stream.
+        """
+        # Synapse copies share the default list, every stream fills its own.
+        self.dummy_output = []
+        buffer = b''
+        async for data in response.content.iter_any():
+            buffer += data
+            *lines, buffer = buffer.split( b'\n' )
+            for line in lines:
+                if line:
+                    chunk = json.loads( line )
+                    self.dummy_output.append( chunk )
+                    yield chunk
+
+    def extract_response_json( self, response: "aiohttp.ClientResponse" ) -> dict:
+        """
+        Rebuilds the synapse fields from the streamed response's headers once the stream completes.
+        """
+        headers = { k.decode( 'utf-8' ): v.decode( 'utf-8' ) for k, v in response.__dict__[ '_raw_headers' ] }
+        def extract_info( prefix: str ) -> dict:
+            return { key.split( '_' )[-1]: value for key, value in headers.items() if key.startswith( prefix ) }
+        return {
+            'name': headers.get( 'name', '' ),
+            'timeout': float( headers.get( 'timeout', 0 ) ),
+            'total_size': int( headers.get( 'total_size', 0 ) ),
+            'header_size': int( headers.get( 'header_size', 0 ) ),
+            'dendrite': extract_info( 'bt_header_dendrite' ),
+            'axon': extract_info( 'bt_header_axon' ),
+            'dummy_input': self.dummy_input,
+            'stream_length': self.stream_length,
+            'dummy_output': self.dummy_output,
+        }
+
+    def deserialize( self ) -> typing.List[int]:
+        """
+        Returns the chunks received so far.
+        """
+        return self.dummy_output
+
+
+# ---- compact encoding ----
+# Large array payloads are expensive to send as JSON lists. Fields declared as CompactArray instead
+# carry a base64 string holding a small header (dtype, shape, compression) followed by the raw
+# little-endian buffer. Decoding returns numpy/torch views over the decoded buffer without copying.
+#
+# Example usage:
+#   class Embed( CompactSynapse ):
+#       text: str
+#       embedding: CompactArray = None
+#
+#       def deserialize( self ) -> torch.Tensor:
+#           return self.get_tensor( 'embedding' )
+#
+#   # miner
+#   synapse.set_array( 'embedding', model( synapse.text ), compression = 'zlib' )
+
+# A field holding an encoded array, None when unset.
+CompactArray = typing.Optional[str]
+
+_MAGIC = b'CA'
+_VERSION = 1
+_COMPRESSIONS = { None: 0, 'zlib': 1 }
+# The header is padded to a multiple of 24 bytes, so it base64 encodes without padding characters
+# and the buffer that follows it is 8 byte aligned once decoded.
+_HEADER_ALIGNMENT = 24
+# The largest decoded array unpack_array accepts by default. Arrays come from remote peers, so both the
+# declared shape and the decompressed output are bounded.
+MAX_ARRAY_BYTES = 256 * 2**20
+
+
+def pack_array( array: typing.Any, compression: typing.Optional[str] = None ) -> str:
+    """
+    Encodes a numpy array or torch tensor into a compact base64 string.
+
+    Args:
+    - array: The numpy array or torch tensor to encode.
+    - compression: None, or 'zlib' to compress the buffer.
+
+    Returns:
+    - str: The encoded array, decodable with unpack_array.
+    """
+    if compression not in _COMPRESSIONS:
+        raise ValueError( f'Unknown compression {compression}, expected one of {list( _COMPRESSIONS )}.' )
+    if not isinstance( array, np.ndarray ):
+        array = array.detach().cpu().numpy()
+    array = np.require( array, requirements = 'C' )
+    if array.dtype.byteorder == '>':
+        array = array.astype( array.dtype.newbyteorder( '<' ) )
+    dtype = array.dtype.str.encode( 'ascii' )
+    header = struct.pack( f'<2sBBB{len( dtype )}sB{array.ndim}Q', _MAGIC, _VERSION, _COMPRESSIONS[ compression ], len( dtype ), dtype, array.ndim, *array.shape )
+    header += b'\0' * ( -len( header ) % _HEADER_ALIGNMENT )
+    buffer = memoryview( array ).cast( 'B' ) if array.size else b''
+    if compression == 'zlib':
+        buffer = zlib.compress( buffer, 1 )
+    return ( base64.b64encode( header ) + base64.b64encode( buffer ) ).decode( 'ascii' )
+
+
+def unpack_array( data: str, max_bytes: int = MAX_ARRAY_BYTES ) -> np.ndarray:
+    """
+    Decodes a string produced by pack_array into a read-only numpy array viewing the decoded buffer.
+    Raises ValueError if the array is larger than max_bytes, or its buffer does not match the size its
+    header declares. Compressed buffers are never decompressed beyond the declared size.
+    """
+    raw = base64.b64decode( data )
+    magic, version, compression, dtype_length = struct.unpack_from( '<2sBBB', raw )
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError( f'Not a compact array, or an unsupported version: {magic}, {version}.' )
+    offset = struct.calcsize( '<2sBBB' )
+    dtype = np.dtype( raw[ offset:offset + dtype_length ].decode( 'ascii' ) )
+    offset += dtype_length
+    ndim = raw[ offset ]
+    shape = struct.unpack_from( f'<{ndim}Q', raw, offset + 1 )
+    offset += 1 + 8 * ndim
+    offset += -offset % _HEADER_ALIGNMENT
+    count = math.prod( shape )
+    nbytes = count * dtype.itemsize
+    if nbytes > max_bytes:
+        raise ValueError( f'Array of shape {shape} and dtype {dtype} is {nbytes} bytes, more than the {max_bytes} allowed.' )
+    if compression == _COMPRESSIONS['zlib']:
+        decompressor = zlib.decompressobj()
+        # A max_length of 0 means unbounded, so at least one byte is asked for and the length checked below.
+        raw, offset = decompressor.decompress( memoryview( raw )[ offset: ], max( 1, nbytes ) ), 0
+        if len( raw ) != nbytes or not decompressor.eof or decompressor.unconsumed_tail or decompressor.unused_data:
+            raise ValueError( f'Compressed buffer does not decode to the {nbytes} bytes its header declares.' )
+    elif compression != _COMPRESSIONS[None]:
+        raise ValueError( f'Unknown compression {compression}.' )
+    elif len( raw ) - offset != nbytes:
+        raise ValueError( f'Buffer of {len( raw ) - offset} bytes does not match the {nbytes} bytes its header declares.' )
+    return np.frombuffer( raw, dtype = dtype, count = count, offset = offset ).reshape( shape )
+
+
+def unpack_tensor( data: str, max_bytes: int = MAX_ARRAY_BYTES ) -> "torch.Tensor":
+    """
+    Decodes a string produced by pack_array into a torch tensor sharing memory with the decoded buffer.
+    The tensor must be treated as read-only; clone it before modifying it in place.
+    """
+    import torch
+    with warnings.catch_warnings():
+        # torch warns that the buffer is not writable, which is intended for a zero copy view.
+        warnings.simplefilter( 'ignore', UserWarning )
+        return torch.from_numpy( unpack_array( data, max_bytes = max_bytes ) )
+
+
+class CompactSynapse( bt.Synapse ):
+    """
+    A bt.Synapse base class with helpers for fields declared as CompactArray.
+
+    Arrays are encoded with pack_array when set and decoded into views when read, so subclasses can
+    return get_array or get_tensor from deserialize() without an extra copy.
+    """
+
+    def set_array( self, field: str, array: typing.Any, compression: typing.Optional[str] = None ):
+        """ Encodes the numpy array or torch tensor into the passed CompactArray field. """
+        setattr( self, field, pack_array( array, compression = compression ) )
+
+    def get_array( self, field: str ) -> typing.Optional[np.ndarray]:
+        """ Decodes the passed CompactArray field into a read-only numpy array, None if it is unset. """
+        data = getattr( self, field )
+        return None if data is None else unpack_array( data )
+
+    def get_tensor( self, field: str ) -> typing.Optional["torch.Tensor"]:
+        """ Decodes the passed CompactArray field into a torch tensor, None if it is unset. """
+        data = getattr( self, field )
+        return None if data is None else unpack_tensor( data )
@@ -0,0 +1,246 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import typing
+import asyncio
+import argparse
+import bittensor as bt
+
+
+class QueryResult( typing.NamedTuple ):
+    """
+    The outcome of querying a single miner.
+
+    Attributes:
+    - uid: The UID of the queried miner.
+    - synapse: The synapse returned by the dendrite, None if every attempt raised.
+    - response: The deserialized synapse if the query succeeded, otherwise None.
+    - latency: Seconds between the first attempt being sent and the result being settled.
+    - attempts: Number of requests sent to the miner, including hedges and retries.
+    - timed_out: True if no attempt succeeded before the miner's deadline.
+    - first_chunk_latency: For streaming queries, seconds until the first chunk arrived, None if none did.
+    """
+    uid: int
+    synapse: typing.Optional[bt.Synapse]
+    response: typing.Any
+    latency: float
+    attempts: int
+    timed_out: bool
+    first_chunk_latency: typing.Optional[float] = None
+
+    @property
+    def is_success( self ) -> bool:
+        return self.synapse is not None and self.synapse.is_success
+
+
+class QueryEngine:
+    """
+    Queries a set of miners concurrently on a single event loop and yields each result as soon as it arrives.
+
+    At most max_in_flight miners are queried at any time. Every miner gets its own deadline, counted
+    from when its first request is sent, after which it is reported as timed out. A round therefore
+    takes roughly one timeout window per max_in_flight miners, regardless of how many stragglers
+    there are. If a miner has not answered after hedge_delay seconds a second request is raced
+    against the first, and requests which fail fast are retried, in both cases up to max_attempts
+    total requests and only while the miner's deadline allows.
+
+    Streaming synapses are queried when an on_chunk callback is passed. Each chunk is handed to it as
+    soon as it arrives, and the stream is cancelled early if the callback returns False. Streaming
+    queries are not hedged or retried.
+
+    Example usage:
+        engine = QueryEngine( dendrite, max_in_flight = 256, timeout = 12 )
+        engine.run( { uid: metagraph.axons[uid] for uid in uids }, Dummy( dummy_input = 1 ), on_result = print )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--query.max_in_flight', type = int, default = 256, help = "Maximum number of concurrent requests to miners." )
+        parser.add_argument( '--query.timeout', type = float, default = 12.0, help = "Seconds each miner has to respond." )
+        parser.add_argument( '--query.hedge_delay', type = float, default = None, help = "Seconds after which an unanswered request is hedged with a second one. Disabled if not set." )
+        parser.add_argument( '--query.max_attempts', type = int, default = 1, help = "Maximum number of requests sent to a miner per round, including hedges and retries." )
+
+    def __init__(
+        self,
+        dendrite: "bt.dendrite",
+        max_in_flight: int = 256,
+        timeout: float = 12.0,
+        hedge_delay: typing.Optional[float] = None,
+        max_attempts: int = 1,
+        loop: typing.Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.dendrite = dendrite
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max( 1, max_attempts )
+        # The dendrite's client session is bound to the loop it was first used on, so every round runs on the same one.
+        # asyncio.get_event_loop() is deprecated outside a running loop, so the engine owns a loop of its own by default.
+        self.loop = loop or asyncio.new_event_loop()
+        self._semaphore: typing.Optional[asyncio.Semaphore] = None
+
+    async def stream(
+        self,
+        axons: typing.Dict[int, "bt.AxonInfo"],
+        synapse: bt.Synapse,
+        timeouts: typing.Optional[typing.Dict[int, float]] = None,
+        on_chunk: typing.Optional[typing.Callable[[int, typing.Any], bool]] = None,
+    ) -> typing.AsyncIterator[QueryResult]:
+        """
+        Queries every axon in the passed uid -> axon mapping and yields results in completion order.
+
+        Args:
+        - axons: The axons to query, keyed by uid.
+        - synapse: The synapse to send, it is copied for every request.
+        - timeouts: Optional per-uid timeouts overriding the engine's default timeout.
+        - on_chunk: For streaming synapses, called with ( uid, chunk ) for every chunk received.
+            Returning False cancels the rest of that miner's stream.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore( self.max_in_flight )
+        timeouts = timeouts or {}
+        tasks = [
+            asyncio.ensure_future(
+                self._query( uid, axon, synapse, timeouts.get( uid, self.timeout ) ) if on_chunk is None else
+                self._query_stream( uid, axon, synapse, timeouts.get( uid, self.timeout ), on_chunk )
+            )
+            for uid, axon in axons.items()
+        ]
+        try:
+            for next_result in asyncio.as_completed( tasks ):
+                yield await next_result
+        finally:
+            # The consumer may stop early, in which case outstanding requests are abandoned.
+            for task in tasks:
+                task.cancel()
+
+    def run(
+        self,
+        axons: typing.Dict[int, "bt.AxonInfo"],
+        synapse: bt.Synapse,
+        on_result: typing.Callable[[QueryResult], None],
+        timeouts: typing.Optional[typing.Dict[int, float]] = None,
+        on_chunk: typing.Optional[typing.Callable[[int, typing.Any], bool]] = None,
+    ) -> float:
+        """
+        Synchronously runs a full round, passing each result to on_result as it arrives.
+        Returns the wall clock duration of the round.
+        """
+        async def _consume():
+            async for result in self.stream( axons, synapse, timeouts, on_chunk ):
+                on_result( result )
+        start = time.perf_counter()
+        self.loop.run_until_complete( _consume() )
+        return time.perf_counter() - start
+
+    async def _query( self, uid: int, axon: "bt.AxonInfo", synapse: bt.Synapse, timeout: float ) -> QueryResult:
+        attempts = 0
+        pending: typing.Set[asyncio.Future] = set()
+        last: typing.Optional[bt.Synapse] = None
+
+        def _launch() -> bool:
+            nonlocal attempts
+            remaining = deadline - time.perf_counter()
+            if attempts >= self.max_attempts or remaining <= 0:
+                return False
+            attempts += 1
+            pending.add( asyncio.ensure_future( self._call( axon, synapse, remaining ) ) )
+            return True
+
+        async with self._semaphore:
+            # The miner's clock starts once a slot is free, waiting behind other miners does not count against it.
+            start = time.perf_counter()
+            deadline = start + timeout
+            _launch()
+            try:
+                while pending:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    wait = remaining
+                    if self.hedge_delay is not None and attempts < self.max_attempts:
+                        wait = min( wait, max( 0.0, start + self.hedge_delay * attempts - time.perf_counter() ) )
+                    done, pending = await asyncio.wait( pending, timeout = wait, return_when = asyncio.FIRST_COMPLETED )
+                    if not done:
+                        # Nothing answered within the hedge delay, race another request against the outstanding ones.
+                        _launch()
+                        continue
+                    for task in done:
+                        last = task.result()
+                        if last is not None and last.is_success:
+                            return QueryResult( uid, last, last.deserialize(), time.perf_counter() - start, attempts, False )
+                    # Every finished attempt failed, retry while the deadline allows.
+                    if not pending:
+                        _launch()
+            finally:
+                for task in pending:
+                    task.cancel()
+        elapsed = time.perf_counter() - start
+        return QueryResult( uid, last, None, elapsed, attempts, elapsed >= timeout or ( last is not None and last.is_timeout ) )
+
+    async def _query_stream(
+        self,
+        uid: int,
+        axon: "bt.AxonInfo",
+        synapse: bt.StreamingSynapse,
+        timeout: float,
+        on_chunk: typing.Callable[[int, typing.Any], bool],
+    ) -> QueryResult:
+        chunks: typing.List[typing.Any] = []
+        final: typing.Optional[bt.Synapse] = None
+        first_chunk_latency: typing.Optional[float] = None
+        timed_out = False
+
+        async def _consume( start: float ):
+            nonlocal final, first_chunk_latency
+            # A deep copy, streaming synapses fill their output fields in place as chunks arrive.
+            stream = self.dendrite.call_stream( target_axon = axon, synapse = synapse.copy( deep = True ), timeout = timeout, deserialize = False )
+            try:
+                async for item in stream:
+                    if isinstance( item, bt.Synapse ):
+                        final = item
+                        continue
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.perf_counter() - start
+                    chunks.append( item )
+                    if on_chunk( uid, item ) is False:
+                        break
+            finally:
+                await stream.aclose()
+
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for( _consume( start ), timeout = timeout )
+            except asyncio.TimeoutError:
+                timed_out = True
+            except Exception as e:
+                bt.logging.trace( f'Streaming query to {axon.hotkey} failed: {e}' )
+        # Partial output is returned even if the stream was cut short, so it can still be scored.
+        return QueryResult( uid, final, chunks, time.perf_counter() - start, 1, timed_out, first_chunk_latency )
+
+    async def _call( self, axon: "bt.AxonInfo", synapse: bt.Synapse, timeout: float ) -> typing.Optional[bt.Synapse]:
+        try:
+            return await self.dendrite.call( target_axon = axon, synapse = synapse.copy(), timeout = timeout, deserialize = False )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            bt.logging.trace( f'Query to {axon.hotkey} failed: {e}' )
+            return None
@@ -0,0 +1,131 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import time
+import typing
+import argparse
+import threading
+import bittensor as bt
+
+from . import metrics
+
+RATE_LIMITED = metrics.counter( 'ratelimit_rejected', 'Requests rejected because the caller exceeded its rate limit.' )
+LOAD_FACTOR = metrics.gauge( 'ratelimit_load_factor', 'Fraction of the configured rate limits currently granted, below 1 when adapting to load.' )
+
+
+class RateLimiter:
+    """
+    A token bucket per caller hotkey, cheap enough to run in the blacklist function before deserialization.
+
+    Each caller refills at base_rate * ( 1 + log1p( stake ) ) requests per second, multiplied by
+    permit_multiplier if it holds a validator permit, and can burst up to burst seconds of its rate.
+    In adaptive mode the main loop reports forward latency and queue depth through adapt(): while either
+    is above its threshold every rate is halved, down to min_factor, and it recovers additively once
+    the miner keeps up again.
+
+    Example usage:
+        limiter = RateLimiter( base_rate = 1.0, permit_multiplier = 10 )
+        if not limiter.allow( hotkey, stake = index.stake_of( hotkey ), permit = index.has_permit( hotkey ) ):
+            return True # Blacklist the request.
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--ratelimit.base_rate', type = float, default = 0.0, help = "Requests per second granted to a caller without stake, e.g. 1. Rate limiting is disabled if 0, the default." )
+        parser.add_argument( '--ratelimit.permit_multiplier', type = float, default = 10.0, help = "Rate multiplier for callers holding a validator permit." )
+        parser.add_argument( '--ratelimit.burst', type = float, default = 5.0, help = "Seconds worth of requests a caller may send in a burst." )
+        parser.add_argument( '--ratelimit.adaptive', action = 'store_true', default = False, help = "If set, tightens rate limits while the miner is overloaded." )
+        parser.add_argument( '--ratelimit.max_latency', type = float, default = 1.0, help = "Forward latency in seconds above which adaptive mode tightens limits." )
+        parser.add_argument( '--ratelimit.max_queue_depth', type = int, default = 64, help = "Executor and batcher queue depth above which adaptive mode tightens limits." )
+
+    def __init__(
+        self,
+        base_rate: float = 1.0,
+        permit_multiplier: float = 10.0,
+        burst: float = 5.0,
+        adaptive: bool = False,
+        max_latency: float = 1.0,
+        max_queue_depth: int = 64,
+        min_factor: float = 0.05,
+    ):
+        self.base_rate = base_rate
+        self.permit_multiplier = permit_multiplier
+        self.burst = burst
+        self.adaptive = adaptive
+        self.max_latency = max_latency
+        self.max_queue_depth = max_queue_depth
+        self.min_factor = min_factor
+        self.factor = 1.0
+        self.latency = 0.0
+        # Maps hotkeys to [ tokens, last refill time ].
+        self._buckets: typing.Dict[str, typing.List[float]] = {}
+        self._lock = threading.Lock()
+        LOAD_FACTOR.set( self.factor )
+
+    def rate( self, stake: float, permit: bool ) -> float:
+        """ Returns the requests per second granted to a caller with the passed stake and permit. """
+        rate = self.base_rate * ( 1 + math.log1p( max( 0.0, stake ) ) ) * self.factor
+        return rate * self.permit_multiplier if permit else rate
+
+    def allow( self, hotkey: str, stake: float = 0.0, permit: bool = False ) -> bool:
+        """
+        Takes a token from the caller's bucket, returning False if it is empty.
+        """
+        rate = self.rate( stake, permit )
+        capacity = max( 1.0, rate * self.burst )
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get( hotkey )
+            if bucket is None:
+                bucket = self._buckets[ hotkey ] = [ capacity, now ]
+            tokens = min( capacity, bucket[0] + ( now - bucket[1] ) * rate )
+            bucket[1] = now
+            if tokens < 1.0:
+                bucket[0] = tokens
+                RATE_LIMITED.inc()
+                return False
+            bucket[0] = tokens - 1.0
+            return True
+
+    def observe_latency( self, seconds: float ):
+        """ Folds a forward latency into the moving average used by adaptive mode. """
+        self.latency += 0.1 * ( seconds - self.latency )
+
+    def adapt( self, queue_depth: int = 0 ):
+        """
+        Tightens or relaxes the limits according to the recent forward latency and the passed queue depth.
+        Should be called periodically, e.g. once per second from the main loop. Does nothing unless adaptive.
+        """
+        if not self.adaptive:
+            return
+        if self.latency > self.max_latency or queue_depth > self.max_queue_depth:
+            factor = max( self.min_factor, self.factor * 0.5 )
+        else:
+            factor = min( 1.0, self.factor + 0.1 )
+        if factor != self.factor:
+            bt.logging.debug( f'Rate limit factor {self.factor:.2f} -> {factor:.2f} (latency: {self.latency:.3f}s, queue depth: {queue_depth})' )
+        self.factor = factor
+        LOAD_FACTOR.set( factor )
+
+    def prune( self, hotkeys: typing.Container[str] ):
+        """ Drops the buckets of callers which are no longer in the passed hotkeys, e.g. after deregistration. """
+        with self._lock:
+            for hotkey in [ hotkey for hotkey in self._buckets if hotkey not in hotkeys ]:
+                del self._buckets[ hotkey ]
@@ -0,0 +1,271 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import time
+import zlib
+import torch
+import struct
+import pickle
+import typing
+import hashlib
+import argparse
+import threading
+import traceback
+import collections
+import numpy as np
+import bittensor as bt
+
+from . import metrics
+from . import scoring
+from .metagraph import CompactMetagraph
+
+ROUNDS_RECORDED = metrics.counter( 'recorder_rounds', 'Validator rounds written to the round log.' )
+ROUNDS_DROPPED = metrics.counter( 'recorder_dropped', 'Validator rounds not recorded because the writer fell behind or the log was full.' )
+
+# Every record is a little endian u32 length followed by that many bytes of zlib compressed pickle.
+_LENGTH = struct.Struct( '<I' )
+
+
+class RoundRecord( typing.NamedTuple ):
+    """
+    Everything needed to re-run the scoring of one validator round.
+
+    Attributes:
+    - step: The validator step of the round.
+    - time: Wall clock time at which the round was scored.
+    - metagraph_hash: The metagraph_hash() of the metagraph the round was queried against.
+    - query: The synapse class name and the protocol fields sent to the miners.
+    - expected: The expected response, a list of chunks when streaming.
+    - streaming: True if the miners were queried with the streaming protocol.
+    - uids: The queried uids, in the order their results arrived.
+    - responses: The deserialized response of each uid, None where it failed or timed out.
+    - latencies: The latency of each query in seconds.
+    - timed_out: True where the query timed out.
+    - judged_latencies: The latency each uid's reward was judged by, the history quantile at the time.
+    - previous_scores: The scores of the queried uids before the round.
+    - scores: The scores of every uid after the round.
+    - weights: The normalized weights submitted after the round.
+    - params: The scoring parameters: alpha, timeout, latency_weight.
+    """
+    step: int
+    time: float
+    metagraph_hash: str
+    query: typing.Dict[str, typing.Any]
+    expected: typing.Any
+    streaming: bool
+    uids: typing.List[int]
+    responses: typing.List[typing.Any]
+    latencies: typing.List[float]
+    timed_out: typing.List[bool]
+    judged_latencies: np.ndarray
+    previous_scores: np.ndarray
+    scores: np.ndarray
+    weights: np.ndarray
+    params: typing.Dict[str, float]
+
+
+def metagraph_hash( metagraph: typing.Union["bt.metagraph", CompactMetagraph] ) -> str:
+    """
+    Returns a short digest of the hotkeys, stake and axons of a metagraph, which identifies the
+    network state a round ran against without storing it.
+    """
+    digest = hashlib.sha256()
+    if isinstance( metagraph, CompactMetagraph ):
+        digest.update( metagraph.hotkey_table.tobytes() )
+        digest.update( metagraph.stake.tobytes() )
+        digest.update( metagraph.axon_table[ [ 'ip', 'port' ] ].tobytes() )
+    else:
+        digest.update( '\n'.join( metagraph.hotkeys ).encode() )
+        digest.update( np.asarray( metagraph.S.tolist(), dtype = '<f4' ).tobytes() )
+        digest.update( '\n'.join( f'{axon.ip}:{axon.port}' for axon in metagraph.axons ).encode() )
+    return digest.hexdigest()[ :16 ]
+
+
+def synapse_fields( synapse: "bt.Synapse" ) -> typing.Dict[str, typing.Any]:
+    """
+    Returns the synapse class name and the fields declared by the protocol, leaving out bt.Synapse's
+    own terminal and header fields.
+    """
+    fields = { name: getattr( synapse, name ) for name in type( synapse ).__fields__ if name not in bt.Synapse.__fields__ }
+    return { 'name': type( synapse ).__name__, **fields }
+
+
+class RoundRecorder:
+    """
+    Appends every validator round to a compact on-disk log, so slow rounds or odd weights can be
+    reproduced and profiled offline with benchmarks/replay.py.
+
+    A record holds the query, per-uid responses and latencies, the metagraph hash and the resulting scores
+    and weights, see RoundRecord. Only the prior scores of the queried uids are stored, the prior score of
+    every other uid is its resulting score. Recording only copies the tensors into the record, pickling,
+    compression and writing happen on a background thread. Rounds are dropped rather than blocking the
+    loop if the writer falls behind, and recording stops once the log reaches max_bytes.
+
+    Example usage:
+        recorder = RoundRecorder( os.path.join( config.full_path, 'rounds.log' ) ).start()
+        recorder.record( step, metagraph, query, expected, ... )
+        ...
+        for record in read_rounds( path ): ...
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--recorder.enabled', action = 'store_true', default = False, help = "If set, appends every round to a log which benchmarks/replay.py can re-score offline." )
+        parser.add_argument( '--recorder.path', type = str, default = None, help = "Path of the round log, rounds.log under the validator's directory by default." )
+        parser.add_argument( '--recorder.max_bytes', type = int, default = 1024 * 1024 * 1024, help = "Size in bytes after which rounds are no longer recorded." )
+
+    def __init__( self, path: str, max_bytes: int = 1024 * 1024 * 1024, max_buffered: int = 64, flush_interval: float = 1.0 ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.written = 0
+        self._buffer: typing.Deque[RoundRecord] = collections.deque( maxlen = max_buffered )
+        self._hashed: typing.Tuple[typing.Any, str] = ( None, '' )
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self._stop_event = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def record(
+        self,
+        step: int,
+        metagraph: typing.Union["bt.metagraph", CompactMetagraph],
+        query: "bt.Synapse",
+        expected: typing.Any,
+        streaming: bool,
+        uids: torch.Tensor,
+        responses: typing.List[typing.Any],
+        latencies: typing.List[float],
+        timed_out: typing.List[bool],
+        judged_latencies: torch.Tensor,
+        previous_scores: torch.Tensor,
+        scores: torch.Tensor,
+        weights: torch.Tensor,
+        **params: float,
+    ):
+        """
+        Queues a round for writing. The tensors are copied, so the caller is free to keep updating them.
+        """
+        # The metagraph only changes on a sync, so it is hashed once per snapshot rather than once per round.
+        if self._hashed[0] is not metagraph:
+            self._hashed = ( metagraph, metagraph_hash( metagraph ) )
+        self.recorded += 1
+        self._buffer.append( RoundRecord(
+            step = step,
+            time = time.time(),
+            metagraph_hash = self._hashed[1],
+            query = synapse_fields( query ),
+            expected = expected,
+            streaming = streaming,
+            uids = uids.tolist(),
+            responses = list( responses ),
+            latencies = list( latencies ),
+            timed_out = list( timed_out ),
+            judged_latencies = judged_latencies.detach().cpu().numpy().astype( np.float32 ),
+            previous_scores = previous_scores.detach().cpu().numpy().astype( np.float32 ),
+            scores = scores.detach().cpu().numpy().astype( np.float32 ),
+            weights = weights.detach().cpu().numpy().astype( np.float32 ),
+            params = params,
+        ) )
+
+    def start( self ) -> "RoundRecorder":
+        os.makedirs( os.path.dirname( self.path ) or '.', exist_ok = True )
+        self._file = open( self.path, 'ab' )
+        self._stop_event.clear()
+        self._thread = threading.Thread( target = self._run, name = 'RoundRecorder', daemon = True )
+        self._thread.start()
+        bt.logging.info( f'Recording validator rounds to {self.path}' )
+        return self
+
+    def stop( self ):
+        """ Stops the writer thread after writing every queued round. """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _flush( self ):
+        buffer = self._buffer
+        while buffer:
+            record = buffer.popleft()
+            if self._file.tell() >= self.max_bytes:
+                continue
+            data = zlib.compress( pickle.dumps( tuple( record ), protocol = pickle.HIGHEST_PROTOCOL ) )
+            self._file.write( _LENGTH.pack( len( data ) ) + data )
+            self.written += 1
+            ROUNDS_RECORDED.inc()
+        self._file.flush()
+        # Rounds pushed out of the full buffer or past max_bytes were never written.
+        dropped = self.recorded - self.written - len( buffer )
+        if dropped > 0:
+            ROUNDS_DROPPED.inc( dropped )
+            self.written += dropped
+
+    def _run( self ):
+        while not self._stop_event.wait( self.flush_interval ):
+            try:
+                self._flush()
+            except Exception:
+                bt.logging.error( f'Could not record rounds to {self.path}:\n{traceback.format_exc()}' )
+        self._flush()
+        self._file.close()
+
+
+def read_rounds( path: str ) -> typing.Iterator[RoundRecord]:
+    """
+    Yields the rounds recorded in a log written by RoundRecorder, stopping at a truncated last record.
+    """
+    with open( path, 'rb' ) as f:
+        while True:
+            header = f.read( _LENGTH.size )
+            if len( header ) < _LENGTH.size:
+                return
+            data = f.read( _LENGTH.unpack( header )[0] )
+            try:
+                yield RoundRecord( *pickle.loads( zlib.decompress( data ) ) )
+            except zlib.error:
+                return
+
+
+def replay_round( record: RoundRecord ) -> typing.Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Re-runs the scoring and normalization of a recorded round, in the same steps as neurons/validator.py.
+
+    Returns:
+    - scores: The scores of every uid after the round.
+    - weights: The normalized weights.
+    """
+    uids = torch.tensor( record.uids, dtype = torch.long )
+    scores = torch.from_numpy( record.scores.copy() )
+    scores[ uids ] = torch.from_numpy( record.previous_scores )
+    if record.streaming:
+        rewards, mask = scoring.prefix_rewards( record.responses, record.expected )
+    else:
+        rewards, mask = scoring.exact_match_rewards( record.responses, expected = record.expected )
+    if record.params['latency_weight'] > 0:
+        rewards = scoring.latency_rewards(
+            rewards,
+            torch.from_numpy( record.judged_latencies ),
+            timeout = record.params['timeout'],
+            weight = record.params['latency_weight'],
+        )
+    scores = scoring.update_scores( scores, uids, rewards, mask, record.params['alpha'] )
+    weights = torch.nn.functional.normalize( scores, p = 1.0, dim = 0 )
+    return scores, weights
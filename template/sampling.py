@@ -0,0 +1,128 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import torch
+import argparse
+import bittensor as bt
+
+from .metagraph import MetagraphDiff
+
+
+class UidSampler:
+    """
+    Chooses which uids the validator queries each step, so a step only pays for a subset of the network.
+
+    Each step first reserves ceil( n / coverage_steps ) slots for the uids queried longest ago, in strict
+    age order with ties broken by uid. Since every step serves at least that many uids from the front of
+    this queue, a uid is queried again within coverage_steps steps of its last query, whatever the other
+    slots go to. New uids are given staggered ages, so they join the queue without pushing others back.
+
+    The remaining slots go to the other uids ranked by how long ago they were last queried, how noisy
+    their recent rewards are and whether their axon or hotkey recently changed.
+
+    Example usage:
+        sampler = UidSampler( sample_size = 64, coverage_steps = 8 )
+        sampler.reconcile( template.metagraph.diff( None, metagraph ), len( metagraph.hotkeys ), step )
+        uids = sampler.sample( step )
+        ...
+        sampler.observe( uids, rewards )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--sampling.sample_size', type = int, default = 64, help = "Number of uids queried per step. Queries every uid if 0." )
+        parser.add_argument( '--sampling.coverage_steps', type = int, default = 8, help = "Every uid is queried at least once within this many steps." )
+
+    def __init__(
+        self,
+        sample_size: int = 64,
+        coverage_steps: int = 8,
+        variance_weight: float = 1.0,
+        change_weight: float = 1.0,
+        alpha: float = 0.9,
+    ):
+        self.sample_size = sample_size
+        self.coverage_steps = max( 1, coverage_steps )
+        self.variance_weight = variance_weight
+        self.change_weight = change_weight
+        self.alpha = alpha
+        self.last_queried = torch.zeros( 0, dtype = torch.long )
+        self.reward_mean = torch.zeros( 0 )
+        self.reward_var = torch.zeros( 0 )
+        self.changed = torch.zeros( 0, dtype = torch.bool )
+
+    @property
+    def size( self ) -> int:
+        return self.last_queried.shape[0]
+
+    def reconcile( self, diff: MetagraphDiff, size: int, step: int ):
+        """
+        Resizes the sampler state to the metagraph size and flags uids that are new or changed their axon.
+        New uids are given staggered ages, so no more than ceil( n / coverage_steps ) of them fall due on the same step.
+        """
+        if size != self.size:
+            keep = min( size, self.size )
+            last_queried = torch.zeros( size, dtype = torch.long )
+            reward_mean, reward_var = torch.zeros( size ), torch.zeros( size )
+            changed = torch.zeros( size, dtype = torch.bool )
+            last_queried[ :keep ] = self.last_queried[ :keep ]
+            reward_mean[ :keep ] = self.reward_mean[ :keep ]
+            reward_var[ :keep ] = self.reward_var[ :keep ]
+            changed[ :keep ] = self.changed[ :keep ]
+            self.last_queried, self.reward_mean, self.reward_var, self.changed = last_queried, reward_mean, reward_var, changed
+        new_uids = torch.tensor( [ uid for uid in diff.new_uids if uid < size ], dtype = torch.long )
+        if len( new_uids ) > 0:
+            self.last_queried[ new_uids ] = step - self.coverage_steps + 1 + torch.arange( len( new_uids ) ) % self.coverage_steps
+            self.reward_mean[ new_uids ] = 0
+            self.reward_var[ new_uids ] = 0
+            self.changed[ new_uids ] = True
+        changed_uids = [ uid for uid in diff.changed_axon_uids if uid < size ]
+        if changed_uids:
+            self.changed[ changed_uids ] = True
+
+    def sample( self, step: int ) -> torch.Tensor:
+        """
+        Returns the uids to query on this step and marks them as queried.
+        """
+        n = self.size
+        reserved = min( n, math.ceil( n / self.coverage_steps ) )
+        k = n if self.sample_size <= 0 else min( n, max( self.sample_size, reserved ) )
+        # The reserved slots: the uids queried longest ago, ordered by last query and then by uid.
+        order = self.last_queried * n + torch.arange( n )
+        oldest = torch.topk( -order, reserved ).indices
+        age = ( step - self.last_queried ).float()
+        priority = age / self.coverage_steps \
+            + self.variance_weight * self.reward_var.sqrt() \
+            + self.change_weight * self.changed.float() \
+            + 1e-3 * torch.rand( n )
+        priority[ oldest ] = -math.inf
+        uids = torch.cat( [ oldest, torch.topk( priority, k - reserved ).indices ] )
+        self.last_queried[ uids ] = step
+        self.changed[ uids ] = False
+        return uids
+
+    def observe( self, uids: torch.Tensor, rewards: torch.Tensor ):
+        """
+        Updates the exponential moving mean and variance of the rewards received by the queried uids.
+        """
+        rewards = rewards.to( self.reward_mean.dtype )
+        delta = rewards - self.reward_mean[ uids ]
+        self.reward_mean[ uids ] += ( 1 - self.alpha ) * delta
+        self.reward_var[ uids ] = self.alpha * ( self.reward_var[ uids ] + ( 1 - self.alpha ) * delta * delta )
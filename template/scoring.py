@@ -0,0 +1,147 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+import typing
+
+from .metagraph import MetagraphDiff
+
+
+def is_number( value: typing.Any ) -> bool:
+    """
+    Returns True if value is an int or float, the only chunk types miners may stream. JSON booleans are
+    parsed as bool, which is an int subclass, and are rejected too.
+    """
+    return isinstance( value, ( int, float ) ) and not isinstance( value, bool )
+
+
+def exact_match_rewards( responses: typing.Sequence[typing.Any], expected: typing.Any ) -> typing.Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Rewards 1.0 to every response equal to the expected value and 0.0 otherwise.
+
+    Responses are compared in Python before the tensors are built, so integers of any size compare exactly
+    and responses which are not numbers, or too large for a float, are misses instead of errors.
+
+    Returns:
+    - rewards: A float32 tensor of per-response rewards.
+    - mask: A boolean tensor which is True where a response was received.
+    """
+    rewards = torch.tensor( [ float( is_number( r ) and r == expected ) for r in responses ], dtype = torch.float32 )
+    return rewards, torch.tensor( [ r is not None for r in responses ], dtype = torch.bool )
+
+
+def update_scores(
+    scores: torch.Tensor,
+    uids: torch.Tensor,
+    rewards: torch.Tensor,
+    mask: torch.Tensor,
+    alpha: float,
+    fill: float = 0.0,
+) -> torch.Tensor:
+    """
+    Applies the moving average scores[uid] = alpha * scores[uid] + (1 - alpha) * reward for every queried uid at once.
+
+    Args:
+    - scores: The global scores tensor, updated in place.
+    - uids: A long tensor of the uids which were queried this round.
+    - rewards: The reward of each queried uid, aligned with uids.
+    - mask: True where the uid responded. Missing responses are rewarded with fill instead.
+    - alpha: The weight given to the previous score.
+    - fill: The reward given to uids which failed or timed out.
+
+    Returns:
+    - torch.Tensor: The updated scores tensor.
+    """
+    rewards = rewards.to( scores.dtype ).masked_fill( ~mask, fill )
+    scores[ uids ] = torch.lerp( rewards, scores[ uids ], alpha )
+    return scores
+
+
+def reconcile_scores( scores: torch.Tensor, diff: MetagraphDiff, size: int, initial: float = 0.0 ) -> torch.Tensor:
+    """
+    Resizes the scores tensor to the current metagraph size and resets the scores of uids whose hotkey changed.
+
+    New hotkeys start from 0 and earn weight through the moving average. Starting them from the maximum
+    would let a low scoring miner re-register to get top weight for the next rounds.
+
+    Args:
+    - scores: The global scores tensor, indexed by uid.
+    - diff: The MetagraphDiff between the metagraph the scores were computed for and the current one.
+    - size: The number of uids in the current metagraph.
+    - initial: The score given to newly registered hotkeys, 0 by default.
+
+    Returns:
+    - torch.Tensor: The reconciled scores tensor, which is a new tensor if the size changed.
+    """
+    if scores.shape[0] != size:
+        resized = torch.full( ( size, ), initial, dtype = scores.dtype, device = scores.device )
+        keep = min( size, scores.shape[0] )
+        resized[ :keep ] = scores[ :keep ]
+        scores = resized
+    reset = [ uid for uid in diff.new_uids if uid < size ]
+    if reset:
+        scores[ reset ] = initial
+    return scores
+
+
+def prefix_rewards( responses: typing.Sequence[typing.Optional[typing.Sequence[typing.Any]]], expected: typing.Sequence[typing.Any] ) -> typing.Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Rewards streamed responses by the fraction of the expected chunks they produced correctly, in order,
+    before the first wrong or missing chunk. Partial streams are rewarded for their correct prefix.
+    Chunks which are not numbers, e.g. strings, null or lists, are wrong chunks.
+
+    Args:
+    - responses: The chunks received from each miner, None or empty for miners which sent nothing.
+    - expected: The expected chunks.
+
+    Returns:
+    - rewards: A float32 tensor of per-response rewards in [0, 1].
+    - mask: A boolean tensor which is True where at least one chunk was received.
+    """
+    length = len( expected )
+    padded = [ list( r or [] )[ :length ] for r in responses ]
+    # Chunks are parsed from what miners sent and can be of any JSON type, so they are compared in Python
+    # before any tensor is built. Anything which is not a number counts as a miss.
+    matches = torch.tensor(
+        [ [ float( is_number( chunk ) and chunk == want ) for chunk, want in zip( r, expected ) ] + [ 0.0 ] * ( length - len( r ) ) for r in padded ],
+        dtype = torch.float32,
+    ).reshape( len( responses ), length )
+    rewards = matches.cumprod( dim = 1 ).sum( dim = 1 ) / max( 1, length )
+    return rewards, torch.tensor( [ len( r ) > 0 for r in padded ], dtype = torch.bool )
+
+
+def latency_rewards( rewards: torch.Tensor, latencies: torch.Tensor, timeout: float, weight: float ) -> torch.Tensor:
+    """
+    Blends correctness with speed, so that of two correct miners the faster one earns more.
+
+    The reward becomes rewards * ( 1 - weight + weight * speed ), where speed falls linearly from 1 for an
+    instant response to 0 at the timeout. Incorrect responses stay at 0 however fast they were.
+
+    Args:
+    - rewards: The correctness rewards in [0, 1].
+    - latencies: The latency each miner is judged by in seconds, e.g. a percentile of its recent history.
+      NaN latencies, i.e. miners without history, count as instant.
+    - timeout: The query timeout in seconds.
+    - weight: The share of the reward given for speed, 0 to ignore latency.
+
+    Returns:
+    - torch.Tensor: The blended float32 rewards.
+    """
+    speed = ( 1 - latencies.to( torch.float32 ).nan_to_num( nan = 0.0 ) / timeout ).clamp( 0, 1 )
+    return rewards.to( torch.float32 ) * ( 1 - weight + weight * speed )
@@ -0,0 +1,158 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import time
+import torch
+import typing
+import argparse
+import threading
+import traceback
+import bittensor as bt
+
+
+class ValidatorState( typing.NamedTuple ):
+    """
+    The validator state restored from a checkpoint, reconciled against the current metagraph.
+
+    Attributes:
+    - step: The step the validator had reached when the checkpoint was written.
+    - scores: The scores tensor, indexed by the current metagraph's uids.
+    - columns: Additional per-uid tensors saved with the scores, indexed by the current metagraph's uids.
+    - found: A boolean tensor which is True for uids whose hotkey was present in the checkpoint.
+    """
+    step: int
+    scores: torch.Tensor
+    columns: typing.Dict[str, torch.Tensor]
+    found: torch.Tensor
+
+
+class StateStore:
+    """
+    Checkpoints the validator's scores, step and per-hotkey metadata to a single file under config.full_path.
+
+    Saves are handed to a background thread and coalesced so only the newest state is written, and the loop
+    never waits on the disk. Every write goes to a temporary file which is fsynced and renamed over the
+    checkpoint, so a crash leaves either the previous or the new checkpoint, never a torn one.
+    Checkpoints are keyed by hotkey rather than uid, so they stay valid across deregistrations.
+
+    Example usage:
+        store = StateStore( os.path.join( config.full_path, 'state.pt' ) ).start()
+        state = store.load( metagraph.hotkeys )
+        ...
+        store.save( step, metagraph.hotkeys, scores )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--state.save_interval', type = int, default = 5, help = "Steps between validator state checkpoints." )
+        parser.add_argument( '--state.reset', action = 'store_true', default = False, help = "If set, ignores any saved validator state on startup." )
+
+    def __init__( self, path: str ):
+        self.path = path
+        self.last_save_duration: typing.Optional[float] = None
+        self._pending: typing.Optional[dict] = None
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def load( self, hotkeys: typing.List[str], initial: float = 0.0 ) -> typing.Optional[ValidatorState]:
+        """
+        Loads the checkpoint and maps it onto the passed hotkeys. Hotkeys missing from the checkpoint get the
+        initial score and zeroed columns. Returns None if there is no readable checkpoint.
+        """
+        if not os.path.exists( self.path ):
+            return None
+        try:
+            saved = torch.load( self.path, map_location = 'cpu' )
+        except Exception:
+            bt.logging.error( f'Could not load validator state from {self.path}:\n{traceback.format_exc()}' )
+            return None
+        positions = { hotkey: i for i, hotkey in enumerate( saved['hotkeys'] ) }
+        index = torch.tensor( [ positions.get( hotkey, -1 ) for hotkey in hotkeys ], dtype = torch.long )
+        found = index >= 0
+
+        def _reconcile( values: torch.Tensor, fill: float ) -> torch.Tensor:
+            reconciled = torch.full( ( len( hotkeys ), ), fill, dtype = values.dtype )
+            reconciled[ found ] = values[ index[ found ] ]
+            return reconciled
+
+        return ValidatorState(
+            step = int( saved['step'] ),
+            scores = _reconcile( saved['scores'], initial ),
+            columns = { name: _reconcile( values, 0 ) for name, values in saved['columns'].items() },
+            found = found,
+        )
+
+    def save( self, step: int, hotkeys: typing.List[str], scores: torch.Tensor, columns: typing.Optional[typing.Dict[str, torch.Tensor]] = None ):
+        """
+        Queues the state for writing, replacing any state which has not been written yet. Tensors are copied,
+        so the caller is free to keep updating them.
+        """
+        state = {
+            'step': step,
+            'hotkeys': list( hotkeys ),
+            'scores': scores.detach().cpu().clone(),
+            'columns': { name: values.detach().cpu().clone() for name, values in ( columns or {} ).items() },
+        }
+        with self._condition:
+            self._pending = state
+            self._condition.notify()
+
+    def start( self ) -> "StateStore":
+        os.makedirs( os.path.dirname( self.path ) or '.', exist_ok = True )
+        self._stop_event.clear()
+        self._thread = threading.Thread( target = self._run, name = 'StateStore', daemon = True )
+        self._thread.start()
+        return self
+
+    def stop( self ):
+        """
+        Stops the writer thread after flushing any pending state.
+        """
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _write( self, state: dict ):
+        start = time.time()
+        tmp_path = f'{self.path}.tmp'
+        with open( tmp_path, 'wb' ) as f:
+            torch.save( state, f )
+            f.flush()
+            os.fsync( f.fileno() )
+        os.replace( tmp_path, self.path )
+        self.last_save_duration = time.time() - start
+
+    def _run( self ):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stop_event.is_set():
+                    self._condition.wait()
+                state, self._pending = self._pending, None
+            if state is not None:
+                try:
+                    self._write( state )
+                except Exception:
+                    bt.logging.error( f'Could not save validator state to {self.path}:\n{traceback.format_exc()}' )
+            elif self._stop_event.is_set():
+                return
@@ -0,0 +1,183 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import torch
+import typing
+import argparse
+import threading
+import traceback
+import bittensor as bt
+
+from . import metrics
+from .metagraph import MetagraphSyncer
+
+SET_WEIGHTS_SECONDS = metrics.histogram( 'set_weights_seconds', 'Time spent submitting weights to the chain.' )
+SET_WEIGHTS_SUCCESSES = metrics.counter( 'set_weights_successes', 'Weight submissions included on chain.' )
+SET_WEIGHTS_FAILURES = metrics.counter( 'set_weights_failures', 'Weight submissions which failed or raised.' )
+
+
+class WeightSetter:
+    """
+    Submits weights to the chain from a dedicated thread so the validator's query loop never waits on an extrinsic.
+
+    Callers hand over the latest weight vector with submit(), which returns immediately. Pending vectors are
+    coalesced: if several are submitted while one is in flight or waiting, only the newest is sent. The worker
+    respects the subnet's weights rate limit, counted from our uid's last update on chain, and retries failed
+    submissions with exponential backoff. The setter should be given its own subtensor connection since the
+    websocket is not thread-safe.
+
+    Example usage:
+        weight_setter = WeightSetter( bt.subtensor( config = config ), wallet, netuid = 1, uid = my_uid ).start()
+        weight_setter.submit( metagraph.uids, weights )
+        ...
+        weight_setter.stop()
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--weights.rate_limit', type = int, default = None, help = "Minimum blocks between weight submissions. Read from the chain if not set." )
+        parser.add_argument( '--weights.max_backoff', type = float, default = 120.0, help = "Maximum seconds to wait between failed weight submissions." )
+
+    def __init__(
+        self,
+        subtensor: "bt.subtensor",
+        wallet: "bt.wallet",
+        netuid: int,
+        uid: int,
+        metagraph_syncer: typing.Optional[MetagraphSyncer] = None,
+        rate_limit: typing.Optional[int] = None,
+        max_backoff: float = 120.0,
+    ):
+        self.subtensor = subtensor
+        self.wallet = wallet
+        self.netuid = netuid
+        self.uid = uid
+        self.metagraph_syncer = metagraph_syncer
+        self.rate_limit = rate_limit
+        self.max_backoff = max_backoff
+        self.last_set_block: typing.Optional[int] = None
+        self.last_latency: typing.Optional[float] = None
+        self.last_success: typing.Optional[bool] = None
+        self.success_count = 0
+        self.failure_count = 0
+        self._pending: typing.Optional[typing.Tuple[torch.Tensor, torch.Tensor]] = None
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def submit( self, uids: torch.Tensor, weights: torch.Tensor ):
+        """
+        Queues the weight vector for submission, replacing any vector which has not been sent yet.
+        """
+        with self._condition:
+            self._pending = ( uids.clone(), weights.clone() )
+            self._condition.notify()
+
+    def start( self ) -> "WeightSetter":
+        if self.rate_limit is None:
+            try:
+                self.rate_limit = int( self.subtensor.weights_rate_limit( self.netuid ) )
+            except Exception:
+                bt.logging.warning( f'Could not read the weights rate limit from the chain, submitting without one:\n{traceback.format_exc()}' )
+                self.rate_limit = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread( target = self._run, name = 'WeightSetter', daemon = True )
+        self._thread.start()
+        return self
+
+    def stop( self ):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join( timeout = bt.__blocktime__ )
+            self._thread = None
+
+    def _last_update( self ) -> typing.Optional[int]:
+        # Prefer what the chain says about our last update, fall back to our own record.
+        if self.metagraph_syncer is not None and self.metagraph_syncer.snapshot is not None:
+            last_update = self.metagraph_syncer.snapshot.metagraph.last_update
+            if self.uid < len( last_update ):
+                chain_block = int( last_update[ self.uid ] )
+                return chain_block if self.last_set_block is None else max( chain_block, self.last_set_block )
+        return self.last_set_block
+
+    def _wait_for_rate_limit( self ):
+        last_update = self._last_update()
+        if not self.rate_limit or last_update is None:
+            return
+        blocks_remaining = last_update + self.rate_limit - self.subtensor.get_current_block()
+        if blocks_remaining > 0:
+            bt.logging.debug( f'Waiting {blocks_remaining} blocks for the weights rate limit.' )
+            self._stop_event.wait( blocks_remaining * bt.__blocktime__ )
+
+    def _take( self ) -> typing.Optional[typing.Tuple[torch.Tensor, torch.Tensor]]:
+        with self._condition:
+            while self._pending is None and not self._stop_event.is_set():
+                self._condition.wait()
+            pending, self._pending = self._pending, None
+            return pending
+
+    def _run( self ):
+        backoff = bt.__blocktime__
+        while not self._stop_event.is_set():
+            try:
+                self._wait_for_rate_limit()
+            except Exception:
+                bt.logging.warning( f'Could not check the weights rate limit:\n{traceback.format_exc()}' )
+            # Take the vector after the rate limit so the newest one submitted in the meantime is the one sent.
+            pending = self._take()
+            if pending is None:
+                continue
+            uids, weights = pending
+            start = time.time()
+            try:
+                result = self.subtensor.set_weights(
+                    netuid = self.netuid, # Subnet to set weights on.
+                    wallet = self.wallet, # Wallet to sign set weights using hotkey.
+                    uids = uids, # Uids of the miners to set weights for.
+                    weights = weights, # Weights to set for the miners.
+                    wait_for_inclusion = True
+                )
+            except Exception:
+                bt.logging.error( f'Failed to set weights:\n{traceback.format_exc()}' )
+                result = False
+            self.last_latency = time.time() - start
+            self.last_success = bool( result )
+            SET_WEIGHTS_SECONDS.observe( self.last_latency )
+            if result:
+                self.success_count += 1
+                SET_WEIGHTS_SUCCESSES.inc()
+                try:
+                    self.last_set_block = self.subtensor.get_current_block()
+                except Exception:
+                    bt.logging.warning( 'Could not read the current block after setting weights.' )
+                backoff = bt.__blocktime__
+                bt.logging.success( f'Successfully set weights in {self.last_latency:.2f}s.' )
+                continue
+            self.failure_count += 1
+            SET_WEIGHTS_FAILURES.inc()
+            bt.logging.error( f'Failed to set weights after {self.last_latency:.2f}s, retrying in {backoff:.0f}s.' )
+            # Put the failed vector back unless a newer one was submitted while we were trying.
+            with self._condition:
+                if self._pending is None:
+                    self._pending = ( uids, weights )
+            self._stop_event.wait( backoff )
+            backoff = min( backoff * 2, self.max_backoff )
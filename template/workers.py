@@ -0,0 +1,439 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import queue
+import pickle
+import struct
+import typing
+import argparse
+import threading
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+import bittensor as bt
+
+from . import metrics
+
+WORKER_RESTARTS = metrics.counter( 'workers_restarted', 'Worker processes restarted after crashing, hanging or failing a health check.' )
+WORKERS_READY = metrics.gauge( 'workers_ready', 'Worker processes idle and ready to take a request.' )
+
+# Sequence number and payload length, followed by the pickled payload.
+_SNAPSHOT_HEADER = struct.Struct( '<QQ' )
+
+# Set in worker processes to read the snapshot published by the supervisor.
+_snapshot_reader: typing.Optional["SharedSnapshot"] = None
+
+# The pool WORKERS_READY reports on, the most recently started one. During a reload the pool being
+# replaced keeps running for a while and must not overwrite the gauge of the one serving.
+_reporting: typing.Optional["WorkerPool"] = None
+
+
+class WorkerFailed( RuntimeError ):
+    """ Raised when a worker process dies while handling a request. """
+
+
+class PoolClosed( WorkerFailed ):
+    """ Raised by a pool which is draining or stopped, the call was not started and can go to another pool. """
+
+
+class SharedSnapshot:
+    """
+    A single writer, many reader object slot in shared memory.
+
+    The writer pickles the object into the segment once, and readers in any process unpickle it only when
+    its sequence number changed since their last read. Writes are guarded by a sequence lock: the sequence
+    is odd while a write is in progress, and a reader retries if it changed while it was copying.
+    """
+
+    def __init__( self, size: int = 64 * 2**20, name: typing.Optional[str] = None ):
+        if name is None:
+            self._memory = shared_memory.SharedMemory( create = True, size = _SNAPSHOT_HEADER.size + size )
+            _SNAPSHOT_HEADER.pack_into( self._memory.buf, 0, 0, 0 )
+        else:
+            self._memory = shared_memory.SharedMemory( name = name )
+        self.owner = name is None
+        self._sequence = 0
+        self._value = None
+
+    @property
+    def name( self ) -> str:
+        return self._memory.name
+
+    @property
+    def capacity( self ) -> int:
+        return self._memory.size - _SNAPSHOT_HEADER.size
+
+    def publish( self, value: typing.Any ) -> bool:
+        """
+        Writes value to the segment. Returns False if it doesn't fit, in which case readers keep the previous value.
+        """
+        payload = pickle.dumps( value, protocol = pickle.HIGHEST_PROTOCOL )
+        if len( payload ) > self.capacity:
+            bt.logging.warning( f'Snapshot of {len( payload )} bytes does not fit in {self.capacity} bytes of shared memory, not published.' )
+            return False
+        buffer = self._memory.buf
+        sequence = _SNAPSHOT_HEADER.unpack_from( buffer, 0 )[0]
+        _SNAPSHOT_HEADER.pack_into( buffer, 0, sequence + 1, 0 )
+        buffer[ _SNAPSHOT_HEADER.size: _SNAPSHOT_HEADER.size + len( payload ) ] = payload
+        _SNAPSHOT_HEADER.pack_into( buffer, 0, sequence + 2, len( payload ) )
+        self._value = value
+        return True
+
+    def read( self ) -> typing.Any:
+        """
+        Returns the latest published value, or None if nothing was published yet.
+        """
+        buffer = self._memory.buf
+        while True:
+            sequence, length = _SNAPSHOT_HEADER.unpack_from( buffer, 0 )
+            if sequence == self._sequence:
+                return self._value
+            if sequence % 2 == 1:
+                time.sleep( 0 )
+                continue
+            payload = bytes( buffer[ _SNAPSHOT_HEADER.size: _SNAPSHOT_HEADER.size + length ] )
+            if _SNAPSHOT_HEADER.unpack_from( buffer, 0 )[0] != sequence:
+                continue
+            self._value = pickle.loads( payload )
+            self._sequence = sequence
+            return self._value
+
+    def close( self ):
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+
+
+def snapshot() -> typing.Any:
+    """
+    Returns the snapshot most recently published with WorkerPool.publish(), e.g. the metagraph's hotkey index.
+    Only available inside worker processes, returns None elsewhere or before the first publish.
+    """
+    return _snapshot_reader.read() if _snapshot_reader is not None else None
+
+
+def _worker_main( connection, buffer_name: str, snapshot_name: str ):
+    """ The worker process loop: runs the calls the supervisor writes to its buffer, one at a time. """
+    global _snapshot_reader
+    _snapshot_reader = SharedSnapshot( name = snapshot_name )
+    buffer = shared_memory.SharedMemory( name = buffer_name )
+    connection.send( ( 'ready', None ) )
+    try:
+        while True:
+            try:
+                kind, value = connection.recv()
+            except ( EOFError, OSError ):
+                return
+            if kind == 'stop':
+                return
+            if kind == 'ping':
+                connection.send( ( 'pong', None ) )
+                continue
+            try:
+                if kind == 'shm':
+                    with buffer.buf[ :value ] as view:
+                        fn, args = pickle.loads( view )
+                else:
+                    fn, args = pickle.loads( value )
+                result = ( True, fn( *args ) )
+            except Exception as e:
+                result = ( False, e )
+            try:
+                payload = pickle.dumps( result, protocol = pickle.HIGHEST_PROTOCOL )
+            except Exception as e:
+                payload = pickle.dumps( ( False, WorkerFailed( f'Result could not be pickled: {e!r}' ) ) )
+            if len( payload ) <= buffer.size:
+                buffer.buf[ :len( payload ) ] = payload
+                connection.send( ( 'shm', len( payload ) ) )
+            else:
+                connection.send( ( 'inline', payload ) )
+    finally:
+        _snapshot_reader.close()
+        buffer.close()
+
+
+class _Worker:
+    __slots__ = ( "index", "process", "connection", "buffer" )
+
+    def __init__( self, index: int, process, connection, buffer: shared_memory.SharedMemory ):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.buffer = buffer
+
+    def call( self, payload: bytes, timeout: float ) -> typing.Tuple[bool, typing.Any]:
+        """ Runs a pickled ( fn, args ) pair and returns whether it succeeded together with its result or exception. """
+        try:
+            if len( payload ) <= self.buffer.size:
+                self.buffer.buf[ :len( payload ) ] = payload
+                self.connection.send( ( 'shm', len( payload ) ) )
+            else:
+                # Payloads larger than the buffer go through the pipe instead.
+                self.connection.send( ( 'inline', payload ) )
+            done = self.connection.poll( timeout )
+            if done:
+                kind, value = self.connection.recv()
+        except ( EOFError, OSError ) as e:
+            raise WorkerFailed( f'Worker {self.index} exited: {e!r}' )
+        if not done:
+            raise concurrent.futures.TimeoutError( f'Worker {self.index} did not complete the request within {timeout:.2f}s.' )
+        if kind == 'shm':
+            with self.buffer.buf[ :value ] as view:
+                return pickle.loads( view )
+        return pickle.loads( value )
+
+    def ping( self, timeout: float ) -> bool:
+        try:
+            self.connection.send( ( 'ping', None ) )
+            return self.connection.poll( timeout ) and self.connection.recv()[0] == 'pong'
+        except ( EOFError, OSError ):
+            return False
+
+
+class WorkerPool:
+    """
+    Runs calls on a pool of worker processes, so CPU-bound forwards are not limited to one core by the GIL
+    while a single axon in the supervisor process serves the miner's one registration.
+
+    Each worker owns a shared memory buffer. The supervisor pickles the call straight into it and only a
+    short header crosses the pipe, and the worker writes its result back to the same buffer. Calls which
+    don't fit the buffer fall back to the pipe. A worker handles one call at a time, so the number of
+    workers bounds the number of concurrent calls.
+
+    A worker which dies during a call, or misses its deadline, is replaced. Idle workers are pinged one at a
+    time every health_interval seconds and replaced if they don't answer. Replacements start in the background and
+    requests are served by the remaining workers meanwhile.
+
+    Values passed to publish(), e.g. the metagraph's hotkey index, are written once to shared memory and
+    read by forwards running in workers through template.workers.snapshot().
+
+    Functions and their arguments must be picklable, i.e. functions defined at module level.
+
+    Example usage:
+        pool = WorkerPool( workers = 4 ).start()
+        pool.publish( metagraph_syncer.snapshot.index )
+        synapse = pool.run( forward, synapse, timeout = synapse.timeout )
+    """
+
+    @classmethod
+    def add_args( cls, parser: argparse.ArgumentParser ):
+        parser.add_argument( '--workers.buffer_size', type = int, default = 2**20, help = "Bytes of shared memory per worker process for requests and responses." )
+        parser.add_argument( '--workers.snapshot_size', type = int, default = 64 * 2**20, help = "Bytes of shared memory for the metagraph snapshot shared with worker processes." )
+        parser.add_argument( '--workers.health_interval', type = float, default = 5.0, help = "Seconds between health checks of idle worker processes." )
+
+    def __init__(
+        self,
+        workers: int = 4,
+        buffer_size: int = 2**20,
+        snapshot_size: int = 64 * 2**20,
+        health_interval: float = 5.0,
+        health_timeout: float = 2.0,
+        start_timeout: float = 120.0,
+    ):
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.snapshot_size = snapshot_size
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.start_timeout = start_timeout
+        self.restart_count = 0
+        self._context = multiprocessing.get_context( 'spawn' )
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._snapshot: typing.Optional[SharedSnapshot] = None
+        self._buffers: typing.List[shared_memory.SharedMemory] = []
+        self._workers: typing.Dict[int, _Worker] = {}
+        self._lock = threading.Lock()
+        # Counts calls between entering run() and returning their worker, guarded by _condition.
+        self._condition = threading.Condition()
+        self._checked_out = 0
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def ready( self ) -> int:
+        """ The number of workers idle and ready to take a request. """
+        return self._idle.qsize()
+
+    def publish( self, value: typing.Any ) -> bool:
+        """
+        Shares value read-only with all workers. Returns False if it does not fit in --workers.snapshot_size.
+        """
+        return self._snapshot.publish( value )
+
+    def run( self, fn: typing.Callable, *args, timeout: float = 12.0 ) -> typing.Any:
+        """
+        Runs fn( *args ) on an idle worker and returns its result, raising what fn raised. Raises
+        concurrent.futures.TimeoutError if no worker was free or the call did not complete within timeout.
+        Raises PoolClosed without running fn once drain() or stop() was called.
+        """
+        deadline = time.time() + timeout
+        payload = pickle.dumps( ( fn, args ), protocol = pickle.HIGHEST_PROTOCOL )
+        with self._condition:
+            if self._closed:
+                raise PoolClosed( 'Worker pool is draining or stopped.' )
+            self._checked_out += 1
+        try:
+            try:
+                worker = self._idle.get( timeout = max( 0.0, timeout ) )
+            except queue.Empty:
+                raise concurrent.futures.TimeoutError( f'No worker became free within {timeout:.2f}s.' )
+            try:
+                ok, result = worker.call( payload, max( 0.0, deadline - time.time() ) )
+            except BaseException:
+                # The worker is dead, or still busy with a request nobody waits for.
+                self._replace( worker )
+                raise
+            self._release( worker )
+        finally:
+            with self._condition:
+                self._checked_out -= 1
+                self._condition.notify_all()
+        if not ok:
+            raise result
+        return result
+
+    def start( self ) -> "WorkerPool":
+        global _reporting
+        _reporting = self
+        self._stop.clear()
+        with self._condition:
+            self._closed = False
+        self._snapshot = SharedSnapshot( size = self.snapshot_size )
+        self._buffers = [ shared_memory.SharedMemory( create = True, size = self.buffer_size ) for _ in range( self.workers ) ]
+        workers = [ self._spawn( index ) for index in range( self.workers ) ]
+        for worker in workers:
+            self._wait_ready( worker )
+            self._release( worker )
+        self._thread = threading.Thread( target = self._health_check, name = 'WorkerPool', daemon = True )
+        self._thread.start()
+        bt.logging.info( f'Started {self.workers} worker processes.' )
+        return self
+
+    def drain( self, timeout: float ) -> bool:
+        """
+        Stops taking new calls and waits for the calls in progress to finish, including callers which are still
+        waiting for a free worker. Returns False if some were still running when the timeout passed.
+        """
+        with self._condition:
+            self._closed = True
+            return self._condition.wait_for( lambda: self._checked_out == 0, timeout )
+
+    def stop( self, timeout: float = 5.0 ):
+        with self._condition:
+            self._closed = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join( timeout )
+            self._thread = None
+        with self._lock:
+            workers = list( self._workers.values() )
+            self._workers = {}
+        for worker in workers:
+            try:
+                worker.connection.send( ( 'stop', None ) )
+            except ( EOFError, OSError ):
+                pass
+        for worker in workers:
+            self._terminate( worker, timeout )
+        self._idle = queue.Queue()
+        if _reporting is self:
+            WORKERS_READY.set( 0 )
+        for buffer in self._buffers:
+            buffer.close()
+            buffer.unlink()
+        self._buffers = []
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _spawn( self, index: int ) -> _Worker:
+        parent, child = self._context.Pipe()
+        buffer = self._buffers[ index ]
+        process = self._context.Process(
+            target = _worker_main,
+            args = ( child, buffer.name, self._snapshot.name ),
+            name = f'WorkerPool-{index}',
+            daemon = True,
+        )
+        process.start()
+        child.close()
+        worker = _Worker( index, process, parent, buffer )
+        with self._lock:
+            self._workers[ index ] = worker
+        return worker
+
+    def _wait_ready( self, worker: _Worker ):
+        try:
+            ready = worker.connection.poll( self.start_timeout ) and worker.connection.recv()[0] == 'ready'
+        except ( EOFError, OSError ) as e:
+            raise WorkerFailed( f'Worker {worker.index} exited while starting: {e!r}' )
+        if not ready:
+            raise WorkerFailed( f'Worker {worker.index} did not start within {self.start_timeout}s.' )
+
+    def _release( self, worker: _Worker ):
+        self._idle.put( worker )
+        if _reporting is self:
+            WORKERS_READY.set( self._idle.qsize() )
+
+    def _terminate( self, worker: _Worker, timeout: float ):
+        worker.process.join( timeout )
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.connection.close()
+
+    def _replace( self, worker: _Worker ):
+        """ Kills worker and starts a replacement in the background. """
+        if self._stop.is_set():
+            return
+        self.restart_count += 1
+        WORKER_RESTARTS.inc()
+        bt.logging.warning( f'Restarting worker {worker.index}.' )
+        def restart():
+            worker.process.kill()
+            self._terminate( worker, 0 )
+            while not self._stop.is_set():
+                try:
+                    replacement = self._spawn( worker.index )
+                    self._wait_ready( replacement )
+                    self._release( replacement )
+                    return
+                except Exception as e:
+                    bt.logging.error( f'Failed to restart worker {worker.index}: {e}' )
+                    self._stop.wait( self.health_interval )
+        threading.Thread( target = restart, name = f'WorkerPool-restart-{worker.index}', daemon = True ).start()
+
+    def _health_check( self ):
+        while not self._stop.wait( self.health_interval ):
+            # Check the workers which are idle right now, busy ones are checked by their caller. Only one is
+            # taken out of the queue at a time, so requests keep being served by the others during a slow ping.
+            # Released workers go to the back of the queue, so each pass reaches every idle worker once.
+            for _ in range( len( self._workers ) ):
+                if self._stop.is_set():
+                    break
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker.process.is_alive() and worker.ping( self.health_timeout ):
+                    self._release( worker )
+                else:
+                    self._replace( worker )
@@ -0,0 +1,86 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+import concurrent.futures
+
+import pytest
+
+from template.batching import MicroBatcher
+from template.executor import RequestShed
+
+
+def _blocked_batcher( **kwargs ):
+    # The first batch blocks the only slot until released, so later items stay queued.
+    started, release = threading.Event(), threading.Event()
+    batches = []
+    def batch_fn( items, priority, timeout ):
+        batches.append( list( items ) )
+        started.set()
+        release.wait( 5 )
+        return items
+    batcher = MicroBatcher( batch_fn, max_wait = 0.0, max_in_flight = 1, **kwargs ).start()
+    first = batcher.submit( 'first' )
+    started.wait( 5 )
+    return batcher, release, batches, first
+
+
+def test_full_queue_sheds_lowest_priority():
+    batcher, release, batches, first = _blocked_batcher( max_batch_size = 8, max_queue = 2 )
+    low = batcher.submit( 'low', priority = 1.0 )
+    mid = batcher.submit( 'mid', priority = 2.0 )
+    assert batcher.depth == 2
+    assert not batcher.admits( 1.0 )
+    assert batcher.admits( 3.0 )
+    with pytest.raises( RequestShed ):
+        batcher.submit( 'lower', priority = 0.5 )
+    high = batcher.submit( 'high', priority = 3.0 )
+    with pytest.raises( RequestShed ):
+        low.result( timeout = 1 )
+    release.set()
+    assert mid.result( timeout = 1 ) == 'mid'
+    assert high.result( timeout = 1 ) == 'high'
+    assert batcher.shed_count == 2
+    batcher.stop()
+
+
+def test_batches_highest_priority_first_and_keeps_result_order():
+    batcher, release, batches, first = _blocked_batcher( max_batch_size = 2 )
+    futures = { name: batcher.submit( name, priority = priority ) for name, priority in ( ( 'a', 1.0 ), ( 'b', 3.0 ), ( 'c', 2.0 ) ) }
+    release.set()
+    assert first.result( timeout = 1 ) == 'first'
+    assert { name: future.result( timeout = 1 ) for name, future in futures.items() } == { 'a': 'a', 'b': 'b', 'c': 'c' }
+    # The two highest priorities form the next batch in arrival order, the lowest waits for the one after.
+    assert batches == [ [ 'first' ], [ 'b', 'c' ], [ 'a' ] ]
+    batcher.stop()
+
+
+def test_items_past_their_deadline_are_dropped_from_the_batch():
+    batcher, release, batches, first = _blocked_batcher( max_batch_size = 8 )
+    expired = batcher.submit( 'expired', timeout = 0.05 )
+    live = batcher.submit( 'live', timeout = 10 )
+    time.sleep( 0.1 )
+    release.set()
+    with pytest.raises( concurrent.futures.TimeoutError ):
+        expired.result( timeout = 1 )
+    assert live.result( timeout = 1 ) == 'live'
+    assert batches == [ [ 'first' ], [ 'live' ] ]
+    assert batcher.expired_count == 1
+    batcher.stop()
@@ -0,0 +1,100 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+
+import pytest
+
+from template.cache import ResponseCache
+from template.executor import RequestShed
+
+
+def _leader( cache: ResponseCache, key, result ):
+    """ Starts a computation of key on a thread which finishes with result once released. """
+    started, release = threading.Event(), threading.Event()
+    def compute():
+        started.set()
+        release.wait( 5 )
+        if isinstance( result, BaseException ):
+            raise result
+        return result
+    outcome = []
+    def run():
+        try:
+            outcome.append( cache.get_or_compute( key, compute ) )
+        except BaseException as e:
+            outcome.append( e )
+    thread = threading.Thread( target = run )
+    thread.start()
+    assert started.wait( 5 )
+    return release, thread, outcome
+
+
+def _follower( cache: ResponseCache, key, compute ):
+    outcome = []
+    def run():
+        try:
+            outcome.append( cache.get_or_compute( key, compute, timeout = 5 ) )
+        except BaseException as e:
+            outcome.append( e )
+    thread = threading.Thread( target = run )
+    thread.start()
+    # Wait until the follower is waiting on the leader's computation.
+    for _ in range( 5000 ):
+        if cache.coalesced:
+            break
+        thread.join( 0.001 )
+    return thread, outcome
+
+
+def test_concurrent_requests_compute_once():
+    cache = ResponseCache()
+    release, leader, leader_outcome = _leader( cache, 'key', 42 )
+    follower, follower_outcome = _follower( cache, 'key', lambda: pytest.fail( 'Computed twice.' ) )
+    release.set()
+    leader.join( 5 )
+    follower.join( 5 )
+    assert leader_outcome == [ 42 ] and follower_outcome == [ 42 ]
+    assert ( cache.misses, cache.coalesced ) == ( 1, 1 )
+    assert cache.get_or_compute( 'key', lambda: pytest.fail( 'Not cached.' ) ) == 42
+    assert cache.hits == 1
+
+
+def test_follower_recomputes_when_leader_is_shed():
+    cache = ResponseCache( transient = ( TimeoutError, RequestShed ) )
+    release, leader, leader_outcome = _leader( cache, 'key', RequestShed( 'shed' ) )
+    follower, follower_outcome = _follower( cache, 'key', lambda: 7 )
+    release.set()
+    leader.join( 5 )
+    follower.join( 5 )
+    assert isinstance( leader_outcome[0], RequestShed )
+    assert follower_outcome == [ 7 ]
+    assert cache.misses == 2
+
+
+def test_deterministic_errors_are_shared_and_not_cached():
+    cache = ResponseCache( transient = ( TimeoutError, RequestShed ) )
+    error = ValueError( 'bad request' )
+    release, leader, leader_outcome = _leader( cache, 'key', error )
+    follower, follower_outcome = _follower( cache, 'key', lambda: pytest.fail( 'Computed twice.' ) )
+    release.set()
+    leader.join( 5 )
+    follower.join( 5 )
+    assert leader_outcome == [ error ] and follower_outcome == [ error ]
+    assert cache.get_or_compute( 'key', lambda: 1 ) == 1
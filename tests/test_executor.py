@@ -0,0 +1,82 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+
+import pytest
+
+from template.executor import DeadlineExceeded, PriorityExecutor, RequestShed
+
+
+class _Blocked:
+    """ Occupies the executor's only worker until released, so later requests stay queued. """
+
+    def __init__( self, executor: PriorityExecutor ):
+        self.started, self.release = threading.Event(), threading.Event()
+        self.future = executor.submit( self._block, timeout = 10 )
+        assert self.started.wait( 5 )
+
+    def _block( self ):
+        self.started.set()
+        self.release.wait( 5 )
+
+
+def test_runs_highest_priority_first():
+    executor = PriorityExecutor( workers = 1, deadline_margin = 0 ).start()
+    blocked = _Blocked( executor )
+    order = []
+    futures = [ executor.submit( order.append, priority, priority = priority, timeout = 10 ) for priority in ( 1.0, 3.0, 2.0, 3.0 ) ]
+    blocked.release.set()
+    for future in futures:
+        future.result( timeout = 5 )
+    assert order == [ 3.0, 3.0, 2.0, 1.0 ]
+    executor.stop()
+
+
+def test_full_queue_sheds_lowest_priority():
+    executor = PriorityExecutor( workers = 1, max_queue = 2, deadline_margin = 0 ).start()
+    blocked = _Blocked( executor )
+    low = executor.submit( lambda: 'low', priority = 1.0, timeout = 10 )
+    mid = executor.submit( lambda: 'mid', priority = 2.0, timeout = 10 )
+    assert not executor.admits( 1.0 )
+    with pytest.raises( RequestShed ):
+        executor.submit( lambda: 'lowest', priority = 0.5, timeout = 10 )
+    high = executor.submit( lambda: 'high', priority = 3.0, timeout = 10 )
+    with pytest.raises( RequestShed ):
+        low.result( timeout = 1 )
+    blocked.release.set()
+    assert high.result( timeout = 5 ) == 'high'
+    assert mid.result( timeout = 5 ) == 'mid'
+    assert executor.shed_count == 2
+    executor.stop()
+
+
+def test_expired_requests_are_dropped_without_running():
+    executor = PriorityExecutor( workers = 1, deadline_margin = 0 ).start()
+    blocked = _Blocked( executor )
+    ran = []
+    expired = executor.submit( ran.append, 'expired', timeout = 0.05 )
+    time.sleep( 0.1 )
+    blocked.release.set()
+    with pytest.raises( DeadlineExceeded ):
+        expired.result( timeout = 5 )
+    assert ran == []
+    assert executor.expired_count == 1
+    executor.stop()
@@ -0,0 +1,66 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+
+from template.lifecycle import Lifecycle
+
+
+def test_admitted_requests_count_until_their_forward_returns():
+    lifecycle = Lifecycle()
+    assert lifecycle.admit( 'request', timeout = 10 )
+    assert lifecycle.in_flight == 1
+    with lifecycle.track( 'request' ):
+        # The forward takes the admission over instead of counting the request twice.
+        assert lifecycle.in_flight == 1
+    assert lifecycle.in_flight == 0
+
+
+def test_drain_waits_for_admitted_and_tracked_requests():
+    lifecycle = Lifecycle()
+    assert lifecycle.admit( 'request', timeout = 10 )
+    def forward():
+        time.sleep( 0.1 )
+        with lifecycle.track( 'request' ):
+            time.sleep( 0.1 )
+    thread = threading.Thread( target = forward )
+    thread.start()
+    start = time.time()
+    assert lifecycle.drain( timeout = 5 )
+    assert time.time() - start >= 0.2
+    thread.join()
+
+
+def test_admissions_which_never_reach_a_forward_expire():
+    lifecycle = Lifecycle()
+    assert lifecycle.admit( 'request', timeout = 0.1 )
+    start = time.time()
+    assert lifecycle.drain( timeout = 5 )
+    assert 0.1 <= time.time() - start < 1
+    assert lifecycle.in_flight == 0
+
+
+def test_drain_times_out_and_refuses_new_admissions():
+    lifecycle = Lifecycle()
+    assert lifecycle.admit( 'request', timeout = 10 )
+    assert not lifecycle.drain( timeout = 0.05 )
+    assert lifecycle.draining
+    assert not lifecycle.admit( 'late', timeout = 10 )
+    assert lifecycle.in_flight == 1
@@ -0,0 +1,85 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import types
+
+import torch
+import bittensor as bt
+
+from template import metagraph as metagraph_module
+from template.metagraph import CompactMetagraph
+
+
+def _metagraph( axons ) -> types.SimpleNamespace:
+    # The attributes CompactMetagraph.from_metagraph reads from a bt.metagraph.
+    n = len( axons )
+    return types.SimpleNamespace(
+        netuid = 1,
+        block = torch.tensor( 100 ),
+        hotkeys = [ axon.hotkey for axon in axons ],
+        coldkeys = [ axon.coldkey for axon in axons ],
+        axons = axons,
+        S = torch.arange( n, dtype = torch.float32 ),
+        R = torch.zeros( n ),
+        T = torch.zeros( n ),
+        C = torch.zeros( n ),
+        I = torch.zeros( n ),
+        E = torch.zeros( n ),
+        validator_permit = torch.tensor( [ uid % 2 == 0 for uid in range( n ) ] ),
+        last_update = torch.arange( n ),
+    )
+
+
+def _axon( uid: int, ip: str, ip_type: int, port: int = 8091 ) -> bt.AxonInfo:
+    return bt.AxonInfo( version = 1, ip = ip, port = port, ip_type = ip_type, hotkey = f'hotkey{uid}', coldkey = f'coldkey{uid}', protocol = 4 )
+
+
+AXONS = [
+    _axon( 0, '1.2.3.4', 4 ),
+    _axon( 1, '0.0.0.0', 0, port = 0 ), # Registered but not serving.
+    _axon( 2, '2001:db8::1', 6 ),
+]
+
+
+def test_save_load_round_trips_axons( tmp_path ):
+    path = str( tmp_path / 'metagraph.bin' )
+    CompactMetagraph.from_metagraph( _metagraph( AXONS ) ).save( path )
+    loaded = CompactMetagraph.load( path )
+    assert loaded.hotkeys == [ axon.hotkey for axon in AXONS ]
+    assert loaded.stake.tolist() == [ 0.0, 1.0, 2.0 ]
+    for uid, axon in enumerate( AXONS ):
+        assert loaded.axon( uid ) == axon
+
+
+def test_diff_between_full_and_compact_metagraph_is_empty():
+    full = _metagraph( AXONS )
+    assert not metagraph_module.diff( full, CompactMetagraph.from_metagraph( full ) )
+
+
+def test_compact_diff_matches_full_diff():
+    current = [
+        _axon( 0, '1.2.3.4', 4, port = 9000 ), # Moved to a new port.
+        _axon( 10, '5.6.7.8', 4 ), # Deregistered and replaced by a new hotkey.
+        AXONS[2],
+        _axon( 3, '2001:db8::2', 6 ), # Appended.
+    ]
+    previous, current = _metagraph( AXONS ), _metagraph( current )
+    expected = metagraph_module.MetagraphDiff( new_uids = [ 1, 3 ], deregistered_uids = [ 1 ], changed_axon_uids = [ 0 ] )
+    assert metagraph_module.diff( previous, current ) == expected
+    assert metagraph_module.diff( CompactMetagraph.from_metagraph( previous ), CompactMetagraph.from_metagraph( current ) ) == expected
@@ -0,0 +1,58 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import asyncio
+
+import bittensor as bt
+
+from template.pool import ConnectionPool, PooledDendrite
+
+
+def _dendrite( monkeypatch ) -> PooledDendrite:
+    monkeypatch.setattr( bt.utils.networking, 'get_external_ip', lambda: '127.0.0.1' )
+    return PooledDendrite( ConnectionPool(), wallet = bt.Keypair.create_from_mnemonic( bt.Keypair.generate_mnemonic() ) )
+
+
+def test_closing_stream_early_closes_inner_stream( monkeypatch ):
+    closed, streams = [], []
+    async def chunks():
+        try:
+            for chunk in range( 10 ):
+                yield chunk
+        finally:
+            closed.append( True )
+    def call_stream( self, target_axon, *args, **kwargs ):
+        # Holding a reference keeps garbage collection from closing the inner stream instead.
+        streams.append( chunks() )
+        return streams[-1]
+    monkeypatch.setattr( bt.dendrite, 'call_stream', call_stream, raising = False )
+    dendrite = _dendrite( monkeypatch )
+    axon = bt.AxonInfo( version = 1, ip = '127.0.0.1', port = 8091, ip_type = 4, hotkey = 'hotkey', coldkey = 'coldkey' )
+
+    async def consume_one():
+        stream = dendrite.call_stream( axon )
+        async for chunk in stream:
+            break
+        await stream.aclose()
+        assert closed == [ True ]
+        return chunk
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete( consume_one() ) == 0
+    loop.close()
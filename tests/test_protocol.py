@@ -0,0 +1,72 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import zlib
+import base64
+
+import numpy as np
+import pytest
+
+from template.protocol import pack_array, unpack_array
+
+
+@pytest.mark.parametrize( 'compression', [ None, 'zlib' ] )
+@pytest.mark.parametrize( 'array', [
+    np.arange( 12, dtype = np.float32 ).reshape( 3, 4 ),
+    np.arange( 5, dtype = '>i8' ),
+    np.zeros( ( 0, 3 ), dtype = np.float64 ),
+    np.array( 7, dtype = np.int16 ),
+] )
+def test_round_trip( array, compression ):
+    decoded = unpack_array( pack_array( array, compression = compression ) )
+    assert decoded.shape == array.shape
+    assert np.array_equal( decoded, array )
+    assert not decoded.flags.writeable
+
+
+def test_rejects_arrays_above_max_bytes():
+    data = pack_array( np.zeros( 1024, dtype = np.float64 ), compression = 'zlib' )
+    assert unpack_array( data, max_bytes = 8192 ).shape == ( 1024, )
+    with pytest.raises( ValueError ):
+        unpack_array( data, max_bytes = 8191 )
+
+
+def _with_buffer( data: str, length: int, buffer: bytes ) -> str:
+    # Keeps the header of an encoded array and swaps its buffer of length bytes for the passed one.
+    header = base64.b64decode( data )[ :-length ]
+    return ( base64.b64encode( header ) + base64.b64encode( buffer ) ).decode( 'ascii' )
+
+
+def test_rejects_compressed_buffer_larger_than_declared():
+    data = pack_array( np.zeros( 8, dtype = np.float64 ), compression = 'zlib' )
+    # A small compressed body which expands far beyond the 64 bytes the header declares.
+    with pytest.raises( ValueError ):
+        unpack_array( _with_buffer( data, len( zlib.compress( bytes( 64 ), 1 ) ), zlib.compress( bytes( 2**24 ) ) ) )
+
+
+def test_rejects_compressed_buffer_smaller_than_declared():
+    data = pack_array( np.zeros( 8, dtype = np.float64 ), compression = 'zlib' )
+    with pytest.raises( ValueError ):
+        unpack_array( _with_buffer( data, len( zlib.compress( bytes( 64 ), 1 ) ), zlib.compress( bytes( 32 ) ) ) )
+
+
+def test_rejects_uncompressed_buffer_of_the_wrong_size():
+    data = pack_array( np.zeros( 8, dtype = np.float64 ) )
+    with pytest.raises( ValueError ):
+        unpack_array( _with_buffer( data, 64, bytes( 88 ) ) )
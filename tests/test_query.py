@@ -0,0 +1,74 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import typing
+
+import bittensor as bt
+
+from template.protocol import StreamingDummy
+from template.query import QueryEngine, QueryResult
+
+
+class _Content:
+    def __init__( self, chunks: typing.List[int] ):
+        self._chunks = chunks
+
+    async def iter_any( self ) -> typing.AsyncIterator[bytes]:
+        for chunk in self._chunks:
+            yield json.dumps( chunk ).encode() + b'\n'
+
+
+class _Response:
+    def __init__( self, chunks: typing.List[int] ):
+        self.content = _Content( chunks )
+
+
+class _StreamingDendrite:
+    """ Streams a fixed list of chunks per axon port through the synapse's own response parser, like bt.dendrite.call_stream. """
+
+    def __init__( self, outputs: typing.Dict[int, typing.List[int]] ):
+        self.outputs = outputs
+
+    async def call_stream( self, target_axon: "bt.AxonInfo", synapse: bt.StreamingSynapse, timeout: float = 12.0, deserialize: bool = True ):
+        async for chunk in synapse.process_streaming_response( _Response( self.outputs[ target_axon.port ] ) ):
+            yield chunk
+        yield synapse
+
+
+def _axon( port: int ) -> "bt.AxonInfo":
+    return bt.AxonInfo( version = 1, ip = '127.0.0.1', port = port, ip_type = 4, hotkey = f'hotkey{port}', coldkey = f'coldkey{port}' )
+
+
+def test_streamed_outputs_stay_separate_per_miner():
+    outputs = { 9001: [ 2, 3, 4 ], 9002: [ 20, 30, 40 ] }
+    engine = QueryEngine( _StreamingDendrite( outputs ), timeout = 5.0 )
+    query = StreamingDummy( dummy_input = 1, stream_length = 3 )
+    results: typing.Dict[int, QueryResult] = {}
+    engine.run(
+        { 0: _axon( 9001 ), 1: _axon( 9002 ) },
+        query,
+        on_result = lambda result: results.__setitem__( result.uid, result ),
+        on_chunk = lambda uid, chunk: True,
+    )
+    assert results[0].response == [ 2, 3, 4 ]
+    assert results[1].response == [ 20, 30, 40 ]
+    assert results[0].synapse.dummy_output == [ 2, 3, 4 ]
+    assert results[1].synapse.dummy_output == [ 20, 30, 40 ]
+    assert query.dummy_output == []
@@ -0,0 +1,42 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+
+from template.metagraph import MetagraphDiff
+from template.sampling import UidSampler
+
+
+def test_every_uid_is_queried_within_coverage_steps():
+    n, coverage_steps, steps = 1000, 8, 200
+    sampler = UidSampler( sample_size = 64, coverage_steps = coverage_steps, variance_weight = 10.0, change_weight = 10.0 )
+    sampler.reconcile( MetagraphDiff( list( range( n ) ), [], [] ), n, step = 0 )
+    generator = torch.Generator().manual_seed( 0 )
+    last_sampled = torch.zeros( n, dtype = torch.long )
+    max_gap = 0
+    for step in range( 1, steps + 1 ):
+        # Noisy rewards and axon changes on a fixed set of uids compete with overdue uids for the sample.
+        sampler.reconcile( MetagraphDiff( [], [], list( range( 100 ) ) ), n, step )
+        uids = sampler.sample( step )
+        assert len( set( uids.tolist() ) ) == len( uids )
+        sampler.observe( uids, torch.rand( len( uids ), generator = generator ) )
+        max_gap = max( max_gap, int( ( step - last_sampled[ uids ] ).max() ) )
+        last_sampled[ uids ] = step
+    max_gap = max( max_gap, int( ( steps - last_sampled ).max() ) )
+    assert max_gap <= coverage_steps
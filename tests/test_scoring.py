@@ -0,0 +1,45 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+import pytest
+
+from template import scoring
+from template.metagraph import MetagraphDiff
+
+
+@pytest.mark.parametrize( 'chunk', [ 'x', None, {}, [ 1, 2 ], True, 10**400 ] )
+def test_malformed_chunk_is_a_miss( chunk ):
+    expected = [ 2, 3, 4 ]
+    rewards, mask = scoring.prefix_rewards( [ [ 2, chunk, 4 ], [ 2, 3, 4 ], None ], expected )
+    assert rewards.tolist() == pytest.approx( [ 1 / 3, 1.0, 0.0 ] )
+    assert mask.tolist() == [ True, True, False ]
+
+
+def test_exact_match_compares_large_and_malformed_responses():
+    expected = 2**53 + 1
+    rewards, mask = scoring.exact_match_rewards( [ expected, 2**53, 10**400, 'x', None ], expected )
+    assert rewards.tolist() == [ 1.0, 0.0, 0.0, 0.0, 0.0 ]
+    assert mask.tolist() == [ True, True, True, True, False ]
+
+
+def test_new_hotkeys_start_from_zero():
+    scores = torch.ones( 3 )
+    scores = scoring.reconcile_scores( scores, MetagraphDiff( [ 1, 3, 4 ], [ 1 ], [] ), size = 5 )
+    assert scores.tolist() == [ 1.0, 0.0, 1.0, 0.0, 0.0 ]
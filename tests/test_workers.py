@@ -0,0 +1,78 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# TODO(developer): Set your name
+# Copyright © 2023 <your name>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import time
+import operator
+import threading
+import multiprocessing
+
+import pytest
+
+from template import workers
+
+
+def test_worker_exiting_during_startup_raises_worker_failed():
+    parent, child = multiprocessing.Pipe()
+    child.close()
+    with pytest.raises( workers.WorkerFailed ):
+        workers.WorkerPool()._wait_ready( workers._Worker( 0, None, parent, None ) )
+
+
+def test_stopping_a_replaced_pool_keeps_the_ready_gauge():
+    previous = workers.WorkerPool( workers = 1, snapshot_size = 2**16 ).start()
+    current = workers.WorkerPool( workers = 2, snapshot_size = 2**16 ).start()
+    try:
+        assert previous.run( operator.add, 1, 2 ) == 3
+        previous.stop()
+        assert workers.WORKERS_READY.value == 2
+    finally:
+        previous.stop()
+        current.stop()
+    assert workers.WORKERS_READY.value == 0
+
+
+def test_crashed_worker_is_restarted():
+    pool = workers.WorkerPool( workers = 1, snapshot_size = 2**16 ).start()
+    try:
+        with pytest.raises( workers.WorkerFailed ):
+            pool.run( os._exit, 1, timeout = 10 )
+        assert pool.restart_count == 1
+        # The next call waits for the replacement worker.
+        assert pool.run( operator.add, 1, 2, timeout = 60 ) == 3
+    finally:
+        pool.stop()
+
+
+def test_drain_waits_for_calls_and_closes_the_pool():
+    pool = workers.WorkerPool( workers = 1, snapshot_size = 2**16 ).start()
+    try:
+        call = threading.Thread( target = pool.run, args = ( time.sleep, 0.5 ), kwargs = { 'timeout': 10 } )
+        call.start()
+        # Wait until the call holds the only worker.
+        deadline = time.time() + 5
+        while pool.ready and time.time() < deadline:
+            time.sleep( 0.01 )
+        assert not pool.drain( 0.01 )
+        assert pool.drain( 10 )
+        call.join( 5 )
+        with pytest.raises( workers.PoolClosed ):
+            pool.run( operator.add, 1, 2 )
+    finally:
+        pool.stop()